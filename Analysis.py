@@ -0,0 +1,181 @@
+"""
+Batch analysis of positions from an EPD file. EPD (Extended Position Description) is one position per line: the first
+four fields of a FEN (board, side to move, castling, en passant) followed by operations such as
+
+    r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - bm Qxf7#; id "scholar";
+
+Lines holding a complete FEN are read too. Every position is searched on a pool of processes, and one record is
+written per input line, in the order of the input, as soon as it and all the lines before it are done: the position
+and its operations followed by
+
+    acd    depth reached          acn    nodes searched       acs    seconds taken
+    ce     score in centipawns for the side to move, or dm with the moves to mate (negative when being mated)
+    pm     best move, in SAN      pv     principal variation
+
+The file is read lazily and only a few positions per worker are in flight at any time, so the memory used doesn't
+depend on the size of the file. When a position has bm (best moves) or am (avoid moves) operations the records say
+whether pm agrees in a c9 comment, and the summary counts the positions solved.
+
+Usage:
+    python Analysis.py positions.epd --depth 4
+    python Analysis.py positions.epd --time 1 --workers 4 --output analysed.epd
+
+Nothing here opens a window or imports pygame.
+"""
+import argparse
+import collections
+import multiprocessing
+import random
+import re
+import sys
+import time
+
+import ChessEngine
+import Pgn
+import SmartMoveFinder
+import TranspositionTable
+
+PENDING_PER_WORKER = 4  # positions handed to every worker ahead of the one it is searching
+TABLE_ENTRIES = 1 << 16  # transposition table size of each worker
+
+# one EPD operation: an opcode, its operands (words or quoted strings) and the closing semicolon
+operationPattern = re.compile(r'\s*([A-Za-z]\w*)((?:\s+(?:"[^"]*"|[^\s;"]+))*)\s*;')
+
+
+def parseEpd(line):
+    """
+    Split an EPD or FEN line into (fen, operations) with operations a list of (opcode, operand string). Raises
+    ValueError when the line is not a position.
+    """
+    fields = line.split(None, 4)
+    if len(fields) < 4:
+        raise ValueError("expected at least 4 fields")
+    rest = fields[4] if len(fields) > 4 else ""
+    counters = rest.split(None, 2)
+    if len(counters) >= 2 and counters[0].isdigit() and counters[1].isdigit():  # a full FEN: keep its move counters
+        fields[3] += " " + counters[0] + " " + counters[1]
+        rest = counters[2] if len(counters) > 2 else ""
+    operations = []
+    position = 0
+    while position < len(rest.rstrip()):
+        match = operationPattern.match(rest, position)
+        if match is None:
+            raise ValueError("malformed operation at %r" % rest[position:])
+        operations.append((match.group(1), match.group(2).strip()))
+        position = match.end()
+    return " ".join(fields[:4]), operations
+
+
+def formatOperations(operations):
+    return " ".join("%s %s;" % (opcode, operands) if operands else "%s;" % opcode for opcode, operands in operations)
+
+
+def initAnalysisWorker():
+    """
+    Give every worker process its own small transposition table
+    """
+    SmartMoveFinder.transpositionTable = TranspositionTable.TranspositionTable(TABLE_ENTRIES)
+
+
+def analyzeLine(task):
+    """
+    Search the position of one input line and return its output record, without the line break. The transposition
+    table is cleared first, so the result doesn't depend on which positions the worker searched before or on the
+    number of workers.
+    """
+    line, depth, timeLimit = task
+    try:
+        fen, operations = parseEpd(line)
+        gs = ChessEngine.GameState(fen)
+    except (ValueError, KeyError, IndexError) as error:
+        return "%s c0 \"error: %s\";" % (line, error)
+    validMoves = gs.getValidMoves()
+    if not validMoves:
+        return "%s %s" % (line, formatOperations([("c0", '"%s"' % ("checkmate" if gs.checkmate else "stalemate"))]))
+
+    SmartMoveFinder.transpositionTable.clear()
+    random.seed(gs.zobristKey)  # the move ordering breaks ties at random, seed it so every run gives the same record
+    info = SmartMoveFinder.SearchInfo(depth, timeLimit)
+    move, score, principalVariation = SmartMoveFinder.searchBestMove(gs, validMoves, depth, timeLimit, info)
+    seconds = time.perf_counter() - info.startTime
+    if not principalVariation:  # not even the first iteration was completed, e.g. the time limit was too short
+        return "%s c0 \"error: no move searched\";" % line
+
+    sanMoves = []
+    for pvMove in principalVariation:
+        sanMoves.append(Pgn.moveToSan(gs, pvMove, gs.getValidMoves()))
+        gs.makeMove(pvMove)
+    results = [("acd", str(info.depthReached)), ("acn", str(info.nodes)), ("acs", "%.2f" % seconds)]
+    if abs(score) >= SmartMoveFinder.CHECKMATE - SmartMoveFinder.MAX_PLY:  # plies to mate turned into moves
+        plies = SmartMoveFinder.CHECKMATE - abs(score)
+        results.append(("dm", str((plies + 1) // 2 if score > 0 else -(plies // 2))))
+    else:
+        results.append(("ce", str(score * 10)))  # the engine scores in tenths of a pawn
+    results += [("pm", sanMoves[0]), ("pv", " ".join(sanMoves))]
+    expected = dict(operations)
+    if "bm" in expected or "am" in expected:
+        bestSan = sanMoves[0].rstrip("+#")
+        solved = (("bm" not in expected or bestSan in [san.rstrip("+#!?") for san in expected["bm"].split()]) and
+                  ("am" not in expected or bestSan not in [san.rstrip("+#!?") for san in expected["am"].split()]))
+        results.append(("c9", '"solved"' if solved else '"failed"'))
+    return "%s %s" % (line, formatOperations(results))
+
+
+def analyzeLines(lines, depth, timeLimit=None, workers=1):
+    """
+    Analyse every non-empty line of an iterable of EPD lines and yield their records in the same order. At most
+    PENDING_PER_WORKER positions per worker are waiting at any time, so lines are only read as results are consumed.
+    """
+    tasks = ((line.strip(), depth, timeLimit) for line in lines if line.strip())
+    if workers <= 1:
+        initAnalysisWorker()
+        for task in tasks:
+            yield analyzeLine(task)
+        return
+    pending = collections.deque()
+    with multiprocessing.Pool(workers, initializer=initAnalysisWorker) as pool:
+        for task in tasks:
+            pending.append(pool.apply_async(analyzeLine, (task,)))
+            if len(pending) >= workers * PENDING_PER_WORKER:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse the positions of an EPD file.")
+    parser.add_argument("epd", help="EPD or FEN file, one position per line, - for standard input")
+    parser.add_argument("--depth", type=int, default=SmartMoveFinder.DEPTH, help="plies to search every position")
+    parser.add_argument("--time", type=float, help="seconds per position, the depth is then only an upper limit")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(), help="processes to search on")
+    parser.add_argument("--output", help="file the records are written to, default standard output")
+    args = parser.parse_args(argv)
+    if args.depth < 1:
+        parser.error("--depth must be at least 1")
+
+    inputFile = sys.stdin if args.epd == "-" else open(args.epd, encoding="utf-8")
+    outputFile = sys.stdout if args.output is None else open(args.output, "w", encoding="utf-8")
+    positions = solved = tried = 0
+    startTime = time.perf_counter()
+    try:
+        for record in analyzeLines(inputFile, args.depth, args.time, args.workers):
+            outputFile.write(record + "\n")
+            outputFile.flush()
+            positions += 1
+            if 'c9 "' in record:
+                tried += 1
+                solved += 'c9 "solved"' in record
+    finally:
+        if inputFile is not sys.stdin:
+            inputFile.close()
+        if outputFile is not sys.stdout:
+            outputFile.close()
+    seconds = time.perf_counter() - startTime
+    print("%d positions in %.1fs, %.2f positions/s%s" % (positions, seconds, positions / seconds if seconds else 0,
+                                                         ", solved %d/%d" % (solved, tried) if tried else ""),
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
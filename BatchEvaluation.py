@@ -0,0 +1,275 @@
+"""
+Scores many positions at once with NumPy, for building datasets and going through self-play games, where calling the
+evaluation one position at a time on the board's lists of strings is slow.
+
+A board is encoded as 64 int8 piece codes, square number row * 8 + col, with the codes of ChessEngine.pieceIndexes:
+0 for an empty square, 1 to 6 for the white pawn, knight, bishop, rook, queen and king and 7 to 12 for the black
+ones. N positions stack into an (N, 64) array. oneHot turns that into (N, 12, 64) planes, one per piece.
+
+evaluateBatch scores the whole stack with one table lookup and sum: material and piece-square tables in tenths of a
+pawn with white positive, plus the doubled, isolated and passed pawn terms of PawnStructure computed on whole files at
+once when SmartMoveFinder.PAWN_STRUCTURE is on, exactly the scores SmartMoveFinder.scoreBoard gives. It can add a
+mobility term, the number of squares the knights, bishops, rooks and queens of each side can move to (empty or enemy
+squares, pins and checks not considered), white minus black; getMobility counts the same for one board the ordinary
+way.
+
+Usage:
+    python BatchEvaluation.py                        check against the scalar evaluation and time 100000 positions
+    python BatchEvaluation.py --positions 20000 --batch 4096
+
+Needs NumPy, which nothing else in the game does.
+"""
+import argparse
+import itertools
+import random
+import sys
+import time
+
+import numpy
+
+import ChessEngine
+import PawnStructure
+import SmartMoveFinder
+
+PIECE_PLANES = len(ChessEngine.pieceCodes) - 1  # 12, the empty square has no plane
+OFF_BOARD = 64  # index of the extra column that squares off the board are looked up in
+
+# score of every piece code on every square: its material times MATERIAL_SCALE plus its piece-square score, with the
+# sign of its color. Row 0 is the empty square, worth nothing.
+scoreTable = numpy.zeros((len(ChessEngine.pieceCodes), 64), dtype=numpy.int32)
+for code, piece in enumerate(ChessEngine.pieceCodes[1:], 1):
+    for square in range(64):
+        scoreTable[code, square] = (ChessEngine.materialScores[piece] * ChessEngine.MATERIAL_SCALE +
+                                    ChessEngine.pieceSquareScores[piece][square])
+squareNumbers = numpy.arange(64)
+rowNumbers = numpy.arange(8)[None, :, None]  # broadcasts over (N, row, col) boards
+whitePassedBonuses = numpy.array(PawnStructure.passedPawnBonuses[::-1], dtype=numpy.int32)  # by row, white moves up
+blackPassedBonuses = numpy.array(PawnStructure.passedPawnBonuses, dtype=numpy.int32)  # by row, black moves down
+
+
+def buildTargetTable(squareLists):
+    """
+    Turn a list of (row, col) squares per square into a (64, width) array of square numbers padded with OFF_BOARD
+    """
+    width = max(len(squares) for squares in squareLists)
+    table = numpy.full((64, width), OFF_BOARD, dtype=numpy.intp)
+    for square, squares in enumerate(squareLists):
+        for index, (row, col) in enumerate(squares):
+            table[square, index] = row * 8 + col
+    return table
+
+
+knightTargets = buildTargetTable(ChessEngine.knightAttacks)
+allRays = numpy.stack([buildTargetTable(rays) for rays in ChessEngine.rayAttacks])  # direction, square, nearest first
+# the first four directions of ChessEngine.attackDirections are the ones rooks move in, the last four bishops'
+
+
+def encodeBoard(board):
+    """
+    Encode one board (8 lists of 8 piece strings) as 64 int8 piece codes
+    """
+    pieceIndexes = ChessEngine.pieceIndexes
+    return numpy.array([pieceIndexes[piece] for row in board for piece in row], dtype=numpy.int8)
+
+
+def encodeBoards(boards):
+    """
+    Encode an iterable of boards into an (N, 64) int8 array
+    """
+    squares = itertools.chain.from_iterable(itertools.chain.from_iterable(boards))  # every square of every board
+    codes = numpy.fromiter(map(ChessEngine.pieceIndexes.__getitem__, squares), dtype=numpy.int8)
+    return codes.reshape(-1, 64)
+
+
+def oneHot(encoded):
+    """
+    Turn (N, 64) piece codes into (N, 12, 64) booleans, plane i marking the squares of piece code i + 1
+    """
+    return encoded[:, None, :] == numpy.arange(1, PIECE_PLANES + 1, dtype=numpy.int8)[None, :, None]
+
+
+def countMoves(padded, positionIndexes, squares, targets, sliding, count):
+    """
+    Add up per position the squares that the pieces at (positionIndexes, squares) can move to among their targets,
+    one row of target squares per piece. Empty squares and enemy pieces count. When sliding, every row is a ray,
+    nearest square first, that stops at the first piece.
+    """
+    contents = padded[positionIndexes[:, None], targets]
+    white = padded[positionIndexes, squares] <= 6
+    # codes 1 to 6 are white pieces and 7 to 12 black ones, -1 is off the board
+    reachable = (contents == 0) | ((contents > 0) & ((contents <= 6) != white[:, None]))
+    if sliding: #a step of the ray is only reached when every square before it is empty
+        clear = numpy.ones(contents.shape, dtype=bool)
+        numpy.logical_and.accumulate(contents[:, :-1] == 0, axis=1, out=clear[:, 1:])
+        reachable &= clear
+    moves = numpy.where(white, 1, -1) * reachable.sum(axis=1)
+    return numpy.bincount(positionIndexes, weights=moves, minlength=count).astype(numpy.int32)
+
+
+def getMobilityBatch(encoded):
+    """
+    Mobility of every position of (N, 64) piece codes, white minus black, as an (N,) int32 array. Only the squares
+    holding a knight, bishop, rook or queen are looked at.
+    """
+    count = len(encoded)
+    padded = numpy.concatenate([encoded, numpy.full((count, 1), -1, dtype=numpy.int8)], axis=1)
+    pieceIndexes = ChessEngine.pieceIndexes
+    isPiece = {piece: (encoded == pieceIndexes["w" + piece]) | (encoded == pieceIndexes["b" + piece])
+               for piece in "NBRQ"}
+    positionIndexes, squares = numpy.nonzero(isPiece["N"])
+    mobility = countMoves(padded, positionIndexes, squares, knightTargets[squares], False, count)
+    orthogonal = isPiece["R"] | isPiece["Q"]
+    diagonal = isPiece["B"] | isPiece["Q"]
+    for direction, rays in enumerate(allRays):
+        positionIndexes, squares = numpy.nonzero(orthogonal if direction < 4 else diagonal)
+        mobility += countMoves(padded, positionIndexes, squares, rays[squares], True, count)
+    return mobility
+
+
+def neighbourFiles(files, fill, combine):
+    """
+    Combine every file of (N, 8) per-file values with the files beside it, the board's edges counting as fill
+    """
+    padded = numpy.pad(files, ((0, 0), (1, 1)), constant_values=fill)
+    return combine(combine(padded[:, :-2], padded[:, 1:-1]), padded[:, 2:])
+
+
+def getPawnScoresBatch(encoded):
+    """
+    PawnStructure's pawn structure score of every position of (N, 64) piece codes, white minus black, as an (N,) int32
+    array: the same doubled, isolated and passed pawns evaluatePawns finds, with whole files compared at once
+    """
+    boards = encoded.reshape(-1, 8, 8)
+    white = boards == ChessEngine.pieceIndexes["wp"]
+    black = boards == ChessEngine.pieceIndexes["bp"]
+    whiteFiles = white.sum(axis=1, dtype=numpy.int32)  # pawns on every file, (N, 8)
+    blackFiles = black.sum(axis=1, dtype=numpy.int32)
+    doubled = numpy.maximum(whiteFiles - 1, 0).sum(axis=1) - numpy.maximum(blackFiles - 1, 0).sum(axis=1)
+    whiteIsolated = whiteFiles * (neighbourFiles(whiteFiles, 0, numpy.add) == whiteFiles)  # no pawns beside
+    blackIsolated = blackFiles * (neighbourFiles(blackFiles, 0, numpy.add) == blackFiles)
+    isolated = whiteIsolated.sum(axis=1) - blackIsolated.sum(axis=1)
+    # a white pawn is passed when no black pawn on its own or the files beside it has a lower row, and the other way
+    # round for black
+    blackRearmost = neighbourFiles(numpy.where(black, rowNumbers, 8).min(axis=1), 8, numpy.minimum)
+    whiteRearmost = neighbourFiles(numpy.where(white, rowNumbers, -1).max(axis=1), -1, numpy.maximum)
+    whitePassed = white & (blackRearmost[:, None, :] >= rowNumbers)
+    blackPassed = black & (whiteRearmost[:, None, :] <= rowNumbers)
+    passed = ((whitePassed.sum(axis=2, dtype=numpy.int32) * whitePassedBonuses).sum(axis=1) -
+              (blackPassed.sum(axis=2, dtype=numpy.int32) * blackPassedBonuses).sum(axis=1))
+    return (passed - PawnStructure.DOUBLED_PAWN_PENALTY * doubled -
+            PawnStructure.ISOLATED_PAWN_PENALTY * isolated).astype(numpy.int32)
+
+
+def evaluateBatch(encoded, mobilityWeight=0):
+    """
+    Score every position of (N, 64) piece codes in tenths of a pawn with white positive, as an (N,) int32 array. With
+    mobilityWeight 0 these are exactly SmartMoveFinder.scoreBoard's scores; otherwise every square of mobility adds
+    mobilityWeight.
+    """
+    scores = scoreTable[encoded, squareNumbers].sum(axis=1, dtype=numpy.int32)
+    if SmartMoveFinder.PAWN_STRUCTURE:
+        scores += getPawnScoresBatch(encoded)
+    if mobilityWeight:
+        scores += mobilityWeight * getMobilityBatch(encoded)
+    return scores
+
+
+def getMobility(board):
+    """
+    Mobility of one board, white minus black, counted square by square: what getMobilityBatch computes at once
+    """
+    mobility = 0
+    for row in range(8):
+        for col in range(8):
+            piece = board[row][col]
+            if piece == "--" or piece[1] not in "NBRQ":
+                continue
+            sign = 1 if piece[0] == "w" else -1
+            square = row * 8 + col
+            if piece[1] == "N":
+                rays = [[target] for target in ChessEngine.knightAttacks[square]]
+            else:
+                rays = [ChessEngine.rayAttacks[direction][square] for direction in range(8)
+                        if piece[1] == "Q" or (direction < 4) == (piece[1] == "R")]
+            for ray in rays:
+                for targetRow, targetCol in ray:
+                    target = board[targetRow][targetCol]
+                    if target[0] != piece[0]:  # empty or an enemy piece
+                        mobility += sign
+                    if target != "--":
+                        break
+    return mobility
+
+
+def makePositions(count, seed=0):
+    """
+    Return count game states from random games, so the pieces are spread over the board
+    """
+    generator = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        gs = ChessEngine.GameState()
+        for ply in range(generator.randint(0, 80)):
+            validMoves = gs.getValidMoves()
+            if not validMoves:
+                break
+            gs.makeMove(generator.choice(validMoves))
+        positions.append(gs)
+    return positions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check and time the NumPy batch evaluation.")
+    parser.add_argument("--positions", type=int, default=100000, help="number of positions to score")
+    parser.add_argument("--batch", type=int, default=8192, help="positions scored per NumPy call")
+    args = parser.parse_args(argv)
+
+    print("making %d positions from random games..." % args.positions)
+    distinct = makePositions(min(args.positions, 2000))
+    positions = [distinct[index % len(distinct)] for index in range(args.positions)]
+
+    startTime = time.perf_counter()
+    scalarScores = [SmartMoveFinder.scoreBoard(gs) for gs in positions]
+    incrementalTime = time.perf_counter() - startTime
+    startTime = time.perf_counter()
+    fullScores = []
+    for gs in positions:  # the evaluation without the game state's running scores or the pawn table: from the board
+        material, position = gs.computeScores()
+        pawns = PawnStructure.evaluatePawns(gs.board) if SmartMoveFinder.PAWN_STRUCTURE else 0
+        fullScores.append(material * ChessEngine.MATERIAL_SCALE + position + pawns)
+    scalarTime = time.perf_counter() - startTime
+    startTime = time.perf_counter()
+    scalarMobility = [getMobility(gs.board) for gs in positions]
+    mobilityTime = time.perf_counter() - startTime
+
+    encodeTime = evaluateTime = mobilityBatchTime = 0.0
+    batchScores = []
+    batchMobility = []
+    for start in range(0, len(positions), args.batch):
+        chunk = positions[start:start + args.batch]
+        startTime = time.perf_counter()
+        encoded = encodeBoards(gs.board for gs in chunk)
+        encodeTime += time.perf_counter() - startTime
+        startTime = time.perf_counter()
+        batchScores.extend(evaluateBatch(encoded).tolist())
+        evaluateTime += time.perf_counter() - startTime
+        startTime = time.perf_counter()
+        batchMobility.extend(getMobilityBatch(encoded).tolist())
+        mobilityBatchTime += time.perf_counter() - startTime
+
+    matches = batchScores == scalarScores == fullScores and batchMobility == scalarMobility
+    count = len(positions)
+    print("scalar, running scores    %8.3fs %10.0f positions/s" % (incrementalTime, count / incrementalTime))
+    print("scalar, from the board    %8.3fs %10.0f positions/s" % (scalarTime, count / scalarTime))
+    print("scalar mobility           %8.3fs %10.0f positions/s" % (mobilityTime, count / mobilityTime))
+    print("batch encode              %8.3fs %10.0f positions/s" % (encodeTime, count / encodeTime))
+    print("batch evaluate            %8.3fs %10.0f positions/s" % (evaluateTime, count / evaluateTime))
+    print("batch mobility            %8.3fs %10.0f positions/s" % (mobilityBatchTime, count / mobilityBatchTime))
+    print("batch encode and evaluate %8.3fs %10.0f positions/s, %.1fx the scalar evaluation from the board"
+          % (encodeTime + evaluateTime, count / (encodeTime + evaluateTime), scalarTime / (encodeTime + evaluateTime)))
+    print("results %s the scalar evaluation on all %d positions" % ("match" if matches else "DIFFER FROM", count))
+    return 0 if matches else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
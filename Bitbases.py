@@ -0,0 +1,321 @@
+"""
+Endgame bitbases: for every position of king and queen, king and rook, or king and pawn against a lone king, whether
+the side with the piece wins. The search looks these endings up instead of searching them, so it can tell a won king
+and pawn ending from a drawn one, which no amount of counting material can.
+
+Every ending is one file of 64 * 64 * 64 * 2 bits (64 KB), one bit per (strong king, weak king, piece, side to move)
+with the strong side as white. For the strong side to move the bit says it wins, for the weak side to move it says it
+loses; a clear bit is a draw (or a position that can't occur). Black positions are looked up mirrored.
+
+Build the files once with:
+
+    python Bitbases.py build
+
+They are written to the bitbases directory next to the game and loaded the first time an ending is looked up. Without
+them the search works as before.
+
+The tables are computed by retrograde analysis on GameState positions. First every position is set up and its legal
+moves generated: positions where the weak side is checkmated are lost, and every other position of the weak side
+counts its moves. Then, starting from the lost positions, the analysis walks moves backwards (un-moves): every
+position of the strong side that can move into a lost one is won, and every position of the weak side whose moves
+all lead into won ones is lost. A weak king that can take the piece always escapes to a draw.
+"""
+import argparse
+import os
+import sys
+import time
+from collections import deque
+
+import ChessEngine
+
+BITBASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bitbases")
+ENDINGS = ("KQK", "KRK", "KPK")  # in the order they are built: a pawn that promotes leads into KQK
+POSITIONS = 64 * 64 * 64 * 2
+WIN = 1
+DRAW = 0
+LOSS = -1
+ESCAPES = 255  # move count of a weak position that can take the piece or is stalemate, it is never lost
+
+tables = {}  # ending -> contents of its file, or None when the file doesn't exist; filled as endings are looked up
+
+
+def positionIndex(strongKing, weakKing, pieceSquare, strongToMove):
+    return ((strongKing * 64 + weakKing) * 64 + pieceSquare) * 2 + (0 if strongToMove else 1)
+
+
+def loadTable(ending):
+    """
+    Return the bits of an ending, reading its file the first time
+    """
+    if ending not in tables:
+        path = os.path.join(BITBASE_DIR, ending + ".bin")
+        if os.path.exists(path):
+            with open(path, "rb") as tableFile:
+                tables[ending] = tableFile.read()
+        else:
+            tables[ending] = None
+    return tables[ending]
+
+
+def findEndingPieces(board):
+    """
+    Return (strong color, piece type, piece square, white king square, black king square) of a board with the two
+    kings and one other piece
+    """
+    piece = None
+    kings = {}
+    for row in range(8):
+        for col in range(8):
+            square = board[row][col]
+            if square == "--":
+                continue
+            if square[1] == "K":
+                kings[square[0]] = row * 8 + col
+            else:
+                piece = (square[0], square[1], row * 8 + col)
+    return piece + (kings["w"], kings["b"])
+
+
+def probe(gs):
+    """
+    Return WIN, DRAW or LOSS for the player to move if the position is in a bitbase, otherwise None. Two bare kings
+    are a draw.
+    """
+    if gs.pieceCount == 2:
+        return DRAW
+    if gs.pieceCount != 3:
+        return None
+    strongColor, pieceType, pieceSquare, whiteKing, blackKing = findEndingPieces(gs.board)
+    if pieceType not in "QRp":
+        return None
+    table = loadTable("K" + pieceType.upper() + "K")
+    if table is None:
+        return None
+    if strongColor == "w":
+        strongKing, weakKing = whiteKing, blackKing
+    else:  # mirror the board top to bottom so the strong side is white
+        strongKing, weakKing = blackKing ^ 56, whiteKing ^ 56
+        pieceSquare ^= 56
+    strongToMove = gs.whiteToMove == (strongColor == "w")
+    index = positionIndex(strongKing, weakKing, pieceSquare, strongToMove)
+    if not table[index >> 3] >> (index & 7) & 1:
+        return DRAW
+    return WIN if strongToMove else LOSS
+
+
+def getProgress(gs):
+    """
+    How far the strong side has come in a won ending, higher is better: the pawn close to promoting, the weak king
+    pushed to the edge and the kings close together. Won positions all look alike to the bitbase, this tells the
+    search which of them to head for.
+    """
+    strongColor, pieceType, pieceSquare, whiteKing, blackKing = findEndingPieces(gs.board)
+    strongKing, weakKing = (whiteKing, blackKing) if strongColor == "w" else (blackKing, whiteKing)
+    weakRow, weakCol = divmod(weakKing, 8)
+    centerDistance = max(3 - weakRow, weakRow - 4) + max(3 - weakCol, weakCol - 4)  # 0 in the center, 6 in a corner
+    kingDistance = abs(weakRow - strongKing // 8) + abs(weakCol - strongKing % 8)
+    progress = 10 * centerDistance + 2 * (14 - kingDistance)
+    if pieceType == "p":  # rows left to the promotion row
+        pawnRow = pieceSquare // 8
+        progress += 20 * (6 - (pawnRow - 1 if strongColor == "w" else 6 - pawnRow))
+    return progress
+
+
+class BitbaseBuilder:
+    """
+    Builds the table of one ending. The strong side is white and has the king and one piece (Q, R or p), black has
+    the king alone. One GameState is reused for every position.
+    """
+    def __init__(self, ending):
+        self.ending = ending
+        self.piece = "w" + ending[1].replace("P", "p")
+        self.gs = ChessEngine.GameState("8/8/8/8/8/8/8/8 w - - 0 1")
+        self.result = bytearray(POSITIONS)  # 1 when the position is won (strong to move) or lost (weak to move)
+        self.moveCounts = bytearray(POSITIONS)  # weak to move: moves not yet known to lead into a won position
+        self.queue = deque()  # positions whose result was just found, to be walked backwards from
+        if self.piece == "wp":
+            self.promotionTable = loadTable("KQK")
+            if self.promotionTable is None:
+                raise RuntimeError("KPK needs the KQK bitbase, build that first")
+        if self.piece == "wQ":
+            self.directions = ChessEngine.attackDirections
+        elif self.piece == "wR":
+            self.directions = ChessEngine.attackDirections[:4]
+
+    def place(self, strongKing, weakKing, pieceSquare):
+        board = self.gs.board
+        board[strongKing >> 3][strongKing & 7] = "wK"
+        board[weakKing >> 3][weakKing & 7] = "bK"
+        board[pieceSquare >> 3][pieceSquare & 7] = self.piece
+        self.gs.whiteKingPosition = divmod(strongKing, 8)
+        self.gs.blackKingLocation = divmod(weakKing, 8)
+
+    def clear(self, strongKing, weakKing, pieceSquare):
+        board = self.gs.board
+        board[strongKing >> 3][strongKing & 7] = "--"
+        board[weakKing >> 3][weakKing & 7] = "--"
+        board[pieceSquare >> 3][pieceSquare & 7] = "--"
+
+    def isWeakKingAttacked(self, weakKing):
+        return self.gs.isSquareAttacked(weakKing, "w")
+
+    def resolve(self, index):
+        self.result[index] = 1
+        self.queue.append(index)
+
+    def build(self):
+        """
+        Return the table as bytes, 8 positions per byte
+        """
+        self.findTerminalPositions()
+        self.propagate()
+        packed = bytearray(POSITIONS // 8)
+        result = self.result
+        for byte in range(POSITIONS // 8):
+            bits = 0
+            for bit in range(8):
+                if result[byte * 8 + bit]:
+                    bits |= 1 << bit
+            packed[byte] = bits
+        return bytes(packed)
+
+    def findTerminalPositions(self):
+        """
+        Generate the legal moves of every position: mark the weak side's checkmates as lost, count the weak side's
+        moves, and mark the promotions of KPK that lead into a won KQK position as won
+        """
+        gs = self.gs
+        for strongKing in range(64):
+            for weakKing in range(64):
+                if weakKing == strongKing or weakKing in self.kingNeighbours(strongKing):
+                    continue
+                for pieceSquare in range(64):
+                    if pieceSquare == strongKing or pieceSquare == weakKing:
+                        continue
+                    if self.piece == "wp" and not 8 <= pieceSquare < 56:  # pawns never stand on the first or last row
+                        continue
+                    self.place(strongKing, weakKing, pieceSquare)
+                    # strong side to move: the weak king may not be in check
+                    if not self.isWeakKingAttacked(weakKing):
+                        gs.whiteToMove = True
+                        for move in gs.getValidMoves():
+                            if move.pawnPromotion and self.isPromotionWin(strongKing, weakKing,
+                                                                          move.endRow * 8 + move.endCol):
+                                self.resolve(positionIndex(strongKing, weakKing, pieceSquare, True))
+                                break
+                    # weak side to move
+                    gs.whiteToMove = False
+                    moves = gs.getValidMoves()
+                    index = positionIndex(strongKing, weakKing, pieceSquare, False)
+                    if gs.checkmate:
+                        self.resolve(index)
+                    elif gs.stalemate or any(move.isCapture for move in moves):
+                        self.moveCounts[index] = ESCAPES
+                    else:
+                        self.moveCounts[index] = len(moves)
+                    self.clear(strongKing, weakKing, pieceSquare)
+
+    def isPromotionWin(self, strongKing, weakKing, queenSquare):
+        index = positionIndex(strongKing, weakKing, queenSquare, False)
+        return self.promotionTable[index >> 3] >> (index & 7) & 1
+
+    def kingNeighbours(self, square):
+        return [row * 8 + col for row, col in ChessEngine.kingAttacks[square]]
+
+    def propagate(self):
+        """
+        Walk backwards from every position whose result is known until no new results turn up
+        """
+        while self.queue:
+            index = self.queue.popleft()
+            strongToMove = index & 1 == 0
+            pieceSquare = index >> 1 & 63
+            weakKing = index >> 7 & 63
+            strongKing = index >> 13
+            self.place(strongKing, weakKing, pieceSquare)
+            if strongToMove:  # a won position: the weak king came from somewhere, that position lost a way out
+                for origin in self.getWeakKingOrigins(strongKing, weakKing):
+                    previous = positionIndex(strongKing, origin, pieceSquare, False)
+                    if self.result[previous] or self.moveCounts[previous] == ESCAPES:
+                        continue
+                    self.moveCounts[previous] -= 1
+                    if self.moveCounts[previous] == 0:  # every move leads into a won position
+                        self.resolve(previous)
+            else:  # a lost position: whatever the strong side moved there from wins
+                for previousKing, previousPiece in self.getStrongOrigins(strongKing, weakKing, pieceSquare):
+                    previous = positionIndex(previousKing, weakKing, previousPiece, True)
+                    if not self.result[previous]:
+                        self.resolve(previous)
+            self.clear(strongKing, weakKing, pieceSquare)
+
+    def getWeakKingOrigins(self, strongKing, weakKing):
+        """
+        The squares the weak king can have come from: empty, next to it and not next to the strong king
+        """
+        board = self.gs.board
+        strongNeighbours = self.kingNeighbours(strongKing)
+        return [origin for origin in self.kingNeighbours(weakKing)
+                if board[origin >> 3][origin & 7] == "--" and origin not in strongNeighbours]
+
+    def getStrongOrigins(self, strongKing, weakKing, pieceSquare):
+        """
+        The (strong king, piece) squares of the positions the strong side can have moved from. The weak king must not
+        have been in check there, since it would have been the strong side's turn.
+        """
+        board = self.gs.board
+        origins = []
+        weakNeighbours = self.kingNeighbours(weakKing)
+        # king moves
+        for origin in self.kingNeighbours(strongKing):
+            if board[origin >> 3][origin & 7] == "--" and origin not in weakNeighbours:
+                origins.append((origin, pieceSquare))
+        # piece moves: a queen or rook slides back along any free line, a pawn steps back down the board
+        pieceOrigins = []
+        if self.piece == "wp":
+            if pieceSquare + 8 < 56 and board[(pieceSquare >> 3) + 1][pieceSquare & 7] == "--":
+                pieceOrigins.append(pieceSquare + 8)
+                if pieceSquare >> 3 == 4 and board[6][pieceSquare & 7] == "--":  # a double step from the second rank
+                    pieceOrigins.append(pieceSquare + 16)
+        else:
+            for rowStep, colStep in self.directions:
+                row, col = (pieceSquare >> 3) + rowStep, (pieceSquare & 7) + colStep
+                while 0 <= row < 8 and 0 <= col < 8 and board[row][col] == "--":
+                    pieceOrigins.append(row * 8 + col)
+                    row += rowStep
+                    col += colStep
+        for origin in pieceOrigins:
+            origins.append((strongKing, origin))
+        # keep the ones where the weak king was not in check
+        legalOrigins = []
+        for previousKing, previousPiece in origins:
+            self.clear(strongKing, weakKing, pieceSquare)
+            self.place(previousKing, weakKing, previousPiece)
+            if not self.isWeakKingAttacked(weakKing):
+                legalOrigins.append((previousKing, previousPiece))
+            self.clear(previousKing, weakKing, previousPiece)
+            self.place(strongKing, weakKing, pieceSquare)
+        return legalOrigins
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the endgame bitbases.")
+    parser.add_argument("command", choices=["build"], help="build the bitbase files")
+    parser.add_argument("--endings", nargs="+", default=list(ENDINGS), choices=ENDINGS, help="endings to build")
+    args = parser.parse_args(argv)
+    os.makedirs(BITBASE_DIR, exist_ok=True)
+    for ending in ENDINGS:  # always in dependency order
+        if ending not in args.endings:
+            continue
+        startTime = time.perf_counter()
+        table = BitbaseBuilder(ending).build()
+        with open(os.path.join(BITBASE_DIR, ending + ".bin"), "wb") as tableFile:
+            tableFile.write(table)
+        tables.pop(ending, None)  # load the new file on the next lookup
+        wins = sum(bin(byte).count("1") for byte in table)
+        print("%s: %d won or lost positions, %d bytes, built in %.1fs" % (ending, wins, len(table),
+                                                                         time.perf_counter() - startTime))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
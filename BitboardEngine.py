@@ -0,0 +1,387 @@
+"""
+This module provides an alternate backend for the GameState class that keeps the position as bitboards. Every piece
+type of every color is stored as one 64-bit integer where bit (row * 8 + col) is set when the piece stands on that
+square, and the occupancy of each color is kept as two more masks. Move generation and attack detection are then done
+with mask operations instead of walking the board square by square.
+
+The 8x8 board list of the ChessEngine.GameState is still kept up to date, so the class is a drop-in replacement for the
+GUI in Main and for the AI in SmartMoveFinder: makeMove, undoMove and getValidMoves work exactly the same way.
+
+Note that keeping both representations in sync costs most of what the mask operations save: on the perft positions
+this backend is only about 5-10% faster than the list backend, so it is no reason on its own to switch backends.
+"""
+
+import ChessEngine
+from ChessEngine import Move
+
+pieces = ['bR', 'bN', 'bB', 'bQ', 'bK', 'bp', 'wR', 'wN', 'wB', 'wQ', 'wK', 'wp']  # every piece that can be on the board
+allSquares = (1 << 64) - 1  # mask with every square of the board set
+
+# The eight directions a sliding piece can move in, as (row step, column step). The first four are the orthogonal
+# directions used by rooks, the last four the diagonal directions used by bishops. Queens use all eight.
+directions = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+orthogonalDirections = (0, 1, 2, 3)
+diagonalDirections = (4, 5, 6, 7)
+# A direction is positive when walking in it increases the square number. The nearest blocker on a positive ray is the
+# lowest set bit of the blockers, on a negative ray it is the highest set bit.
+positiveDirection = tuple(d[0] * 8 + d[1] > 0 for d in directions)
+
+
+def buildStepAttacks(steps):
+    """
+    Build a table holding, for every square, the mask of the squares reachable with one of the given steps
+    """
+    table = []
+    for square in range(64):
+        row, col = divmod(square, 8)
+        mask = 0
+        for rowStep, colStep in steps:
+            endRow = row + rowStep
+            endCol = col + colStep
+            if 0 <= endRow < 8 and 0 <= endCol < 8:  # only keep the steps that stay on the board
+                mask |= 1 << (endRow * 8 + endCol)
+        table.append(mask)
+    return table
+
+
+def buildRays():
+    """
+    Build a table holding, for every direction and every square, the mask of all squares from that square to the edge
+    of the board in that direction (the square itself is not included)
+    """
+    rays = []
+    for rowStep, colStep in directions:
+        directionRays = []
+        for square in range(64):
+            row, col = divmod(square, 8)
+            mask = 0
+            for i in range(1, 8):
+                endRow = row + rowStep * i
+                endCol = col + colStep * i
+                if 0 <= endRow < 8 and 0 <= endCol < 8:
+                    mask |= 1 << (endRow * 8 + endCol)
+                else:
+                    break
+            directionRays.append(mask)
+        rays.append(directionRays)
+    return rays
+
+
+def buildBetween():
+    """
+    Build a table holding, for every pair of squares on the same line, the mask of the squares strictly between them.
+    Pairs that don't share a rank, file or diagonal get an empty mask.
+    """
+    between = [[0] * 64 for _ in range(64)]
+    for square in range(64):
+        for d in range(8):
+            ray = rayMasks[d][square]
+            while ray:
+                lowestBit = ray & -ray
+                target = lowestBit.bit_length() - 1
+                ray ^= lowestBit
+                # the squares between are the ray from the start minus the ray from the target (and the target itself)
+                between[square][target] = rayMasks[d][square] & ~rayMasks[d][target] & ~(1 << target)
+    return between
+
+
+# precomputed tables, built once when the module is imported
+knightAttacks = buildStepAttacks(((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)))
+kingAttacks = buildStepAttacks(directions)
+# squares attacked by a pawn of the given color standing on a square; white pawns move up the board (towards row 0)
+pawnAttacks = {"w": buildStepAttacks(((-1, -1), (-1, 1))), "b": buildStepAttacks(((1, -1), (1, 1)))}
+rayMasks = buildRays()
+betweenMasks = buildBetween()
+
+
+def slidingAttacks(square, occupied, directionIndexes):
+    """
+    Return the mask of squares attacked from the square along the given directions, stopping at the first occupied
+    square of each ray (that square is included, it may hold a piece to capture)
+    """
+    attacks = 0
+    for d in directionIndexes:
+        ray = rayMasks[d][square]
+        blockers = ray & occupied
+        if blockers:
+            if positiveDirection[d]:
+                firstBlocker = (blockers & -blockers).bit_length() - 1
+            else:
+                firstBlocker = blockers.bit_length() - 1
+            ray ^= rayMasks[d][firstBlocker]  # cut off everything behind the first blocker
+        attacks |= ray
+    return attacks
+
+
+def bitSquares(mask):
+    """
+    Yield the square number of every set bit of the mask, lowest first
+    """
+    while mask:
+        lowestBit = mask & -mask
+        yield lowestBit.bit_length() - 1
+        mask ^= lowestBit
+
+
+class BitboardGameState(ChessEngine.GameState):
+    """
+    GameState that additionally keeps one bitboard per piece type and color plus occupancy masks, and uses them to
+    generate the valid moves
+    """
+
+    def __init__(self, fen=None):
+        # one 64-bit integer per piece, e.g. self.pieceBitboards["wN"] holds every square with a white knight
+        self.pieceBitboards = {piece: 0 for piece in pieces}
+        # occupancy of each color
+        self.colorBitboards = {"w": 0, "b": 0}
+        super().__init__(fen)
+        self.loadBitboards()
+
+    def loadFen(self, fen):
+        super().loadFen(fen)
+        self.loadBitboards()
+
+    def loadBitboards(self):
+        """
+        Rebuild all the bitboards from the 8x8 board list
+        """
+        for piece in pieces:
+            self.pieceBitboards[piece] = 0
+        self.colorBitboards["w"] = self.colorBitboards["b"] = 0
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece != "--":
+                    bit = 1 << (row * 8 + col)
+                    self.pieceBitboards[piece] |= bit
+                    self.colorBitboards[piece[0]] |= bit
+
+    def makeMove(self, move):
+        super().makeMove(move)
+        self.toggleMove(move)
+
+    def undoMove(self):
+        if len(self.moveLog) != 0:  # make sure that there is a move to undo
+            self.toggleMove(self.moveLog[-1])
+            super().undoMove()
+
+    def toggleMove(self, move):
+        """
+        Flip the bits changed by the move. Because xor is its own inverse the same function both makes and undoes it.
+        """
+        pieceBitboards = self.pieceBitboards
+        color = move.pieceMoved[0]
+        startBit = 1 << (move.startRow * 8 + move.startCol)
+        endBit = 1 << (move.endRow * 8 + move.endCol)
+        # the piece leaves its start square, and arrives on the end square (as a queen if the pawn promotes)
+        pieceBitboards[move.pieceMoved] ^= startBit
+        if move.pawnPromotion:
+            pieceBitboards[color + "Q"] ^= endBit
+        else:
+            pieceBitboards[move.pieceMoved] ^= endBit
+        self.colorBitboards[color] ^= startBit | endBit
+        # remove the captured piece, which for en passant stands beside the start square
+        if move.enPassant:
+            capturedBit = 1 << (move.startRow * 8 + move.endCol)
+            pieceBitboards[move.pieceCaptured] ^= capturedBit
+            self.colorBitboards[move.pieceCaptured[0]] ^= capturedBit
+        elif move.pieceCaptured != "--":
+            pieceBitboards[move.pieceCaptured] ^= endBit
+            self.colorBitboards[move.pieceCaptured[0]] ^= endBit
+        # castling also moves the rook
+        if move.castle:
+            rowStart = move.endRow * 8
+            if move.endCol - move.startCol == 2:  # kingside: rook goes from the h-file to the f-file
+                rookBits = (1 << (rowStart + 7)) | (1 << (rowStart + 5))
+            else:  # queenside: rook goes from the a-file to the d-file
+                rookBits = (1 << rowStart) | (1 << (rowStart + 3))
+            pieceBitboards[color + "R"] ^= rookBits
+            self.colorBitboards[color] ^= rookBits
+
+    def attackersTo(self, square, color, occupied):
+        """
+        Return the mask of the pieces of the given color that attack the square, with sliding pieces blocked by the
+        occupied mask
+        """
+        pieceBitboards = self.pieceBitboards
+        enemyColor = "b" if color == "w" else "w"
+        # a pawn of this color attacks the square exactly when a pawn of the other color on the square would attack it
+        attackers = pawnAttacks[enemyColor][square] & pieceBitboards[color + "p"]
+        attackers |= knightAttacks[square] & pieceBitboards[color + "N"]
+        attackers |= kingAttacks[square] & pieceBitboards[color + "K"]
+        queens = pieceBitboards[color + "Q"]
+        rooksAndQueens = pieceBitboards[color + "R"] | queens
+        if rooksAndQueens:
+            attackers |= slidingAttacks(square, occupied, orthogonalDirections) & rooksAndQueens
+        bishopsAndQueens = pieceBitboards[color + "B"] | queens
+        if bishopsAndQueens:
+            attackers |= slidingAttacks(square, occupied, diagonalDirections) & bishopsAndQueens
+        return attackers
+
+    def isSquareAttacked(self, square, byColor):
+        """
+        Determine if a piece of the color byColor attacks the square numbered row * 8 + col
+        """
+        occupied = self.colorBitboards["w"] | self.colorBitboards["b"]
+        return self.attackersTo(square, byColor, occupied) != 0
+
+    def getPinMasks(self, kingSquare, allyColor, enemyColor, occupied):
+        """
+        Return a dictionary mapping the square of every pinned allied piece to the mask of squares it may still move to:
+        the squares between the king and the pinning piece, plus the pinning piece itself
+        """
+        pinMasks = {}
+        pieceBitboards = self.pieceBitboards
+        queens = pieceBitboards[enemyColor + "Q"]
+        rooksAndQueens = pieceBitboards[enemyColor + "R"] | queens
+        bishopsAndQueens = pieceBitboards[enemyColor + "B"] | queens
+        allyPieces = self.colorBitboards[allyColor]
+        for d in range(8):
+            ray = rayMasks[d][kingSquare]
+            sliders = rooksAndQueens if d < 4 else bishopsAndQueens
+            if not ray & sliders:  # no enemy piece on this ray can pin
+                continue
+            blockers = ray & occupied
+            if positiveDirection[d]:
+                first = (blockers & -blockers).bit_length() - 1
+            else:
+                first = blockers.bit_length() - 1
+            if not (1 << first) & allyPieces:  # the first piece has to be ours to be pinned
+                continue
+            beyond = rayMasks[d][first] & occupied
+            if not beyond:
+                continue
+            if positiveDirection[d]:
+                second = (beyond & -beyond).bit_length() - 1
+            else:
+                second = beyond.bit_length() - 1
+            if (1 << second) & sliders:  # an enemy slider of the right kind behind our piece: it is pinned
+                pinMasks[first] = betweenMasks[kingSquare][second] | (1 << second)
+        return pinMasks
+
+    def generateMoves(self):
+        """
+        all moves considering checks, generated directly from the bitboards. While capturesOnly is set the target masks
+        are cut down to the enemy pieces, plus the promotion squares for pawn pushes.
+        """
+        moves = []
+        board = self.board
+        pieceBitboards = self.pieceBitboards
+        if self.whiteToMove:
+            allyColor, enemyColor = "w", "b"
+            kingRow, kingCol = self.whiteKingPosition
+            pawnStep = -8  # white pawns move towards row 0
+            pawnStartRow = 6
+        else:
+            allyColor, enemyColor = "b", "w"
+            kingRow, kingCol = self.blackKingLocation
+            pawnStep = 8
+            pawnStartRow = 1
+        allyPieces = self.colorBitboards[allyColor]
+        enemyPieces = self.colorBitboards[enemyColor]
+        occupied = allyPieces | enemyPieces
+        empty = ~occupied & allSquares
+        kingSquare = kingRow * 8 + kingCol
+        # the squares moves may go to: anywhere that isn't ours, or only the enemy pieces for the quiescence search
+        destinations = enemyPieces if self.capturesOnly else ~allyPieces & allSquares
+
+        checkers = self.attackersTo(kingSquare, enemyColor, occupied)
+        self.inCheck = checkers != 0
+
+        # king moves: the king itself is removed from the occupancy so it can't hide behind itself from a slider
+        occupiedWithoutKing = occupied ^ (1 << kingSquare)
+        for target in bitSquares(kingAttacks[kingSquare] & destinations):
+            if not self.attackersTo(target, enemyColor, occupiedWithoutKing):
+                moves.append(Move((kingRow, kingCol), divmod(target, 8), board))
+
+        # in double check only the king can move
+        if checkers & (checkers - 1) == 0:
+            if checkers:
+                # in single check the other pieces must capture the checking piece or block the line to the king
+                checkerSquare = checkers.bit_length() - 1
+                checkMask = betweenMasks[kingSquare][checkerSquare] | checkers
+            else:
+                checkMask = allSquares
+            pinMasks = self.getPinMasks(kingSquare, allyColor, enemyColor, occupied)
+            targetMask = destinations & checkMask
+
+            for square in bitSquares(pieceBitboards[allyColor + "N"]):
+                if square in pinMasks:  # a pinned knight can never move
+                    continue
+                start = divmod(square, 8)
+                for target in bitSquares(knightAttacks[square] & targetMask):
+                    moves.append(Move(start, divmod(target, 8), board))
+
+            queens = pieceBitboards[allyColor + "Q"]
+            for sliders, directionIndexes in ((pieceBitboards[allyColor + "R"] | queens, orthogonalDirections),
+                                              (pieceBitboards[allyColor + "B"] | queens, diagonalDirections)):
+                for square in bitSquares(sliders):
+                    start = divmod(square, 8)
+                    targets = slidingAttacks(square, occupied, directionIndexes) & targetMask
+                    targets &= pinMasks.get(square, allSquares)
+                    for target in bitSquares(targets):
+                        moves.append(Move(start, divmod(target, 8), board))
+
+            self.getPawnMoves(moves, allyColor, enemyColor, pawnStep, pawnStartRow, kingSquare, occupied, empty,
+                              checkMask, pinMasks)
+
+            if not checkers and not self.capturesOnly:
+                self.getBitboardCastleMoves(moves, kingRow, kingCol, enemyColor, occupied)
+        return moves
+
+    def getPawnMoves(self, moves, allyColor, enemyColor, pawnStep, pawnStartRow, kingSquare, occupied, empty,
+                     checkMask, pinMasks):
+        """
+        Add the pawn pushes, captures and en passant captures of the player to move
+        """
+        board = self.board
+        enemyPieces = self.colorBitboards[enemyColor]
+        epBit = 0
+        if self.ValidenPassant != ():
+            epBit = 1 << (self.ValidenPassant[0] * 8 + self.ValidenPassant[1])
+        # in the quiescence search the only pushes wanted are the ones that promote, onto the first or last row
+        pushTargets = 0xFF000000000000FF if self.capturesOnly else allSquares
+        for square in bitSquares(self.pieceBitboards[allyColor + "p"]):
+            start = divmod(square, 8)
+            allowed = checkMask & pinMasks.get(square, allSquares)
+            # one and two square advances
+            oneStep = square + pawnStep
+            if (1 << oneStep) & empty:
+                if (1 << oneStep) & allowed & pushTargets:
+                    moves.append(Move(start, divmod(oneStep, 8), board))
+                twoSteps = oneStep + pawnStep
+                if start[0] == pawnStartRow and not self.capturesOnly and (1 << twoSteps) & empty & allowed:
+                    moves.append(Move(start, divmod(twoSteps, 8), board))
+            # captures
+            attacks = pawnAttacks[allyColor][square]
+            for target in bitSquares(attacks & enemyPieces & allowed):
+                moves.append(Move(start, divmod(target, 8), board))
+            # en passant: the only move that removes a piece from a square other than its end square, so the king's
+            # safety is checked on the board as it would be after the capture
+            if attacks & epBit:
+                epSquare = epBit.bit_length() - 1
+                capturedBit = 1 << (epSquare - pawnStep)
+                occupiedAfter = (occupied ^ (1 << square) ^ capturedBit) | epBit
+                if not self.attackersTo(kingSquare, enemyColor, occupiedAfter) & ~capturedBit:
+                    moves.append(Move(start, divmod(epSquare, 8), board, enPassant=True))
+
+    def getBitboardCastleMoves(self, moves, kingRow, kingCol, enemyColor, occupied):
+        """
+        Add the castle moves of the player to move, who is known not to be in check
+        """
+        if self.whiteToMove:
+            kingside = self.castlingRights & ChessEngine.WHITE_KINGSIDE
+            queenside = self.castlingRights & ChessEngine.WHITE_QUEENSIDE
+        else:
+            kingside = self.castlingRights & ChessEngine.BLACK_KINGSIDE
+            queenside = self.castlingRights & ChessEngine.BLACK_QUEENSIDE
+        kingSquare = kingRow * 8 + kingCol
+        # the squares between king and rook must be empty and the king may not pass over an attacked square
+        if kingside and not occupied & (0b11 << (kingSquare + 1)):
+            if not self.attackersTo(kingSquare + 1, enemyColor, occupied) and \
+                    not self.attackersTo(kingSquare + 2, enemyColor, occupied):
+                moves.append(Move((kingRow, kingCol), (kingRow, kingCol + 2), self.board, castle=True))
+        if queenside and not occupied & (0b111 << (kingSquare - 3)):
+            if not self.attackersTo(kingSquare - 1, enemyColor, occupied) and \
+                    not self.attackersTo(kingSquare - 2, enemyColor, occupied):
+                moves.append(Move((kingRow, kingCol), (kingRow, kingCol - 2), self.board, castle=True))
@@ -2,12 +2,166 @@
 This class is responsible for storing all the information about the current state of a chess game and
 determining the valid moves at the current state. It will also keep a move log.
 """
+import random
+
+"""
+Zobrist hashing: every (piece, square) pair, the side to move, every castling right and every en passant file gets a
+random 64-bit number. The key of a position is the xor of the numbers of everything that is true in it, so a move only
+has to xor in and out the numbers of what it changed. The generator is seeded so keys are the same in every process.
+"""
+zobristRandom = random.Random(350)
+zobristPieces = {piece: [zobristRandom.getrandbits(64) for _ in range(64)]
+                 for piece in ['bR', 'bN', 'bB', 'bQ', 'bK', 'bp', 'wR', 'wN', 'wB', 'wQ', 'wK', 'wp']}
+zobristBlackToMove = zobristRandom.getrandbits(64)
+zobristCastling = [zobristRandom.getrandbits(64) for _ in range(4)]  # wks, bks, wqs, bqs
+zobristEnPassant = [zobristRandom.getrandbits(64) for _ in range(8)]  # one number per file
+
+"""
+Irreversible state. The castling rights are the bits of one integer, and everything a move can't give back by itself
+(castling rights, en passant file, captured piece) is packed into one small integer on the undo stack of the game state.
+"""
+WHITE_KINGSIDE = 1
+BLACK_KINGSIDE = 2
+WHITE_QUEENSIDE = 4
+BLACK_QUEENSIDE = 8
+ALL_CASTLING_RIGHTS = 15
+
+# the xor of the Zobrist numbers of every combination of castling rights
+zobristCastlingRights = [0] * 16
+for rights in range(16):
+    for bit in range(4):
+        if rights & (1 << bit):
+            zobristCastlingRights[rights] ^= zobristCastling[bit]
+
+# the castling rights that survive a move from or to each square: moving the king or a rook, or capturing a rook on its
+# starting square, takes away the rights that need it
+castlingRightsKept = [ALL_CASTLING_RIGHTS] * 64
+castlingRightsKept[7 * 8 + 4] = ALL_CASTLING_RIGHTS & ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)  # e1
+castlingRightsKept[7 * 8 + 0] = ALL_CASTLING_RIGHTS & ~WHITE_QUEENSIDE  # a1
+castlingRightsKept[7 * 8 + 7] = ALL_CASTLING_RIGHTS & ~WHITE_KINGSIDE  # h1
+castlingRightsKept[0 * 8 + 4] = ALL_CASTLING_RIGHTS & ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)  # e8
+castlingRightsKept[0 * 8 + 0] = ALL_CASTLING_RIGHTS & ~BLACK_QUEENSIDE  # a8
+castlingRightsKept[0 * 8 + 7] = ALL_CASTLING_RIGHTS & ~BLACK_KINGSIDE  # h8
+
+# the captured piece is stored by its index in this list, 0 being no capture
+pieceCodes = ["--", "wp", "wN", "wB", "wR", "wQ", "wK", "bp", "bN", "bB", "bR", "bQ", "bK"]
+pieceIndexes = {piece: index for index, piece in enumerate(pieceCodes)}
+
+# The en passant square is stored by its file plus one, 0 being none. It lies on the sixth rank when white is to move
+# and on the third rank when black is, so enPassantSquares[whiteToMove][file + 1] gives it back. The tuples are made
+# once here, as are the (row, col) tuples of every square in boardSquares, so moves don't have to build new ones.
+enPassantSquares = {True: [()] + [(2, col) for col in range(8)], False: [()] + [(5, col) for col in range(8)]}
+boardSquares = [[(row, col) for col in range(8)] for row in range(8)]
+
+UNDO_STACK_SIZE = 512  # plies the undo stack of a game state has room for, it doubles when a game gets longer
+
+"""
+Evaluation tables. ScoreOfPiece is the material value of each piece in pawns. The piece-square tables add a bonus or
+penalty in tenths of a pawn for where a piece stands, written from white's side of the board (row 0 is the eighth rank);
+black pieces use the same tables mirrored vertically.
+"""
+ScoreOfPiece = {"K": 0, "Q": 10, "R": 5, "B": 3, "N": 3, "p": 1} #maps the value of each chess piece to a point system
+MATERIAL_SCALE = 10  # one point of material is worth this many piece-square points
+
+piecePositionScores = {
+    "N": [[-5, -4, -3, -3, -3, -3, -4, -5],
+          [-4, -2, 0, 0, 0, 0, -2, -4],
+          [-3, 0, 1, 2, 2, 1, 0, -3],
+          [-3, 1, 2, 2, 2, 2, 1, -3],
+          [-3, 0, 2, 2, 2, 2, 0, -3],
+          [-3, 1, 1, 2, 2, 1, 1, -3],
+          [-4, -2, 0, 1, 1, 0, -2, -4],
+          [-5, -4, -3, -3, -3, -3, -4, -5]],
+    "B": [[-2, -1, -1, -1, -1, -1, -1, -2],
+          [-1, 0, 0, 0, 0, 0, 0, -1],
+          [-1, 0, 1, 1, 1, 1, 0, -1],
+          [-1, 1, 1, 1, 1, 1, 1, -1],
+          [-1, 0, 1, 1, 1, 1, 0, -1],
+          [-1, 1, 1, 1, 1, 1, 1, -1],
+          [-1, 1, 0, 0, 0, 0, 1, -1],
+          [-2, -1, -1, -1, -1, -1, -1, -2]],
+    "R": [[0, 0, 0, 0, 0, 0, 0, 0],
+          [1, 1, 1, 1, 1, 1, 1, 1],
+          [-1, 0, 0, 0, 0, 0, 0, -1],
+          [-1, 0, 0, 0, 0, 0, 0, -1],
+          [-1, 0, 0, 0, 0, 0, 0, -1],
+          [-1, 0, 0, 0, 0, 0, 0, -1],
+          [-1, 0, 0, 0, 0, 0, 0, -1],
+          [0, 0, 0, 1, 1, 0, 0, 0]],
+    "Q": [[-2, -1, -1, 0, 0, -1, -1, -2],
+          [-1, 0, 0, 0, 0, 0, 0, -1],
+          [-1, 0, 1, 1, 1, 1, 0, -1],
+          [0, 0, 1, 1, 1, 1, 0, 0],
+          [0, 0, 1, 1, 1, 1, 0, 0],
+          [-1, 1, 1, 1, 1, 1, 0, -1],
+          [-1, 0, 1, 0, 0, 0, 0, -1],
+          [-2, -1, -1, 0, 0, -1, -1, -2]],
+    "K": [[-3, -4, -4, -5, -5, -4, -4, -3],
+          [-3, -4, -4, -5, -5, -4, -4, -3],
+          [-3, -4, -4, -5, -5, -4, -4, -3],
+          [-3, -4, -4, -5, -5, -4, -4, -3],
+          [-2, -3, -3, -4, -4, -3, -3, -2],
+          [-1, -2, -2, -2, -2, -2, -2, -1],
+          [2, 2, 0, 0, 0, 0, 2, 2],
+          [2, 3, 1, 0, 0, 1, 3, 2]],
+    "p": [[0, 0, 0, 0, 0, 0, 0, 0],
+          [5, 5, 5, 5, 5, 5, 5, 5],
+          [1, 1, 2, 3, 3, 2, 1, 1],
+          [0, 0, 1, 2, 2, 1, 0, 0],
+          [0, 0, 0, 2, 2, 0, 0, 0],
+          [0, 0, -1, 0, 0, -1, 0, 0],
+          [0, 1, 1, -2, -2, 1, 1, 0],
+          [0, 0, 0, 0, 0, 0, 0, 0]]
+}
+
+# The same tables indexed by piece and square number (row * 8 + col) with the sign of the piece's color already applied,
+# so a score update is a single lookup: white pieces count positive, black pieces negative.
+materialScores = {}
+pieceSquareScores = {}
+for pieceType in ScoreOfPiece:
+    materialScores["w" + pieceType] = ScoreOfPiece[pieceType]
+    materialScores["b" + pieceType] = -ScoreOfPiece[pieceType]
+    pieceSquareScores["w" + pieceType] = [piecePositionScores[pieceType][sq // 8][sq % 8] for sq in range(64)]
+    pieceSquareScores["b" + pieceType] = [-piecePositionScores[pieceType][7 - sq // 8][sq % 8] for sq in range(64)]
+
+"""
+Attack tables, built once at import. For every square number (row * 8 + col) they list the (row, col) squares a piece
+standing there attacks, so finding out whether a square is attacked is a few table walks instead of generating moves.
+"""
+# the eight directions a sliding piece moves in, orthogonal ones (rook) first, then diagonal ones (bishop)
+attackDirections = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+
+
+def buildStepTable(steps):
+    """
+    For every square, the squares reachable with one of the given (row, col) steps
+    """
+    table = []
+    for square in range(64):
+        row, col = divmod(square, 8)
+        table.append(tuple((row + rowStep, col + colStep) for rowStep, colStep in steps
+                           if 0 <= row + rowStep < 8 and 0 <= col + colStep < 8))
+    return table
+
+
+knightAttacks = buildStepTable(((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)))
+kingAttacks = buildStepTable(attackDirections)
+# the squares from which a pawn of the given color attacks a square: white pawns capture towards row 0, so a white
+# pawn attacking a square stands one row below it
+pawnAttackers = {"w": buildStepTable(((1, -1), (1, 1))), "b": buildStepTable(((-1, -1), (-1, 1)))}
+# for every direction and square, the squares from the nearest one to the edge of the board
+rayAttacks = [[tuple((row + rowStep * i, col + colStep * i) for i in range(1, 8)
+                     if 0 <= row + rowStep * i < 8 and 0 <= col + colStep * i < 8)
+               for row, col in (divmod(square, 8) for square in range(64))]
+              for rowStep, colStep in attackDirections]
+
 
 class GameState:
     # This class represents the state of a chess game.
 
-    def __init__(self):
-        # This method is called when a new instance of GameState is created.
+    def __init__(self, fen=None):
+        # This method is called when a new instance of GameState is created. It starts from the initial position, or
+        # from the position described by fen when one is given.
 
         # Create a 2D list to represent the chess board.
         self.board = [
@@ -53,23 +207,319 @@ class GameState:
         # A list of checks on the board.
         self.checks = []
 
+        # The pinned pieces by square number (row * 8 + col) and the direction of their pin, built from the pins.
+        self.pinDirections = {}
+
+        # While generating the moves out of a single check: the square numbers that capture the checking piece or block
+        # the check. None when not in check.
+        self.checkBlockSquares = None
+
+        # While generating the moves for the quiescence search: only captures and promotions are generated.
+        self.capturesOnly = False
+
         # A boolean indicating whether the king is in check.
         self.inCheck = False
 
         # The coordinates of the square where en passant capture is possible.
         self.ValidenPassant = ()
-        self.ValidenPassantLog = [self.ValidenPassant]
 
-        # The current castling rights of the players.
-        self.currentCastlingRight = CastleRights(True, True, True, True)
-        self.castleRightsLog = [CastleRights(
-            self.currentCastlingRight.wks,
-            self.currentCastlingRight.bks,
-            self.currentCastlingRight.wqs,
-            self.currentCastlingRight.bqs
-        )]
+        # The current castling rights of the players, as the bits WHITE_KINGSIDE, BLACK_KINGSIDE, WHITE_QUEENSIDE and
+        # BLACK_QUEENSIDE.
+        self.castlingRights = ALL_CASTLING_RIGHTS
+
+        # The 64-bit Zobrist key of the current position.
+        self.zobristKey = self.computeZobristKey()
+
+        # The Zobrist key of the pawns alone, the part of zobristKey for the white and black pawns. It only changes when
+        # a pawn moves, is captured or promotes, and keys the evaluation's pawn structure table.
+        self.pawnKey = self.computePawnKey()
+
+        # Two slots for every move in the log, allocated up front: the Zobrist key of the position before the move and
+        # the packed irreversible state (castling rights | en passant file + 1 << 4 | captured piece index << 8).
+        # makeMove writes the slots of the ply it makes and undoMove reads them back, so neither allocates anything.
+        self.undoStack = [0] * (2 * UNDO_STACK_SIZE)
+
+        # Running material (in ScoreOfPiece points) and piece-square scores, white minus black. makeMove and undoMove
+        # adjust them by what the move changed, so evaluating a position doesn't need to scan the board.
+        self.materialScore, self.positionScore = self.computeScores()
+
+        # Number of pieces on the board, kings included, kept up to date the same way.
+        self.pieceCount = self.countPieces()
+
+        # Number of knights, bishops, rooks and queens of white (index 0) and black (index 1), kept up to date the same
+        # way, so the search can tell a pawn ending from the counts instead of scanning the board.
+        self.nonPawnCounts = self.countNonPawnPieces()
+
+        # The halfmove clock and fullmove number of the starting position, see loadFen and getFen.
+        self.fenHalfMoves = 0
+        self.fenFullMoves = 1
+
+        # The Zobrist key and en passant square from before every null move that hasn't been undone yet, see
+        # makeNullMove.
+        self.nullMoveStack = []
+
+        if fen is not None:
+            self.loadFen(fen)
+
+    def loadFen(self, fen):
+        """
+        Set up the position described by a FEN string (Forsyth-Edwards Notation), e.g. the initial position is
+        "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1". The move log is cleared.
+        """
+        fields = fen.split()
+        rows = fields[0].split("/")
+        if len(rows) != 8:
+            raise ValueError("FEN board must have 8 rows: " + fen)
+        for row in range(8):
+            col = 0
+            boardRow = []
+            for char in rows[row]:
+                if char.isdigit():  # a digit is that many empty squares
+                    boardRow.extend(["--"] * int(char))
+                else:  # a letter is a piece, uppercase for white and lowercase for black
+                    color = "w" if char.isupper() else "b"
+                    pieceType = "p" if char in "pP" else char.upper()
+                    if pieceType not in ScoreOfPiece:
+                        raise ValueError("unknown piece %r in FEN: %s" % (char, fen))
+                    boardRow.append(color + pieceType)
+                    if pieceType == "K":
+                        if color == "w":
+                            self.whiteKingPosition = (row, len(boardRow) - 1)
+                        else:
+                            self.blackKingLocation = (row, len(boardRow) - 1)
+            if len(boardRow) != 8:
+                raise ValueError("FEN row %d must have 8 squares: %s" % (row + 1, fen))
+            self.board[row] = boardRow
+
+        # side to move, castling rights and en passant square; the remaining fields are optional
+        self.whiteToMove = len(fields) < 2 or fields[1] == "w"
+        castling = fields[2] if len(fields) > 2 else "-"
+        self.castlingRights = ((WHITE_KINGSIDE if "K" in castling else 0) | (BLACK_KINGSIDE if "k" in castling else 0) |
+                               (WHITE_QUEENSIDE if "Q" in castling else 0) | (BLACK_QUEENSIDE if "q" in castling else 0))
+        enPassant = fields[3] if len(fields) > 3 else "-"
+        if enPassant == "-":
+            self.ValidenPassant = ()
+        else:
+            self.ValidenPassant = (Move.ranksToRows[enPassant[1]], Move.filesToCols[enPassant[0]])
+        # the move counters, kept to write them back in getFen
+        self.fenHalfMoves = int(fields[4]) if len(fields) > 4 else 0
+        self.fenFullMoves = int(fields[5]) if len(fields) > 5 else 1
+
+        # start a new game from this position
+        self.moveLog = []
+        self.nullMoveStack = []
+        self.checkmate = False
+        self.stalemate = False
+        self.zobristKey = self.computeZobristKey()
+        self.pawnKey = self.computePawnKey()
+        self.materialScore, self.positionScore = self.computeScores()
+        self.pieceCount = self.countPieces()
+        self.nonPawnCounts = self.countNonPawnPieces()
+
+    def getFen(self):
+        """
+        Return the FEN string of the current position, the reverse of loadFen. The halfmove clock counts the plies
+        since the last capture or pawn move and the fullmove number goes up after every black move, both continuing
+        from the counters of the starting position.
+        """
+        rows = []
+        for boardRow in self.board:
+            row = ""
+            empty = 0
+            for square in boardRow:
+                if square == "--":
+                    empty += 1
+                    continue
+                if empty:
+                    row += str(empty)
+                    empty = 0
+                row += square[1].upper() if square[0] == "w" else square[1].lower()
+            rows.append(row + (str(empty) if empty else ""))
+        castling = "".join(char for char, right in (("K", WHITE_KINGSIDE), ("Q", WHITE_QUEENSIDE),
+                                                     ("k", BLACK_KINGSIDE), ("q", BLACK_QUEENSIDE))
+                           if self.castlingRights & right) or "-"
+        enPassant = "-"
+        if self.ValidenPassant:
+            enPassant = Move.colsToFiles[self.ValidenPassant[1]] + Move.rowsToRanks[self.ValidenPassant[0]]
+        halfMoves = 0
+        for move in reversed(self.moveLog):  # count back to the last capture or pawn move
+            if move.isCapture or move.pieceMoved[1] == "p":
+                break
+            halfMoves += 1
+        else:
+            halfMoves += self.fenHalfMoves
+        # black moves played since the start: half the plies, plus one when black moved first
+        startedWithBlack = self.whiteToMove == (len(self.moveLog) % 2 == 1)
+        fullMoves = self.fenFullMoves + (len(self.moveLog) + startedWithBlack) // 2
+        return "%s %s %s %s %d %d" % ("/".join(rows), "w" if self.whiteToMove else "b", castling, enPassant,
+                                      halfMoves, fullMoves)
+
+    # When True, every makeMove and undoMove checks the running scores against a full recompute. Only for debugging.
+    debugScores = False
+
+    def computeScores(self):
+        """
+        Compute the material and piece-square scores of the current position from scratch
+        """
+        material = 0
+        position = 0
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece != "--":
+                    material += materialScores[piece]
+                    position += pieceSquareScores[piece][row * 8 + col]
+        return material, position
+
+    def countPieces(self):
+        """
+        Count the pieces on the board from scratch
+        """
+        return sum(1 for row in self.board for piece in row if piece != "--")
+
+    def countNonPawnPieces(self):
+        """
+        Count the knights, bishops, rooks and queens of each color from scratch, white first
+        """
+        pieces = [piece for row in self.board for piece in row if piece[1] in "NBRQ"]
+        return [sum(1 for piece in pieces if piece[0] == "w"), sum(1 for piece in pieces if piece[0] == "b")]
+
+    def updateScores(self, move, sign):
+        """
+        Add (sign 1) or take back (sign -1) the change the move makes to the running material and piece-square scores,
+        the piece counts, and to the pawn key when the move moves or captures a pawn
+        """
+        pieceMoved = move.pieceMoved
+        endSquare = move.endRow * 8 + move.endCol
+        positionDelta = -pieceSquareScores[pieceMoved][move.startRow * 8 + move.startCol]
+        materialDelta = 0
+        if move.pawnPromotion:  # the pawn becomes a queen on the end square
+            promotedPiece = pieceMoved[0] + "Q"
+            positionDelta += pieceSquareScores[promotedPiece][endSquare]
+            materialDelta += materialScores[promotedPiece] - materialScores[pieceMoved]
+            self.nonPawnCounts[pieceMoved[0] == "b"] += sign
+        else:
+            positionDelta += pieceSquareScores[pieceMoved][endSquare]
+        if move.pieceCaptured != "--":
+            # an en passant capture takes the pawn beside the start square instead of on the end square
+            capturedSquare = move.startRow * 8 + move.endCol if move.enPassant else endSquare
+            positionDelta -= pieceSquareScores[move.pieceCaptured][capturedSquare]
+            materialDelta -= materialScores[move.pieceCaptured]
+            self.pieceCount -= sign
+            if move.pieceCaptured[1] in "NBRQ":
+                self.nonPawnCounts[move.pieceCaptured[0] == "b"] -= sign
+        if move.castle:  # the rook moves as well
+            rook = pieceMoved[0] + "R"
+            rowStart = move.endRow * 8
+            if move.endCol - move.startCol == 2:  # kingside
+                positionDelta += pieceSquareScores[rook][rowStart + 5] - pieceSquareScores[rook][rowStart + 7]
+            else:  # queenside
+                positionDelta += pieceSquareScores[rook][rowStart + 3] - pieceSquareScores[rook][rowStart]
+        self.materialScore += sign * materialDelta
+        self.positionScore += sign * positionDelta
+        if pieceMoved[1] == "p" or move.pieceCaptured[1] == "p":  # xor is its own inverse, the sign doesn't matter
+            self.pawnKey ^= self.getPawnKeyChange(move)
+        if self.debugScores and (self.materialScore, self.positionScore) != self.computeScores():
+            raise AssertionError("running scores %s drifted from the recomputed scores %s after %s"
+                                 % ((self.materialScore, self.positionScore), self.computeScores(),
+                                    "making" if sign == 1 else "undoing"))
+        if self.debugScores and self.nonPawnCounts != self.countNonPawnPieces():
+            raise AssertionError("piece counts %s drifted from the recounted %s after %s"
+                                 % (self.nonPawnCounts, self.countNonPawnPieces(), "making" if sign == 1 else "undoing"))
+        if self.debugScores and self.pawnKey != self.computePawnKey():
+            raise AssertionError("pawn key drifted from the recomputed key after %s"
+                                 % ("making" if sign == 1 else "undoing"))
+
+    def computePawnKey(self):
+        """
+        Compute the pawn key of the current position from scratch
+        """
+        key = 0
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece == "wp" or piece == "bp":
+                    key ^= zobristPieces[piece][row * 8 + col]
+        return key
+
+    @staticmethod
+    def getPawnKeyChange(move):
+        """
+        Return the xor of the pawn Zobrist numbers the move adds or removes: the moved pawn leaves its start square
+        and arrives on the end square unless it promotes, and a captured pawn leaves its square
+        """
+        change = 0
+        if move.pieceMoved[1] == "p":
+            change ^= zobristPieces[move.pieceMoved][move.startRow * 8 + move.startCol]
+            if not move.pawnPromotion:
+                change ^= zobristPieces[move.pieceMoved][move.endRow * 8 + move.endCol]
+        if move.pieceCaptured[1] == "p":
+            capturedSquare = move.startRow * 8 + move.endCol if move.enPassant else move.endRow * 8 + move.endCol
+            change ^= zobristPieces[move.pieceCaptured][capturedSquare]
+        return change
+
+    def computeZobristKey(self):
+        """
+        Compute the Zobrist key of the current position from scratch
+        """
+        key = 0
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece != "--":
+                    key ^= zobristPieces[piece][row * 8 + col]
+        if not self.whiteToMove:
+            key ^= zobristBlackToMove
+        key ^= self.getCastlingZobrist()
+        key ^= self.getEnPassantZobrist()
+        return key
+
+    def getCastlingZobrist(self):
+        """
+        Return the xor of the Zobrist numbers of the castling rights that are still available
+        """
+        return zobristCastlingRights[self.castlingRights]
+
+    def getEnPassantZobrist(self):
+        """
+        Return the Zobrist number of the en passant file, or 0 when no pawn of the player to move stands beside the pawn
+        that just moved two squares. As in Polyglot, an en passant capture nobody can make doesn't change the key, so
+        the position is the same whether it was reached by a double step or not.
+        """
+        if self.ValidenPassant == ():
+            return 0
+        col = self.ValidenPassant[1]
+        # the pawn that moved two squares stands on row 3 when white is to move, on row 4 when black is
+        row, pawn = (3, "wp") if self.whiteToMove else (4, "bp")
+        if (col > 0 and self.board[row][col - 1] == pawn) or (col < 7 and self.board[row][col + 1] == pawn):
+            return zobristEnPassant[col]
+        return 0
+
+    @property
+    def currentCastlingRight(self):
+        """
+        The castling rights as a CastleRights object, built from the bits in castlingRights. Changing it has no effect.
+        """
+        rights = self.castlingRights
+        return CastleRights(bool(rights & WHITE_KINGSIDE), bool(rights & BLACK_KINGSIDE),
+                            bool(rights & WHITE_QUEENSIDE), bool(rights & BLACK_QUEENSIDE))
 
     def makeMove(self, move):
+        # save the key of the position before the move and the state the move can't give back on the undo stack
+        ply = 2 * len(self.moveLog)
+        if ply == len(self.undoStack):  # a long game, make room for as many plies again
+            self.undoStack.extend([0] * ply)
+        self.undoStack[ply] = self.zobristKey
+        enPassantFile = self.ValidenPassant[1] + 1 if self.ValidenPassant != () else 0
+        self.undoStack[ply + 1] = self.castlingRights | enPassantFile << 4 | pieceIndexes[move.pieceCaptured] << 8
+        # take out the castling rights and en passant file that the move may change, they are put back in once they
+        # are updated
+        key = self.zobristKey ^ zobristCastlingRights[self.castlingRights] ^ zobristBlackToMove
+        key ^= self.getEnPassantZobrist()
+        # the moved piece leaves its start square, and a captured piece leaves the end square
+        key ^= zobristPieces[move.pieceMoved][move.startRow * 8 + move.startCol]
+        if move.pieceCaptured != "--" and not move.enPassant:
+            key ^= zobristPieces[move.pieceCaptured][move.endRow * 8 + move.endCol]
         # set the ending square of the piece that is being moved to the piece
         self.board[move.endRow][move.endCol] = move.pieceMoved
         # set the starting square of the piece that was moved to empty
@@ -80,12 +530,12 @@ class GameState:
         self.whiteToMove = not self.whiteToMove
         # update the location of the king if it was moved
         if move.pieceMoved == "wK":
-            self.whiteKingPosition = (move.endRow, move.endCol)
+            self.whiteKingPosition = boardSquares[move.endRow][move.endCol]
         elif move.pieceMoved == "bK":
-            self.blackKingLocation = (move.endRow, move.endCol)
+            self.blackKingLocation = boardSquares[move.endRow][move.endCol]
         # if a pawn moved two squares, set the en passant square for the next move
         if move.pieceMoved[1] == "p" and abs(move.startRow - move.endRow) == 2:
-            self.ValidenPassant = ((move.endRow + move.startRow) // 2, move.endCol)
+            self.ValidenPassant = enPassantSquares[self.whiteToMove][move.endCol + 1]
         else:
             self.ValidenPassant = ()
         # if it is an en passant move, remove the captured pawn from the board
@@ -104,82 +554,61 @@ class GameState:
             else:  # queenside castle move
                 self.board[move.endRow][move.endCol + 1] = self.board[move.endRow][move.endCol - 2]  # moves the rook
                 self.board[move.endRow][move.endCol - 2] = "--"  # erase old rook
-        # add the en passant square to the en passant log
-        self.ValidenPassantLog.append(self.ValidenPassant)
         # update the castling rights
         self.updateCastleRights(move)
-        # add the current castling rights to the log
-        self.castleRightsLog.append(CastleRights(self.currentCastlingRight.wks, self.currentCastlingRight.bks,
-                                                 self.currentCastlingRight.wqs, self.currentCastlingRight.bqs))
+        # finish the Zobrist key: the piece that now stands on the end square, the captured en passant pawn, the rook
+        # moved by castling and the new castling rights and en passant file
+        key ^= zobristPieces[self.board[move.endRow][move.endCol]][move.endRow * 8 + move.endCol]
+        if move.enPassant:
+            key ^= zobristPieces[move.pieceCaptured][move.startRow * 8 + move.endCol]
+        if move.castle:
+            rook = move.pieceMoved[0] + "R"
+            if move.endCol - move.startCol == 2:  # kingside: rook goes from the h-file to the f-file
+                key ^= zobristPieces[rook][move.endRow * 8 + 7] ^ zobristPieces[rook][move.endRow * 8 + 5]
+            else:  # queenside: rook goes from the a-file to the d-file
+                key ^= zobristPieces[rook][move.endRow * 8] ^ zobristPieces[rook][move.endRow * 8 + 3]
+        key ^= zobristCastlingRights[self.castlingRights]
+        key ^= self.getEnPassantZobrist()
+        self.zobristKey = key
+        # update the running material and piece-square scores
+        self.updateScores(move, 1)
 
     def updateCastleRights(self, move):
         """
-        Update the castle rights given the moves
+        Update the castle rights given the moves. The king or a rook moving away from its starting square, or a rook
+        being captured on it, takes away the rights that need that piece.
         """
-        # If the King moves, they lose the right to castle
-        if move.pieceMoved == "wK":
-            self.currentCastlingRight.wks = False
-            self.currentCastlingRight.wqs = False
-        elif move.pieceMoved == "bK":
-            self.currentCastlingRight.bks = False
-            self.currentCastlingRight.bqs = False
-        # If a rook moves from its initial position, it loses the right to castle in that direction
-        elif move.pieceMoved == "wR":
-            if move.startRow == 7:
-                if move.startCol == 0:  # left rook
-                    self.currentCastlingRight.wqs = False
-                elif move.startCol == 7:  # right rook
-                    self.currentCastlingRight.wks = False
-        elif move.pieceMoved == "bR":
-            if move.startRow == 0:
-                if move.startCol == 0:  # left rook
-                    self.currentCastlingRight.bqs = False
-                elif move.startCol == 7:  # right rook
-                    self.currentCastlingRight.bks = False
-        # If a rook is captured, the player loses the right to castle in that direction
-        if move.pieceCaptured == 'wR':
-            if move.endRow == 7:
-                if move.endCol == 0:
-                    self.currentCastlingRight.wqs = False
-                elif move.endCol == 7:
-                    self.currentCastlingRight.wks = False
-        elif move.pieceCaptured == 'bR':
-            if move.endRow == 0:
-                if move.endCol == 0:
-                    self.currentCastlingRight.bqs = False
-                elif move.endCol == 7:
-                    self.currentCastlingRight.bks = False
+        self.castlingRights &= (castlingRightsKept[move.startRow * 8 + move.startCol] &
+                                castlingRightsKept[move.endRow * 8 + move.endCol])
 
     def undoMove(self):
 
         if len(self.moveLog) != 0:  # MAKE SURE THAT THERE IS A MOVE TO UNDO
             move = self.moveLog.pop()  # get the last move from the move log and remove it
+            # read back the key and the packed state saved by makeMove
+            ply = 2 * len(self.moveLog)
+            state = self.undoStack[ply + 1]
+            pieceCaptured = pieceCodes[state >> 8]
             # undo the move by setting the start square to the moved piece and the end square to the captured piece (if any)
             self.board[move.startRow][move.startCol] = move.pieceMoved
-            self.board[move.endRow][move.endCol] = move.pieceCaptured
+            self.board[move.endRow][move.endCol] = pieceCaptured
             self.whiteToMove = not self.whiteToMove  # swap players
 
             # update the King's location if moved
             if move.pieceMoved == "wK":
-                self.whiteKingPosition = (move.startRow, move.startCol)
+                self.whiteKingPosition = boardSquares[move.startRow][move.startCol]
             elif move.pieceMoved == "bK":
-                self.blackKingLocation = (move.startRow, move.startCol)
+                self.blackKingLocation = boardSquares[move.startRow][move.startCol]
 
             # undo enpassant is different
             if move.enPassant:
                 self.board[move.endRow][move.endCol] = "--"  # removes the pawn that was added in the wrong square
                 # puts thw pawn back on  the correct square it was captured from
-                self.board[move.startRow][move.endCol] = move.pieceCaptured
+                self.board[move.startRow][move.endCol] = pieceCaptured
 
-            self.ValidenPassantLog.pop()  # remove the last enpassant square from the log
-            self.ValidenPassant = self.ValidenPassantLog[
-                -1]  # set the current enpassant square to the last one in the log
-
-            # undo castling rights
-            self.castleRightsLog.pop()  # remove the new castle rights from the move we are undoing
-            # set the current castle rights to the last one in the list
-            newRights = self.castleRightsLog[-1]
-            self.currentCastlingRight = CastleRights(newRights.wks, newRights.bks, newRights.wqs, newRights.bqs)
+            # restore the en passant square and the castling rights from before the move
+            self.ValidenPassant = enPassantSquares[self.whiteToMove][state >> 4 & 15]
+            self.castlingRights = state & 15
 
             # undo castle move
             if move.castle:
@@ -192,16 +621,74 @@ class GameState:
                     self.board[move.endRow][move.endCol - 2] = self.board[move.endRow][move.endCol + 1]
                     self.board[move.endRow][move.endCol + 1] = "--"  # remove the rook from the new square
 
+            # restore the Zobrist key of the position before the move
+            self.zobristKey = self.undoStack[ply]
+            # take back the change the move made to the running scores
+            self.updateScores(move, -1)
+
             # Add
             self.checkmate = False  # reset the checkmate flag
             self.stalemate = False  # reset the stalemate flag
 
+    def makeNullMove(self):
+        """
+        Pass the turn to the opponent without moving anything, for the null move pruning of the search. Only the side
+        to move, the en passant square and the Zobrist key change; the move log doesn't, so undoMove and everything
+        that reads the log never see a null move. Must not be made while in check, and must be taken back with
+        undoNullMove before the move before it is undone.
+        """
+        self.nullMoveStack.append((self.zobristKey, self.ValidenPassant))
+        key = self.zobristKey ^ self.getEnPassantZobrist() ^ zobristBlackToMove
+        self.ValidenPassant = ()  # the en passant capture was only possible right away
+        self.whiteToMove = not self.whiteToMove
+        self.zobristKey = key
+
+    def undoNullMove(self):
+        """
+        Take back the last null move
+        """
+        self.zobristKey, self.ValidenPassant = self.nullMoveStack.pop()
+        self.whiteToMove = not self.whiteToMove
+
     def getValidMoves(self):
         """
-        all moves considering checks
+        all moves considering checks, setting checkmate or stalemate when there are none
+        """
+        moves = self.generateMoves()
+        if len(moves) == 0:  # either checkMate or staleMate
+            # If in check, then it's a checkmate, else it's a stalemate
+            if self.inCheck:
+                self.checkmate = True
+            else:
+                self.stalemate = True
+        else:
+            # If there are moves available, it's neither checkmate nor stalemate
+            self.checkmate = False
+            self.stalemate = False
+        return moves
+
+    def getCaptureMoves(self):
+        """
+        the legal captures and promotions only, for the quiescence search. The same generators as for getValidMoves
+        are used, they skip the quiet moves while capturesOnly is set so those are never created. Having no captures
+        doesn't mean the game is over, so checkmate and stalemate are left alone; inCheck is set as usual.
+        """
+        self.capturesOnly = True
+        moves = self.generateMoves()
+        self.capturesOnly = False
+        return moves
+
+    def generateMoves(self):
+        """
+        all moves considering checks. The pins and checks found by checkForPinsAndChecks are used while the moves are
+        generated: a pinned piece only moves along the line of its pin, and in check the other pieces only move to a
+        square that captures the checking piece or blocks the check. Every generated move is legal, so none of them
+        has to be made and undone to test it.
         """
         moves = []  # empty list to store possible moves
         self.inCheck, self.pins, self.checks = self.checkForPinsAndChecks()  # check for pins and checks
+        # per-square pin lookup: the square number (row * 8 + col) of every pinned piece and the direction of its pin
+        self.pinDirections = {pin[0] * 8 + pin[1]: (pin[2], pin[3]) for pin in self.pins}
         if self.whiteToMove:
             kingRow = self.whiteKingPosition[0]  # row of white king
             kingCol = self.whiteKingPosition[1]  # column of white king
@@ -211,62 +698,33 @@ class GameState:
 
         if self.inCheck:
             if len(self.checks) == 1:  # if only one check, block check or move king
-                moves = self.getAllPossiblemoves()  # get all possible moves
                 # to block a check you must move a piece into one of the squares between the enemy piece and king
                 check = self.checks[0]  # check information
                 checkRow = check[0]  # row of checking piece
                 checkCol = check[1]  # column of checking piece
                 pieceChecking = self.board[checkRow][checkCol]  # enemy piece causing the check
-                AvailiableSquares = []  # squares that pieces can move to
                 # if Knight, must capture knight or move king, other pieces can be blocked
                 if pieceChecking[1] == "N":
-                    AvailiableSquares = [(checkRow, checkCol)]  # add square that knight can be captured
+                    self.checkBlockSquares = {checkRow * 8 + checkCol}  # add square that knight can be captured
                 else:
+                    self.checkBlockSquares = set()
                     for i in range(1, 8):
-                        AvailiableSquare = (kingRow + check[2] * i,
-                                            kingCol + check[3] * i)  # check[2] and check[3] are the check directions
-                        AvailiableSquares.append(AvailiableSquare)  # add available square
+                        # check[2] and check[3] are the check directions
+                        AvailiableSquare = (kingRow + check[2] * i, kingCol + check[3] * i)
+                        self.checkBlockSquares.add(AvailiableSquare[0] * 8 + AvailiableSquare[1])
                         if AvailiableSquare[0] == checkRow and AvailiableSquare[1] == checkCol:
                             # once you get to piece end checks
                             break
-                # get rid of any moves that don't block check or move king
-                for i in range(len(moves) - 1, -1, -1):
-                    # go through backwards when you are removing from a list as iterating
-                    if moves[i].pieceMoved[1] != "K":  # move doesn't move king, so it must block or capture
-                        if not (moves[i].endRow, moves[i].endCol) in AvailiableSquares:
-                            # move doesn't block or capture piece
-                            moves.remove(moves[i])  # remove move that doesn't block or capture
+                # the generators only add the moves of the other pieces that land on one of these squares
+                moves = self.getAllPossiblemoves()
+                self.checkBlockSquares = None
             else:  # double check, king has to move
-                self.getKingMoves(kingRow, kingCol, moves)  # get possible king moves
+                self.getMovesForKing(kingRow, kingCol, moves)  # get possible king moves
         else:  # not in check so all moves are fine
             moves = self.getAllPossiblemoves()  # get all possible moves
-
-        if len(moves) == 0:  # either checkMate or staleMate
-            # If in check, then it's a checkmate, else it's a stalemate
-            if self.inCheck:
-                self.checkmate = True
-            else:
-                self.stalemate = True
-        else:
-            # If there are moves available, it's neither checkmate nor stalemate
-            self.checkmate = False
-            self.stalemate = False
-
-        # Get castle moves for the current player
-        if self.whiteToMove:
-            self.getCastleMoves(self.whiteKingPosition[0], self.whiteKingPosition[1], moves)
-        else:
-            self.getCastleMoves(self.blackKingLocation[0], self.blackKingLocation[1], moves)
-
-        # Filter out moves that leave the king in check
-        safeMoves = []
-        for move in moves:
-            self.makeMove(move)
-            self.inCheck, _, _ = self.checkForPinsAndChecks()
-            if not self.inCheck:
-                safeMoves.append(move)
-            self.undoMove()
-
+            # Get castle moves for the current player
+            if not self.capturesOnly:
+                self.getCastleMoves(kingRow, kingCol, moves)
         return moves
 
     def checkForPinsAndChecks(self):
@@ -351,18 +809,40 @@ class GameState:
             return self.squareUnderAttack(self.blackKingLocation[0], self.blackKingLocation[1])
 
     def squareUnderAttack(self, r, c):
+        """
+        Determine if the opponent of the player to move attacks the square at (r, c)
+        """
+        return self.isSquareAttacked(r * 8 + c, "b" if self.whiteToMove else "w")
 
-        # Switch to the opponent's turn by changing the value of self.whiteToMove
-        self.whiteToMove = not self.whiteToMove
-        # Get all possible moves for the opponent (not the current player)
-        oopMoves = self.getAllPossiblemoves()
-        # Switch back to the current player's turn
-        self.whiteToMove = not self.whiteToMove
-        # Loop over all the opponent's possible moves and check if any of them can attack the square at position (r, c)
-        for move in oopMoves:
-            if move.endRow == r and move.endCol == c:  # square is under attack
+    def isSquareAttacked(self, square, byColor):
+        """
+        Determine if a piece of the color byColor ("w" or "b") attacks the square numbered row * 8 + col. This walks the
+        precomputed attack tables outward from the square and doesn't create any moves.
+        """
+        board = self.board
+        # a knight, pawn or king attacks the square if it stands on one of the squares it would attack it from
+        knight = byColor + "N"
+        for r, c in knightAttacks[square]:
+            if board[r][c] == knight:
+                return True
+        pawn = byColor + "p"
+        for r, c in pawnAttackers[byColor][square]:
+            if board[r][c] == pawn:
                 return True
-        # Return False if no opponent's moves can attack the square at position (r, c)
+        king = byColor + "K"
+        for r, c in kingAttacks[square]:
+            if board[r][c] == king:
+                return True
+        # sliding pieces: the first piece on every ray must be a rook or queen (orthogonal) or a bishop or queen (diagonal)
+        queen = byColor + "Q"
+        for d in range(8):
+            slider = byColor + "R" if d < 4 else byColor + "B"
+            for r, c in rayAttacks[d][square]:
+                piece = board[r][c]
+                if piece != "--":
+                    if piece == slider or piece == queen:
+                        return True
+                    break
         return False
 
     def getAllPossiblemoves(self):
@@ -382,161 +862,113 @@ class GameState:
         """
         Get all the pawn moves for the pawn located at row, col and add these moves to the list
         """
-        # Initialize variables for checking if the pawn is pinned and in which direction
-        piecePinned = False
-        pinDirection = ()
+        # Look up whether the pawn is pinned and in which direction
+        pinDirection = self.pinDirections.get(r * 8 + c)
+        # When in check, the squares that capture the checking piece or block the check
+        blockSquares = self.checkBlockSquares
 
-        # Check for pinned pawns and set piecePinned and pinDirection accordingly
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
-
-        # Determine moveAmount, startRow, backRow, enemyColor, and the location of the king based on which player is moving
+        # Determine moveAmount, startRow, enemyColor, and the location of the king based on which player is moving
         if self.whiteToMove:
             moveAmount = -1
             startRow = 6
-            backRow = 0
             enemyColor = "b"
             kingRow, kingCol = self.whiteKingPosition
         else:
             moveAmount = 1
             startRow = 1
-            backRow = 7
             enemyColor = "w"
             kingRow, kingCol = self.blackKingLocation
 
-        # Initialize variable for checking if a pawn can be promoted
-        pawnPromotion = False
-
-
-
-        if self.board[r + moveAmount][c] == "--": #this code block checks if the pawn can make a one-square pawn advance
+        endRow = r + moveAmount
+        # only captures and promotions are wanted in the quiescence search, so no pushes unless they promote
+        pushes = not self.capturesOnly or endRow == 0 or endRow == 7
+        if pushes and self.board[endRow][c] == "--": #this code block checks if the pawn can make a one-square pawn advance
 
-            # If the pawn is not pinned or the pinDirection is in the same direction as the pawn move
-            if not piecePinned or pinDirection == (moveAmount, 0):
-                # If the pawn reaches the backRow, then it is a pawn promotion move
-                if r + moveAmount == backRow:
-                    pawnPromotion = True
-
-                # Add the pawn move to the list of possible moves
-                moves.append(Move((r, c), (r + moveAmount, c), self.board, pawnPromotion=pawnPromotion))
+            # If the pawn is not pinned or pinned along its file (the pin can come from either side of the king)
+            if pinDirection is None or pinDirection == (moveAmount, 0) or pinDirection == (-moveAmount, 0):
+                # Add the pawn move to the list of possible moves (the move knows when it is a promotion)
+                if blockSquares is None or endRow * 8 + c in blockSquares:
+                    moves.append(Move((r, c), (endRow, c), self.board))
 
                 # This code block checks if the pawn can make a two-square pawn advance from the starting row
-                if r == startRow and self.board[r + 2 * moveAmount][c] == "--":
-                    # Add the two-square pawn move to the list of possible moves
-                    moves.append(Move((r, c), (r + 2 * moveAmount, c), self.board))
-
-        if c - 1 >= 0:  # checks if pawn can capture a piece to the left
-            # If there is an enemy piece to the left of the pawn, add the capture move to the list of possible moves
-            if not piecePinned or pinDirection == (moveAmount, -1):
-                if self.board[r + moveAmount][c - 1][0] == enemyColor: # If the pawn reaches the backRow, then it is a pawn promotion move
-                    if r + moveAmount == backRow:
-                        pawnPromotion = True
-                    moves.append(Move((r, c), (r + moveAmount, c - 1), self.board, pawnPromotion=pawnPromotion))
-
-                # This code block checks if the pawn can perform en passant capture to the left
-                if (r + moveAmount, c - 1) == self.ValidenPassant:
-                    attackingPiece = blockingPiece = False
-                    # If the king is on the same row as the pawn
-                    if kingRow == r:
-                        if kingCol < c:  # king is left of the pawn
-                            # inside range between king and the pawn, outside range between pawn border
-                            insideRange = range(kingCol + 1, c - 1)
-                            outsideRange = range(c + 1, 8)
-                        else:  # if the king is right of the pawn
-                            insideRange = range(kingCol - 1, c, -1)
-                            outsideRange = (c - 2, -1, -1)
-
-                        # Check if there are any other pieces between the king and the pawn (excluding the en passant pawn)
-                        for i in insideRange:
-                            if self.board[r][i] != "--":  # some other piece beside the enpassant pawn blocks
-                                blockingPiece = True
-
-                        # Check if there is any attacking piece (rook or queen) beyond the en passant pawn's border
-                        for i in outsideRange:
-                            square = self.board[r][i]
-                            if square[0] == enemyColor and (square[1] == "R" or square[1] == "Q"):  # attacking piece
-                                attackingPiece = True
-                            elif square != "--":
-                                blockingPiece = True
-
-                    # If there are no attacking or blocking pieces, add the en passant capture move to the list of possible moves
-                    if not attackingPiece or blockingPiece:
-                        moves.append(Move((r, c), (r + moveAmount, c - 1), self.board, enPassant=True))
-
-        if c + 1 <= 7:  # check if capturing to the right is possible
-            if not piecePinned or pinDirection == (moveAmount, 1):  # if not pinned or pinned in the same direction
-                if self.board[r + moveAmount][c + 1][0] == enemyColor:  # if there is an enemy piece to capture
-                    if r + moveAmount == backRow:  # if pawn reaches the back rank, it can promote
-                        pawnPromotion = True
-                    moves.append(Move((r, c), (r + moveAmount, c + 1), self.board,
-                                      pawnPromotion=pawnPromotion))  # add move to list
-                if (r + moveAmount, c + 1) == self.ValidenPassant:  # if en passant capture is possible
-                    attackingPiece = blockingPiece = False
-                    if kingRow == r:
-                        if kingCol < c:  # king is left of the pawn
-                            # inside range between king and the pawn, outside range between pawn border
-                            insideRange = range(kingCol + 1, c)
-                            outsideRange = range(c + 2, 8)
-                        else:  # king is right of the pawn
-                            insideRange = range(kingCol - 1, c + 1, -1)
-                            outsideRange = (c - 1, -1, -1)
-                        for i in insideRange:
-                            if self.board[r][i] != "--":  # some other piece beside the en passant pawn blocks
-                                blockingPiece = True
-                        for i in outsideRange:
-                            square = self.board[r][i]
-                            if square[0] == enemyColor and (square[1] == "R" or square[1] == "Q"):  # attacking piece
-                                attackingPiece = True
-                            elif square != "--":
-                                blockingPiece = True
-                    if not attackingPiece or blockingPiece:
-                        moves.append(Move((r, c), (r + moveAmount, c + 1), self.board,
-                                          enPassant=True))  # add en passant move to list
+                if r == startRow and not self.capturesOnly and self.board[r + 2 * moveAmount][c] == "--":
+                    if blockSquares is None or (r + 2 * moveAmount) * 8 + c in blockSquares:
+                        # Add the two-square pawn move to the list of possible moves
+                        moves.append(Move((r, c), (r + 2 * moveAmount, c), self.board))
+
+        for colStep in (-1, 1):  # captures to the left and to the right
+            endCol = c + colStep
+            if not 0 <= endCol <= 7:
+                continue
+            # the pawn may only capture if it is not pinned or pinned along the diagonal of the capture
+            if pinDirection is not None and pinDirection != (moveAmount, colStep) \
+                    and pinDirection != (-moveAmount, -colStep):
+                continue
+            # If there is an enemy piece there, add the capture move to the list of possible moves
+            if self.board[endRow][endCol][0] == enemyColor:
+                if blockSquares is None or endRow * 8 + endCol in blockSquares:
+                    moves.append(Move((r, c), (endRow, endCol), self.board))
+
+            # This code block checks if the pawn can perform an en passant capture
+            elif (endRow, endCol) == self.ValidenPassant:
+                # in check, the capture must land on a blocking square or take the pawn that is giving check
+                if blockSquares is not None and endRow * 8 + endCol not in blockSquares \
+                        and r * 8 + endCol not in blockSquares:
+                    continue
+                # both pawns leave the row, which may open it between our king and an enemy rook or queen
+                if kingRow == r and self.enPassantExposesKing(r, c, endCol, kingCol, enemyColor):
+                    continue
+                moves.append(Move((r, c), (endRow, endCol), self.board, enPassant=True))
+
+    def enPassantExposesKing(self, r, c, capturedCol, kingCol, enemyColor):
+        """
+        Determine if capturing en passant with the pawn at (r, c) would leave the king on the same row in check, because
+        the capturing and the captured pawn were the only pieces between the king and an enemy rook or queen
+        """
+        step = 1 if capturedCol > kingCol else -1  # walk from the king towards the two pawns and beyond
+        col = kingCol + step
+        while 0 <= col <= 7:
+            if col != c and col != capturedCol:  # both pawns will be gone from the row
+                square = self.board[r][col]
+                if square != "--":
+                    return square[0] == enemyColor and (square[1] == "R" or square[1] == "Q")
+            col += step
+        return False
 
     def getMovesForRook(self, r, c, moves):
         """
         Get all the Rock moves for the Rock located at row, col and add these moves to the list
         """
-        piecePinned = False  # flag to indicate if the rook is pinned
-        pinDirection = ()  # direction of the pin
-        # loop through all the pins and check if the rook is pinned
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                if self.board[r][c][1] != "Q":
-                    # can't remove queen from pin on rock moves, only remove it on bishop moves
-                    self.pins.remove(self.pins[i])  # remove the pin if it is not a queen
-                break
+        pinDirection = self.pinDirections.get(r * 8 + c)  # direction of the pin, None if the rook is not pinned
+        blockSquares = self.checkBlockSquares  # when in check, the squares that stop the check
 
         directions = ((-1, 0), (0, -1), (1, 0), (0, 1))  # up, left, down, right
         enemyColor = "b" if self.whiteToMove else "w"  # determine the enemy color
         # loop through all the directions
         for d in directions:
+            # check if the rook is not pinned or if it is moving in the pinned direction
+            # or if it is moving in the opposite direction of the pin
+            if pinDirection is not None and pinDirection != d and pinDirection != (-d[0], -d[1]):
+                continue
             # loop through all the squares in the direction
             for i in range(1, 8):
                 endRow = r + d[0] * i
                 endCol = c + d[1] * i
                 # check if the square is on the board
                 if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    # check if the rook is not pinned or if it is moving in the pinned direction
-                    # or if it is moving in the opposite direction of the pin
-                    if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):
-                        endPiece = self.board[endRow][endCol]  # piece on the square
-                        # if the square is empty, add the move
-                        if endPiece == "--":
+                    endPiece = self.board[endRow][endCol]  # piece on the square
+                    # if the square is empty, add the move
+                    if endPiece == "--":
+                        if (blockSquares is None or endRow * 8 + endCol in blockSquares) and not self.capturesOnly:
                             moves.append(Move((r, c), (endRow, endCol), self.board))
-                        # if the square has an enemy piece, add the move and stop searching in that direction
-                        elif endPiece[0] == enemyColor:
+                    # if the square has an enemy piece, add the move and stop searching in that direction
+                    elif endPiece[0] == enemyColor:
+                        if blockSquares is None or endRow * 8 + endCol in blockSquares:
                             moves.append(Move((r, c), (endRow, endCol), self.board))
-                            break
-                        # if the square has a friendly piece, stop searching in that direction
-                        else:
-                            break
+                        break
+                    # if the square has a friendly piece, stop searching in that direction
+                    else:
+                        break
                 # if the square is off the board, stop searching in that direction
                 else:
                     break
@@ -545,54 +977,50 @@ class GameState:
         """
         Get all the Knight moves for the Knight located at row, col and add these moves to the list
         """
-        piecePinned = False  # a flag to check if the piece is pinned or not
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:  # if the current piece is pinned
-                piecePinned = True  # set the flag to True
-                self.pins.remove(self.pins[i])  # remove the pin
-                break
+        if r * 8 + c in self.pinDirections:  # a pinned knight can never move along the line of its pin
+            return
+        blockSquares = self.checkBlockSquares  # when in check, the squares that stop the check
         knightMoves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1),
                        (2, 1))  # all possible knight moves (in L shape directions)
         allyColor = "w" if self.whiteToMove else "b"  # get the color of the allies
+        # the squares the knight may not land on: its own pieces, and the empty squares when only captures are wanted
+        skipped = ("-", allyColor) if self.capturesOnly else (allyColor,)
         for m in knightMoves:
             endRow = r + m[0]  # get the row index of the potential end square
             endCol = c + m[1]  # get the column index of the potential end square
             if 0 <= endRow < 8 and 0 <= endCol < 8:  # if the potential end square is on the board
-                if not piecePinned:  # if the current piece is not pinned
-                    endPiece = self.board[endRow][endCol]  # get the piece at the potential end square
-                    if endPiece[0] != allyColor:  # if the piece at the potential end square is not an ally
+                endPiece = self.board[endRow][endCol]  # get the piece at the potential end square
+                if endPiece[0] not in skipped:  # if the piece at the potential end square is not an ally
+                    if blockSquares is None or endRow * 8 + endCol in blockSquares:
                         moves.append(Move((r, c), (endRow, endCol), self.board))  # add the move to the list of possible moves
 
     def getMovesForBishop(self, r, c, moves):
         """
         Get all the Bishop moves for the Bishop located at row, col and add these moves to the list
         """
-        piecePinned = False  # whether the bishop is pinned to the king
-        pinDirection = ()  # the direction of the pin
-        for i in range(len(self.pins) - 1, -1, -1):  # iterate over all the pins
-            if self.pins[i][0] == r and self.pins[i][1] == c:  # if the bishop is pinned
-                piecePinned = True  # bishop is pinned to the king
-                pinDirection = (self.pins[i][2], self.pins[i][3])  # get the pin direction
-                self.pins.remove(self.pins[i])  # remove the pin
-                break
+        pinDirection = self.pinDirections.get(r * 8 + c)  # the direction of the pin, None if the bishop is not pinned
+        blockSquares = self.checkBlockSquares  # when in check, the squares that stop the check
 
         directions = ((-1, -1), (-1, 1), (1, -1), (1, 1))  # possible diagonal directions for bishop
         enemyColor = "b" if self.whiteToMove else "w"  # color of enemy pieces
         for d in directions:
+            # the bishop can only move if it is not pinned or the move is in the direction of the pin
+            if pinDirection is not None and pinDirection != d and pinDirection != (-d[0], -d[1]):
+                continue
             for i in range(1, 8):  # bishop can move up to 7 squares in any direction
                 endRow = r + d[0] * i  # row of potential move
                 endCol = c + d[1] * i  # column of potential move
                 if 0 <= endRow < 8 and 0 <= endCol < 8:  # if the move is on the board
-                    if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):  # if the bishop is not pinned or the move is in the direction of the pin
-                        endPiece = self.board[endRow][endCol]  # get the piece on the potential move square
-                        if endPiece == "--":  # empty space, bishop can move there
+                    endPiece = self.board[endRow][endCol]  # get the piece on the potential move square
+                    if endPiece == "--":  # empty space, bishop can move there
+                        if (blockSquares is None or endRow * 8 + endCol in blockSquares) and not self.capturesOnly:
                             moves.append(Move((r, c), (endRow, endCol), self.board))
-                        elif endPiece[
-                            0] == enemyColor:  # enemy piece, bishop can move there and capture the enemy piece
+                    elif endPiece[0] == enemyColor:  # enemy piece, bishop can move there and capture the enemy piece
+                        if blockSquares is None or endRow * 8 + endCol in blockSquares:
                             moves.append(Move((r, c), (endRow, endCol), self.board))
-                            break
-                        else:  # friendly piece, bishop cannot move there
-                            break
+                        break
+                    else:  # friendly piece, bishop cannot move there
+                        break
                 else:  # move is off the board, bishop cannot move there
                     break
 
@@ -600,31 +1028,25 @@ class GameState:
         """
         Get all the King moves for the King located at row, col and add these moves to the list
         """
-        # Define the moves of a king in row and column directions
-        rowMoves = (-1, -1, -1, 0, 0, 1, 1, 1)
-        colMoves = (-1, 0, 1, -1, 1, -1, 0, 1)
         # Determine the color of the player moving
         allyColor = "w" if self.whiteToMove else "b"
-        # Loop through all the possible moves of the king
-        for i in range(8):
-            endRow = r + rowMoves[i]
-            endCol = c + colMoves[i]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:  # Check if the move is on the board
-                endPiece = self.board[endRow][endCol]
-                if endPiece != allyColor:  # Check if the move is to an empty square or enemy piece
-                    # Place the king on the end square and check for checks
-                    if allyColor == "w":
-                        self.whiteKingPosition = (endRow, endCol)
-                    else:
-                        self.blackKingLocation = (endRow, endCol)
-                    inCheck, pins, checks = self.checkForPinsAndChecks()
-                    if not inCheck:  # If not in check, append the move to the list
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
-                    # Place the king back on its original location
-                    if allyColor == "w":
-                        self.whiteKingPosition = (r, c)
-                    else:
-                        self.blackKingLocation = (r, c)
+        enemyColor = "b" if self.whiteToMove else "w"
+        # the squares the king may not move to: its own pieces, and the empty squares when only captures are wanted
+        skipped = ("-", allyColor) if self.capturesOnly else (allyColor,)
+        # Lift the king off the board while testing the squares, so it can't shield a square behind it from a slider
+        king = self.board[r][c]
+        self.board[r][c] = "--"
+        safeSquares = []
+        # Loop through all the squares next to the king
+        for endRow, endCol in kingAttacks[r * 8 + c]:
+            endPiece = self.board[endRow][endCol]
+            if endPiece[0] not in skipped:  # Check if the move is to an empty square or enemy piece
+                if not self.isSquareAttacked(endRow * 8 + endCol, enemyColor):  # the king may not move into check
+                    safeSquares.append((endRow, endCol))
+        # Place the king back on its original location, then add the moves to the safe squares
+        self.board[r][c] = king
+        for endSquare in safeSquares:
+            moves.append(Move((r, c), endSquare, self.board))
 
     def getMovesForQueen(self, r, c, moves):
         """
@@ -637,20 +1059,20 @@ class GameState:
         """
         Generate all valid castle moves for the king at (r, c) and add them to the list of moves
         """
-        if self.squareUnderAttack(r, c):
+        if self.isSquareAttacked(r * 8 + c, "b" if self.whiteToMove else "w"):
             return  # can't castle while we are in check
-        if (self.whiteToMove and self.currentCastlingRight.wks) or (
-                not self.whiteToMove and self.currentCastlingRight.bks):
+        if self.castlingRights & (WHITE_KINGSIDE if self.whiteToMove else BLACK_KINGSIDE):
             self.getKingsideCastleMoves(r, c, moves)  # call helper function for kingside castle moves
-        if (self.whiteToMove and self.currentCastlingRight.wqs) or (
-                not self.whiteToMove and self.currentCastlingRight.bqs):
+        if self.castlingRights & (WHITE_QUEENSIDE if self.whiteToMove else BLACK_QUEENSIDE):
             self.getQueensideCastleMoves(r, c, moves)  # call helper function for queenside castle moves
 
     def getKingsideCastleMoves(self, r, c, moves):
         # Check if the squares between the king and rook are empty
         if self.board[r][c + 1] == "--" and self.board[r][c + 2] == "--":
             # Check if the king is not in check when it moves to the squares between the king and rook
-            if not self.squareUnderAttack(r, c + 1) and not self.squareUnderAttack(r, c + 2):
+            enemyColor = "b" if self.whiteToMove else "w"
+            if not self.isSquareAttacked(r * 8 + c + 1, enemyColor) and not self.isSquareAttacked(r * 8 + c + 2,
+                                                                                                   enemyColor):
                 # Add the castle move to the list of moves
                 moves.append(Move((r, c), (r, c + 2), self.board, castle=True))
 
@@ -658,7 +1080,9 @@ class GameState:
         # Check if the squares between the king and the rook are empty
         if self.board[r][c - 1] == "--" and self.board[r][c - 2] == "--" and self.board[r][c - 3] == "--":
             # Check if the squares the king moves over are not under attack
-            if not self.squareUnderAttack(r, c - 1) and not self.squareUnderAttack(r, c - 2):
+            enemyColor = "b" if self.whiteToMove else "w"
+            if not self.isSquareAttacked(r * 8 + c - 1, enemyColor) and not self.isSquareAttacked(r * 8 + c - 2,
+                                                                                                   enemyColor):
                 # Add the castle move to the list of moves
                 moves.append(Move((r, c), (r, c - 2), self.board, castle=True))
 
@@ -690,25 +1114,55 @@ first element represents the file and the second element represents the rank.
     filesToCols = {"a": 0, "b": 1, "c": 2, "d": 3, "e": 4, "f": 5, "g": 6, "h": 7}
     colsToFiles = {v: k for k, v in filesToCols.items()}
 
+    # The search creates millions of moves, so they have fixed slots instead of a __dict__, which makes them smaller and
+    # faster to build. The move itself is packed into the 16-bit integer moveID:
+    #   bits 0-5: start square (row * 8 + col), bits 6-11: end square, bits 12-15: the flags below
+    # The other slots hold the same information decoded, because makeMove and undoMove read them all the time.
+    __slots__ = ("startRow", "startCol", "endRow", "endCol", "pieceMoved", "pieceCaptured", "enPassant",
+                 "pawnPromotion", "castle", "isCapture", "moveID")
+    SQUARES_MASK = 0xFFF  # start and end square bits of moveID, two moves are the same move if these are equal
+    EN_PASSANT_FLAG = 1 << 12
+    PROMOTION_FLAG = 1 << 13
+    CASTLE_FLAG = 1 << 14
+    CAPTURE_FLAG = 1 << 15
+
     #initializing variables
     def __init__(self, startSq, endSq, board, enPassant=False, pawnPromotion=False, castle=False):
-        self.startRow = startSq[0]#integer representing the row of the starting square
-        self.startCol = startSq[1]#integer representing the column of the starting square
-        self.endRow = endSq[0]#integer representing the row of the ending square
-        self.endCol = endSq[1]#integer representing the column of the ending square
-        self.pieceMoved = board[self.startRow][self.startCol]# a string representing the piece that was moved (e.g., "wp" for a white pawn)
-        self.pieceCaptured = board[self.endRow][self.endCol]#a string representing the piece that was captured (if any)
+        startRow, startCol = startSq
+        endRow, endCol = endSq
+        self.startRow = startRow#integer representing the row of the starting square
+        self.startCol = startCol#integer representing the column of the starting square
+        self.endRow = endRow#integer representing the row of the ending square
+        self.endCol = endCol#integer representing the column of the ending square
+        self.pieceMoved = pieceMoved = board[startRow][startCol]# a string representing the piece that was moved (e.g., "wp" for a white pawn)
+        if enPassant:
+            pieceCaptured = "bp" if pieceMoved == "wp" else "wp"  # enpassant captures opposite colored pawn
+        else:
+            pieceCaptured = board[endRow][endCol]
+        self.pieceCaptured = pieceCaptured#a string representing the piece that was captured (if any)
 
         self.enPassant = enPassant #a boolean indicating whether the move is an en passant capture
-        self.pawnPromotion = self.pieceMoved[1] == "p" and (self.endRow == 0 or self.endRow == 7)  # indicating whether the move is a pawn promotion
-
-        if enPassant:
-            self.pieceCaptured = "bp" if self.pieceMoved == "wp" else "wp"  # enpassant captures opposite colored pawn
+        # indicating whether the move is a pawn promotion
+        self.pawnPromotion = pawnPromotion = pieceMoved[1] == "p" and (endRow == 0 or endRow == 7)
 
         # castle moves
         self.castle = castle
-        self.isCapture = self.pieceCaptured != "--"
-        self.moveID = self.startRow * 1000 + self.startCol * 100 + self.endRow * 10 + self.endCol
+        self.isCapture = isCapture = pieceCaptured != "--"
+        # start square, end square and flags packed into 16 bits (booleans shift like 0 and 1)
+        self.moveID = (startRow << 3 | startCol | endRow << 9 | endCol << 6 | enPassant << 12 | pawnPromotion << 13
+                       | castle << 14 | isCapture << 15)
+
+    def getChessNotation(self):
+        """
+        Return the move as start and end square, e.g. "e2e4"
+        """
+        return self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+
+    def getRankFile(self, r, c):
+        """
+        Return the name of the square at row r and column c, e.g. "e4"
+        """
+        return self.colsToFiles[c] + self.rowsToRanks[r]
 
     def __eq__(self, other):
         """
@@ -717,9 +1171,15 @@ first element represents the file and the second element represents the rank.
         to be compared using the == operator, and ensures that only Move objects are compared.
         """
         if isinstance(other, Move):
-            return self.moveID == other.moveID
+            return (self.moveID ^ other.moveID) & Move.SQUARES_MASK == 0
         return False
 
+    def __hash__(self):
+        """
+        Moves that are equal have the same start and end squares, so those are hashed
+        """
+        return self.moveID & Move.SQUARES_MASK
+
 
 
     def __str__(self):
@@ -0,0 +1,191 @@
+"""
+Opt-in instrumentation of the move generator and the search, for finding out where a slow search spends its time.
+Nothing is measured until enable() is called: it replaces the measured functions with wrappers that count the calls
+and add up the time spent in them, and disable() puts the original functions back. While disabled the game runs the
+unchanged functions, so there is no overhead at all.
+
+Measured functions (time includes the functions they call, e.g. getValidMoves includes checkForPinsAndChecks):
+
+    makeMove, undoMove, getValidMoves, getCaptureMoves, generateMoves, checkForPinsAndChecks, squareUnderAttack and
+    isSquareAttacked of ChessEngine.GameState and of BitboardEngine.BitboardGameState where it has its own, and
+    evaluation (SmartMoveFinder.scoreBoard)
+
+While enabled every SmartMoveFinder.searchBestMove call also produces a report: a dict with the search's limits, its
+nodes, cutoffs, depth reached and time, one entry per completed iteration with its own nodes, cutoffs and time, the
+transposition table and pawn table counters and the calls and time of every measured function during the search. The
+latest report is kept in lastReport and, when enable() was given an output file, written to it as one line of JSON.
+
+    import Instrumentation
+    Instrumentation.enable(open("search.jsonl", "w"))
+    ...search...
+    Instrumentation.disable()
+
+The searches of the parallel root search's worker processes are not included. See also
+`python SearchBenchmark.py --search --report search.jsonl`.
+"""
+import json
+import time
+
+import BitboardEngine
+import ChessEngine
+import SmartMoveFinder
+
+MEASURED_METHODS = ("makeMove", "undoMove", "getValidMoves", "getCaptureMoves", "generateMoves",
+                    "checkForPinsAndChecks", "squareUnderAttack", "isSquareAttacked")
+MEASURED_CLASSES = (ChessEngine.GameState, BitboardEngine.BitboardGameState)
+
+counters = {}  # name -> [calls, seconds], kept over every search while enabled
+originals = []  # (owner, attribute name, original function) of every wrapped function, empty while disabled
+output = None  # file every search report is written to, or None
+lastReport = None  # report of the most recent search
+
+
+def measure(name, function):
+    """
+    Return a wrapper of function that adds its calls and time to counters[name]
+    """
+    counter = counters.setdefault(name, [0, 0.0])
+    clock = time.perf_counter
+
+    def wrapper(*args, **kwargs):
+        start = clock()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            counter[0] += 1
+            counter[1] += clock() - start
+    wrapper.__name__ = function.__name__
+    wrapper.__doc__ = function.__doc__
+    wrapper.__wrapped__ = function
+    return wrapper
+
+
+def replace(owner, attribute, wrapper):
+    originals.append((owner, attribute, getattr(owner, attribute)))
+    setattr(owner, attribute, wrapper)
+
+
+def enable(outputFile=None):
+    """
+    Start measuring. Search reports are written to outputFile, one JSON object per line, when it is given.
+    """
+    global output
+    output = outputFile
+    if originals:  # already enabled
+        return
+    for owner in MEASURED_CLASSES:
+        for name in MEASURED_METHODS:
+            if name in vars(owner):  # only the methods the class defines itself, the inherited ones are wrapped already
+                qualifiedName = name if owner is ChessEngine.GameState else owner.__name__ + "." + name
+                replace(owner, name, measure(qualifiedName, vars(owner)[name]))
+    replace(SmartMoveFinder, "scoreBoard", measure("evaluation", SmartMoveFinder.scoreBoard))
+    replace(SmartMoveFinder, "searchBestMove", reportSearch(SmartMoveFinder.searchBestMove))
+
+
+def disable():
+    """
+    Stop measuring and put the original functions back. The counters are kept until reset().
+    """
+    global output
+    while originals:
+        owner, attribute, original = originals.pop()
+        setattr(owner, attribute, original)
+    output = None
+
+
+def isEnabled():
+    return bool(originals)
+
+
+def reset():
+    """
+    Set every counter back to zero
+    """
+    for counter in counters.values():
+        counter[0] = 0
+        counter[1] = 0.0
+
+
+def getCounters():
+    """
+    Return {name: {"calls": calls, "seconds": seconds}} of the functions called so far
+    """
+    return {name: {"calls": calls, "seconds": round(seconds, 6)} for name, (calls, seconds) in counters.items()
+            if calls}
+
+
+def getTableCounters(table):
+    return {"hits": table.hits, "misses": table.misses, "collisions": table.collisions, "stores": table.stores}
+
+
+def reportSearch(searchBestMove):
+    """
+    Wrap searchBestMove so that every search records its iterations and produces a report
+    """
+    def wrapper(gs, validMoves, maxDepth=None, timeLimit=None, info=None):
+        global lastReport
+        if maxDepth is None:
+            maxDepth = SmartMoveFinder.DEPTH
+        if info is None:
+            info = SmartMoveFinder.SearchInfo(maxDepth, timeLimit)
+        iterations = []
+        previousCallback = info.onIteration
+
+        def onIteration(depth, score, principalVariation):
+            iterations.append({"depth": depth, "score": score, "nodes": info.nodes, "cutoffs": info.cutoffs,
+                               "seconds": time.perf_counter() - info.startTime,
+                               "pv": [move.getChessNotation() for move in principalVariation]})
+            if previousCallback is not None:
+                previousCallback(depth, score, principalVariation)
+
+        info.onIteration = onIteration
+        tableBefore = getTableCounters(SmartMoveFinder.transpositionTable)
+        pawnTableBefore = (SmartMoveFinder.pawnTable.hits, SmartMoveFinder.pawnTable.misses)
+        callsBefore = {name: tuple(counter) for name, counter in counters.items()}
+        try:
+            bestMove, bestScore, principalVariation = searchBestMove(gs, validMoves, maxDepth, timeLimit, info)
+        finally:
+            info.onIteration = previousCallback
+        seconds = time.perf_counter() - info.startTime
+
+        # the iteration entries hold running totals, turn them into what every iteration took by itself
+        nodes = cutoffs = 0
+        elapsed = 0.0
+        for iteration in iterations:
+            nodes, iteration["nodes"] = iteration["nodes"], iteration["nodes"] - nodes
+            cutoffs, iteration["cutoffs"] = iteration["cutoffs"], iteration["cutoffs"] - cutoffs
+            elapsed, iteration["seconds"] = iteration["seconds"], round(iteration["seconds"] - elapsed, 6)
+        tableAfter = getTableCounters(SmartMoveFinder.transpositionTable)
+        calls = {}
+        for name, (callCount, callSeconds) in counters.items():
+            callsBefore.setdefault(name, (0, 0.0))
+            if callCount != callsBefore[name][0]:
+                calls[name] = {"calls": callCount - callsBefore[name][0],
+                               "seconds": round(callSeconds - callsBefore[name][1], 6)}
+        report = {
+            "fen": gs.getFen(),
+            "maxDepth": maxDepth,
+            "timeLimit": timeLimit,
+            "depthReached": info.depthReached,
+            "stopped": info.stopped,
+            "bestMove": bestMove.getChessNotation() if bestMove is not None else None,
+            "score": bestScore,
+            "seconds": round(seconds, 6),
+            "nodes": info.nodes,
+            "quiescenceNodes": info.quiescenceNodes,
+            "nodesPerSecond": round(info.nodes / seconds) if seconds > 0 else 0,
+            "cutoffs": info.cutoffs,
+            "firstMoveCutoffRate": round(info.getCutoffRate(), 4),
+            "iterations": iterations,
+            "transpositionTable": {name: tableAfter[name] - tableBefore[name] for name in tableAfter},
+            "pawnTable": {"hits": SmartMoveFinder.pawnTable.hits - pawnTableBefore[0],
+                          "misses": SmartMoveFinder.pawnTable.misses - pawnTableBefore[1]},
+            "calls": calls,
+        }
+        lastReport = report
+        if output is not None:
+            output.write(json.dumps(report) + "\n")
+            output.flush()
+        return bestMove, bestScore, principalVariation
+    wrapper.__wrapped__ = searchBestMove
+    return wrapper
@@ -1,8 +1,13 @@
 import pygame
-import ChessEngine, SmartMoveFinder
+import ChessEngine, SmartMoveFinder, OpeningBook
+import os
 import sys
+import copy
+import queue
+import threading
+import time
 """
-Importing needed modules
+Importing needed modules. Importing this file only defines the game, it is started by running it.
 """
 
 Height = 800  # Height Dimension of screen
@@ -10,36 +15,216 @@ Width = 800  # Width Dimension of screen
 columns = 8  # number of columns in board
 rows = 8  # number of rows in board
 square_Size = Height // rows  # Size of the square
+MAX_FPS = 60  # the loop redraws at most this many times per second, leaving the rest of the time to the AI
+PONDER = True  # let the AI search the reply it expects while the player thinks
 pieces=['bR','bN','bB','bQ','bK','bp','wR','wN','wB','wQ','wK','wp'] #b stands for black and w stands for white. bR means black rook , wN stands for white knight
-Image={} # Dictionary for storing the images of each piece
+IMAGE_DIR = os.path.dirname(os.path.abspath(__file__))  # folder of the piece images, bR.png, wN.png and so on
 
-#Loads images of each piece from the corresponding PNG file then store them in the 'Image' dictionary
+LIGHT_SQUARE = (255, 255, 255)  # White color
+DARK_SQUARE = (128, 128, 128)  # Black color
+SELECTED_COLOR = (255, 255, 0, 90)  # see-through yellow drawn over the selected square
+THINKING_REFRESH = 0.25  # seconds between redraws of the thinking bar, so drawing it takes little time from the AI
+
+
+class SpriteAtlas:
+    """
+    All twelve piece images on one surface, side by side, each scaled to the size of a square. The images are loaded
+    from their PNG files when the atlas is made, which needs the window to be open, and converted to the pixel format
+    of the screen so drawing a piece is a plain copy.
+    """
+    def __init__(self, size):
+        self.surface = pygame.Surface((size * len(pieces), size), pygame.SRCALPHA).convert_alpha()
+        self.areas = {} # piece -> its rectangle on the atlas
+        for index, piece in enumerate(pieces):
+            image = pygame.image.load(os.path.join(IMAGE_DIR, piece + ".png")).convert_alpha()
+            self.areas[piece] = pygame.Rect(index * size, 0, size, size)
+            self.surface.blit(pygame.transform.smoothscale(image, (size, size)), self.areas[piece])
+
+    def draw(self, screen, piece, rect):
+        screen.blit(self.surface, rect, self.areas[piece])
 
-for piece in pieces:
-    Image[piece]=pygame.image.load(piece+".png")
 
 """
-Creating board
+Creating board: draw the squares once on a surface of their own, pieces and squares are later redrawn from it
 """
-def drawGameState(screen, board):
-    # creating the board only
+def drawBackground():
+    background = pygame.Surface((Width, Height)).convert()
     for row in range(8):
         for col in range(8): #iterating over each row and column
-            if (row + col) % 2 == 0:
-                color = (255, 255, 255)  # White color
-            else:
-                color = (128, 128, 128)  # Black color
+            color = LIGHT_SQUARE if (row + col) % 2 == 0 else DARK_SQUARE
+            pygame.draw.rect(background, color, (col * square_Size, row * square_Size, square_Size, square_Size))  # surface,color,rectangle
+    return background
 
-            pygame.draw.rect(screen, color, (col * square_Size, row * square_Size, square_Size, square_Size))  # surface,color,rectangle
 
-    # loading the images of each piece to board
-    for row in range(8):
-        for col in range(8):
-            piece = board[row][col]
-            if piece != "--":
-                screen.blit(Image[piece], pygame.Rect(col * square_Size, row * square_Size, square_Size, square_Size))
+"""
+Draw a bar at the bottom of the board showing the depth the AI is searching and how fast. Returns the area it covers.
+"""
+def drawThinking(screen, font, info):
+    text = font.render("Thinking... depth %d, %d nodes/s" % (info.currentDepth, info.getNodesPerSecond()), True,
+                       (255, 255, 255))
+    bar = pygame.Rect(0, Height - text.get_height() - 10, Width, text.get_height() + 10)
+    pygame.draw.rect(screen, (40, 40, 40), bar)
+    screen.blit(text, (10, bar.y + 5))
+    return bar
 
-    pygame.display.flip()
+
+class BoardRenderer:
+    """
+    Keeps the window in step with the game while drawing as little as possible. It remembers what it last put on
+    screen, and every frame only redraws the squares whose piece or selection changed since, from the board
+    background drawn once at the start, and only sends those squares to the display. A frame where nothing changed
+    draws nothing.
+    """
+    def __init__(self, screen, font, atlas):
+        self.screen = screen
+        self.font = font
+        self.atlas = atlas
+        self.background = drawBackground()
+        self.selectedSquare = pygame.Surface((square_Size, square_Size), pygame.SRCALPHA)
+        self.selectedSquare.fill(SELECTED_COLOR)
+        self.drawnBoard = None  # copy of the board as it is on screen, None when the whole window must be drawn
+        self.drawnSelection = ()  # square shown as selected
+        self.barRect = None  # area of the thinking bar on screen, None when it isn't shown
+        self.barTime = 0.0  # when the thinking bar was last drawn
+
+    def invalidate(self):
+        """
+        Redraw the whole window at the next frame, e.g. after the window was covered
+        """
+        self.drawnBoard = None
+
+    def drawSquare(self, board, row, col, selection):
+        rect = pygame.Rect(col * square_Size, row * square_Size, square_Size, square_Size)
+        self.screen.blit(self.background, rect, rect)
+        if (row, col) == selection:
+            self.screen.blit(self.selectedSquare, rect)
+        piece = board[row][col]
+        if piece != "--":
+            self.atlas.draw(self.screen, piece, rect)
+        return rect
+
+    def render(self, board, selection, info=None):
+        """
+        Bring the window up to date with the board, the selected square (or ()) and the SearchInfo of the running AI
+        search (or None)
+        """
+        fullRedraw = self.drawnBoard is None
+        if fullRedraw:
+            changed = [(row, col) for row in range(8) for col in range(8)]
+            self.barRect = None
+        else:
+            changed = [(row, col) for row in range(8) for col in range(8) if board[row][col] != self.drawnBoard[row][col]]
+            for square in (self.drawnSelection, selection):
+                if selection != self.drawnSelection and square and square not in changed:
+                    changed.append(square)
+            if info is None and self.barRect is not None: #the bar went away, show the squares it covered again
+                changed += [(row, col) for row in range(8) for col in range(8) if (row, col) not in changed and
+                            self.barRect.colliderect((col * square_Size, row * square_Size, square_Size, square_Size))]
+                self.barRect = None
+        updated = [self.drawSquare(board, row, col, selection) for row, col in changed]
+        if info is not None:
+            now = time.perf_counter()
+            if self.barRect is None or now - self.barTime >= THINKING_REFRESH or \
+                    any(self.barRect.colliderect(rect) for rect in updated):
+                self.barRect = drawThinking(self.screen, self.font, info)
+                self.barTime = now
+                updated.append(self.barRect)
+        if fullRedraw:
+            pygame.display.flip()
+        elif updated:
+            pygame.display.update(updated) #only the squares that changed
+        self.drawnBoard = [row[:] for row in board]
+        self.drawnSelection = selection
+
+
+class AIThinker:
+    """
+    Runs the AI search on a background thread so the window keeps handling events and redrawing while the AI thinks.
+    The chosen move comes back through a queue that the event loop polls.
+
+    It also ponders: after the AI moved, it searches the position after the reply it expects from the player (the
+    second move of its principal variation) while the player thinks. If the player makes that move, the ponder search
+    simply becomes the AI's search, often already finished; otherwise it is stopped, and what it stored in the
+    transposition table is left there for the real search.
+    """
+    def __init__(self):
+        self.results = queue.Queue()  # (search info, move, principal variation) of every search that finished
+        self.info = None  # SearchInfo of the running search, None when the AI isn't thinking or pondering
+        self.thread = None  # thread of the running search
+        self.expectedReply = None  # the player's move the last AI move expects, kept until ponder is called
+        self.ponderMove = None  # the player's move the running search assumes, None when it isn't a ponder search
+
+    def start(self, gs, validMoves, assumedMove=None):
+        self.cancel()
+        self.info = SmartMoveFinder.SearchInfo(SmartMoveFinder.DEPTH)
+        self.ponderMove = assumedMove
+        # the search makes and undoes moves on its own copy, so the board on screen never changes under it
+        gs = copy.deepcopy(gs)
+        if assumedMove is not None:
+            gs.makeMove(assumedMove)
+            validMoves = gs.getValidMoves()
+        self.thread = threading.Thread(target=self.search, args=(gs, list(validMoves), self.info))
+        self.thread.daemon = True  # never keep the program alive once the window is closed
+        self.thread.start()
+
+    def search(self, gs, validMoves, info):
+        # runs on the background thread
+        move, score, principalVariation = SmartMoveFinder.searchBestMove(gs, validMoves, info.maxDepth, info=info)
+        self.results.put((info, move, principalVariation))
+
+    def isThinking(self):
+        """
+        True while the AI searches for its own move, not while it ponders
+        """
+        return self.info is not None and self.ponderMove is None
+
+    def getMove(self):
+        """
+        Return the move of the running search once it is done, otherwise None
+        """
+        while True:
+            try:
+                info, move, principalVariation = self.results.get_nowait()
+            except queue.Empty:
+                return None
+            if info is self.info and self.ponderMove is None:  # results of cancelled searches are dropped
+                self.info = None
+                self.expectedReply = principalVariation[1] if len(principalVariation) > 1 else None
+                return move
+
+    def ponder(self, gs):
+        """
+        Start searching the position after the reply the last AI move expects, if it expects one. gs is the game
+        right after the AI's move.
+        """
+        reply = self.expectedReply
+        self.expectedReply = None
+        if reply is not None:
+            for legalMove in gs.getValidMoves(): #the reply is a move of the search's copy, use the game's own
+                if legalMove == reply:
+                    self.start(gs, [], legalMove)
+                    break
+
+    def playerMoved(self, move):
+        """
+        The player made a move. A ponder search that assumed it carries on as the AI's search, any other is stopped.
+        """
+        if self.ponderMove is not None:
+            if move == self.ponderMove:
+                self.ponderMove = None
+            else:
+                self.cancel()
+
+    def cancel(self):
+        """
+        Stop the running search, its result will be ignored
+        """
+        if self.info is not None:
+            self.info.stop()
+            self.thread.join()  # it stops within a node; the next search must not share the table with it
+            self.info = None
+        self.ponderMove = None
+        self.expectedReply = None
 
 
 class Main:
@@ -51,6 +236,10 @@ class Main:
         self.screen = pygame.display.set_mode((Width, Height)) #creating the screen with width and height dimensions
         pygame.display.set_caption('CSAI 350 - chess game project') # caption of the screen
         self.gs = ChessEngine.GameState()
+        self.clock = pygame.time.Clock()
+        self.font = pygame.font.Font(None, 32)  # font of the thinking indicator
+        self.thinker = AIThinker()
+        self.renderer = BoardRenderer(self.screen, self.font, SpriteAtlas(square_Size)) #the piece images are loaded here
 
     """
     Create an infinite loop to handle events and update the game until game is over. 
@@ -63,12 +252,34 @@ class Main:
         gameOver = False # flag to check if the game finished
         p1 = True  # Player1=white; true for human
         p2 = False  # Player2=black; false for computer
+        self.renderer.render(self.gs.board, Selected_Square)
         while True:
             humanTurn = (self.gs.whiteToMove and p1) or (not self.gs.whiteToMove and p2)#it's a human turn if it's white's turn to move and if player one(white) is a human playing
-            for event in pygame.event.get():  # loop through all events in pygame like click events mouse motion events...
-                if event.type == pygame.QUIT: #quits the game if the player presses the close button
+            if (humanTurn or gameOver) and not self.thinker.isThinking():
+                events = [pygame.event.wait()] + pygame.event.get() #nothing can change until the player does something, sleep until then
+            else:
+                events = pygame.event.get()
+            for event in events:  # loop through all events in pygame like click events mouse motion events...
+                if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED): #the window was covered, draw all of it again
+                    self.renderer.invalidate()
+                elif event.type == pygame.QUIT: #quits the game if the player presses the close button
+                    self.thinker.cancel()
                     pygame.quit()
                     sys.exit()
+                elif event.type == pygame.KEYDOWN and event.key == pygame.K_z: #undo when 'z' is pressed
+                    self.thinker.cancel()
+                    """
+                    Take back moves until it is a human's turn again: the AI's reply and the human move before it
+                    """
+                    while len(self.gs.moveLog) != 0:
+                        self.gs.undoMove()
+                        if (self.gs.whiteToMove and p1) or (not self.gs.whiteToMove and p2):
+                            break
+                    Selected_Square = ()
+                    click_of_player = []
+                    gameOver = False
+                    movement = True
+                    humanTurn = True
                 elif event.type == pygame.MOUSEBUTTONDOWN: #if player clicks mouse
                     """
                     Convert position of mouse click to row and column on the game board.
@@ -96,9 +307,11 @@ class Main:
                             for i in range(len(Legal_Moves)):
                                 if move == Legal_Moves[i]:
                                     self.gs.makeMove(Legal_Moves[i])
+                                    self.thinker.playerMoved(Legal_Moves[i]) #keeps the ponder search if it guessed this move
                                     movement = True
                                     Selected_Square= ()  # reset user clicks
                                     click_of_player = []
+                                    break
                             """
                             If not legal move, reset player click
                             """
@@ -107,21 +320,38 @@ class Main:
 
 
 
-            #AI move finder logic
-            if not gameOver and not humanTurn: #if AI's turn move, find best move
-                AIMove = SmartMoveFinder.findBestMove(self.gs, Legal_Moves)
-                if AIMove is None: #if there is no best move, do random move
-                    AIMove = SmartMoveFinder.findRandomMove(Legal_Moves)
-                self.gs.makeMove(AIMove) #updates game state
-                movement = True
+            #AI move finder logic: the search runs in the background, the loop only starts it and collects its move
+            if not gameOver and not humanTurn and not movement:
+                if not self.thinker.isThinking(): #if AI's turn move, play from the opening book or start looking for the best move
+                    bookMove = OpeningBook.findBookMove(self.gs, Legal_Moves)
+                    if bookMove is not None: #a known opening position, no search needed
+                        self.gs.makeMove(bookMove)
+                        movement = True
+                    else:
+                        self.thinker.start(self.gs, Legal_Moves)
+                else:
+                    AIMove = self.thinker.getMove()
+                    if AIMove is not None:
+                        for legalMove in Legal_Moves: #play the move of the game state on screen, not of the search's copy
+                            if legalMove == AIMove:
+                                self.gs.makeMove(legalMove) #updates game state
+                                movement = True
+                                break
 
             if movement: #if movement is made/true
                 Legal_Moves = self.gs.getValidMoves() #update list of all possible moves to check if player made valid move, or for the ai to make the best decision
+                gameOver = len(Legal_Moves) == 0 #checkmate or stalemate
                 movement = False
+                if gameOver: #a ponder search the player's last move turned into the AI's search has nothing to play
+                    self.thinker.cancel()
+                if PONDER and not gameOver and ((self.gs.whiteToMove and p1) or (not self.gs.whiteToMove and p2)):
+                    self.thinker.ponder(self.gs) #think on the player's time, if the AI just moved
 
-            drawGameState(self.screen,self.gs.board) #game state is drawn on screen
-            pygame.display.update() #display the updates
+            thinking = self.thinker.info if self.thinker.isThinking() else None
+            self.renderer.render(self.gs.board, Selected_Square, thinking) #only what changed is drawn
+            self.clock.tick(MAX_FPS) #wait out the rest of the frame, the AI thread runs in the meantime
 
 
-main = Main()
-main.mainloop()
+if __name__ == "__main__":
+    main = Main()
+    main.mainloop()
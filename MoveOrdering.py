@@ -0,0 +1,75 @@
+"""
+This file ranks the moves of a position before the search expands them. Alpha-beta prunes the most when the best move
+is tried first, so the moves most likely to cause a cutoff go to the front:
+
+1) the best move stored for the position in the transposition table
+2) captures and promotions, the most valuable victim first and among those the least valuable attacker first (MVV-LVA)
+3) killer moves: quiet moves that caused a cutoff at the same ply in a sibling position
+4) all other quiet moves, by their history score: how often and how deep they caused cutoffs anywhere in the search
+
+Moves with the same rank are put in random order, so the AI doesn't always play the same move among equal ones.
+"""
+import random
+
+TT_MOVE_SCORE = 1000000  # rank of the transposition table move
+CAPTURE_SCORE = 100000  # base rank of captures and promotions
+KILLER_SCORE = 90000  # rank of the first killer move, the second one gets one less
+HISTORY_LIMIT = 80000  # history scores are halved once one reaches this, so they stay below the killers
+
+
+class MoveOrderer:
+    """
+    Holds the killer and history tables of one search
+    """
+
+    def __init__(self, pieceScores, maxPly=64):
+        self.pieceScores = pieceScores  # value of every piece type, e.g. {"Q": 10, ...}
+        # two killer moves per ply, newest first
+        self.killers = [[None, None] for _ in range(maxPly + 1)]
+        # history score of every (piece moved, end square) pair
+        self.history = {}
+
+    def scoreMove(self, move, ply, ttMove):
+        """
+        Return the rank of a move, higher is tried earlier
+        """
+        if ttMove is not None and move.moveID == ttMove.moveID:
+            return TT_MOVE_SCORE
+        if move.isCapture or move.pawnPromotion:
+            score = CAPTURE_SCORE
+            if move.isCapture:  # most valuable victim, then least valuable attacker
+                score += 10 * self.pieceScores[move.pieceCaptured[1]] - self.pieceScores[move.pieceMoved[1]]
+            if move.pawnPromotion:
+                score += 10 * self.pieceScores["Q"]
+            return score
+        killers = self.killers[ply]
+        if killers[0] is not None and move.moveID == killers[0].moveID and move.pieceMoved == killers[0].pieceMoved:
+            return KILLER_SCORE
+        if killers[1] is not None and move.moveID == killers[1].moveID and move.pieceMoved == killers[1].pieceMoved:
+            return KILLER_SCORE - 1
+        return self.history.get((move.pieceMoved, move.endRow * 8 + move.endCol), 0)
+
+    def orderMoves(self, moves, ply, ttMove=None):
+        """
+        Return the moves sorted from most to least promising. The random fraction added to every rank only decides
+        between moves of equal rank.
+        """
+        scoreMove = self.scoreMove
+        return sorted(moves, key=lambda move: scoreMove(move, ply, ttMove) + random.random(), reverse=True)
+
+    def recordCutoff(self, move, ply, depth):
+        """
+        Remember a quiet move that made the search cut off, as a killer of its ply and in the history table
+        """
+        if move.isCapture or move.pawnPromotion:  # captures are already ranked well by MVV-LVA
+            return
+        killers = self.killers[ply]
+        if killers[0] is None or killers[0].moveID != move.moveID:
+            killers[1] = killers[0]
+            killers[0] = move
+        key = (move.pieceMoved, move.endRow * 8 + move.endCol)
+        score = self.history.get(key, 0) + depth * depth  # deep cutoffs say more than ones near the leaves
+        self.history[key] = score
+        if score >= HISTORY_LIMIT:  # age every entry so none of them reaches the killer moves
+            for key in self.history:
+                self.history[key] //= 2
@@ -0,0 +1,202 @@
+"""
+Opening book: moves known to be good in positions from the opening, looked up instead of searched. The book is a binary
+file of 16-byte records sorted by position key, laid out like a Polyglot book:
+
+    key     8 bytes  Zobrist key of the position (GameState.zobristKey)
+    move    2 bytes  to file | to rank << 3 | from file << 6 | from rank << 9 | promotion << 12, ranks counted from
+                     white's side, castling written as the king capturing its own rook (e1h1, e1a1, ...)
+    weight  2 bytes  how good the move is, relative to the other moves of the position
+    learn   4 bytes  unused, 0
+
+all big-endian. The keys are this engine's Zobrist keys, not Polyglot's own random numbers, so books made by other
+Polyglot tools don't match any position here; build one from PGN games with:
+
+    python OpeningBook.py build games.pgn [more.pgn ...] --output book.bin --plies 20
+    python OpeningBook.py probe --fen "<FEN>"         list the book moves of a position
+
+The file is memory-mapped and binary searched, nothing is read when it is opened.
+"""
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+import time
+
+import ChessEngine
+import Pgn
+
+RECORD = struct.Struct(">QHHI")  # key, move, weight, learn
+MAX_WEIGHT = 0xFFFF
+BOOK_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "book.bin")  # book the game plays from
+
+defaultBook = None  # the opened BOOK_FILE, see findBookMove
+defaultBookOpened = False
+
+
+def encodeMove(move):
+    """
+    Return the 16-bit Polyglot code of a move
+    """
+    endRow, endCol = move.endRow, move.endCol
+    if move.castle:  # the king moves onto the rook
+        endCol = 7 if move.endCol > move.startCol else 0
+    code = endCol | (7 - endRow) << 3 | move.startCol << 6 | (7 - move.startRow) << 9
+    if move.pawnPromotion:
+        code |= 4 << 12  # queen
+    return code
+
+
+class OpeningBook:
+    """
+    A book file opened for lookups
+    """
+    def __init__(self, path):
+        self.path = path
+        self.entries = os.path.getsize(path) // RECORD.size
+        if self.entries == 0:  # an empty file can't be mapped
+            self.data = None
+        else:
+            with open(path, "rb") as bookFile:
+                self.data = mmap.mmap(bookFile.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+
+    def getEntries(self, key):
+        """
+        Return the (move code, weight) of every book move of the position with this key
+        """
+        # binary search for the first record whose key is not smaller
+        low = 0
+        high = self.entries
+        while low < high:
+            middle = (low + high) // 2
+            if struct.unpack_from(">Q", self.data, middle * RECORD.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        entries = []
+        while low < self.entries:
+            entryKey, code, weight, learn = RECORD.unpack_from(self.data, low * RECORD.size)
+            if entryKey != key:
+                break
+            entries.append((code, weight))
+            low += 1
+        return entries
+
+    def getMoves(self, gs, validMoves):
+        """
+        Return (move, weight) for every book move of the position, as moves of validMoves
+        """
+        entries = self.getEntries(gs.zobristKey)
+        if not entries:
+            return []
+        movesByCode = {encodeMove(move): move for move in validMoves}
+        # a code that isn't a valid move can only come from a different position with the same key; skip it
+        return [(movesByCode[code], weight) for code, weight in entries if code in movesByCode and weight > 0]
+
+    def pickMove(self, gs, validMoves):
+        """
+        Return a book move of the position, chosen at random in proportion to the weights, or None if the position is
+        not in the book
+        """
+        bookMoves = self.getMoves(gs, validMoves)
+        if not bookMoves:
+            return None
+        return random.choices([move for move, weight in bookMoves], [weight for move, weight in bookMoves])[0]
+
+
+def findBookMove(gs, validMoves):
+    """
+    Return a move from BOOK_FILE for the position, or None if it has none or there is no book. The book is opened at
+    the first call.
+    """
+    global defaultBook, defaultBookOpened
+    if not defaultBookOpened:
+        defaultBookOpened = True
+        if os.path.exists(BOOK_FILE):
+            defaultBook = OpeningBook(BOOK_FILE)
+    if defaultBook is None:
+        return None
+    return defaultBook.pickMove(gs, validMoves)
+
+
+def buildBook(pgnPaths, outputPath, maxPlies=20):
+    """
+    Build a book from the games of the PGN files: every move played in the first maxPlies plies of a game gets 2
+    points when its side went on to win and 1 when the game was drawn. Moves that only lost are left out. Returns the
+    number of games read and of records written.
+    """
+    weights = {}  # (key, move code) -> points
+    games = 0
+    for path in pgnPaths:
+        with open(path, encoding="utf-8", errors="replace") as pgnFile:
+            for headers, sanMoves, result in Pgn.readGames(pgnFile):
+                if "FEN" in headers:  # games that don't start from the initial position are skipped
+                    continue
+                games += 1
+                gs = ChessEngine.GameState()
+                for san in sanMoves[:maxPlies]:
+                    move = Pgn.sanToMove(san, gs.getValidMoves())
+                    if move is None:  # an illegal move or an under-promotion, the rest of the game can't be followed
+                        break
+                    if result == "1/2-1/2":
+                        points = 1
+                    elif result == ("1-0" if gs.whiteToMove else "0-1"):
+                        points = 2
+                    elif result == "*":  # unknown result, count the move as a draw
+                        points = 1
+                    else:
+                        points = 0
+                    entry = (gs.zobristKey, encodeMove(move))
+                    weights[entry] = weights.get(entry, 0) + points
+                    gs.makeMove(move)
+    records = sorted(((key, code, points) for (key, code), points in weights.items() if points > 0),
+                     key=lambda record: (record[0], -record[2]))  # by key, the best move of a position first
+    scale = max([points for key, code, points in records] + [MAX_WEIGHT]) / MAX_WEIGHT  # keep weights in 16 bits
+    with open(outputPath, "wb") as bookFile:
+        for key, code, points in records:
+            bookFile.write(RECORD.pack(key, code, max(1, int(points / scale)), 0))
+    return games, len(records)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or look into an opening book.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="build a book from PGN files")
+    build.add_argument("pgn", nargs="+", help="PGN files to read")
+    build.add_argument("--output", default=BOOK_FILE, help="book file to write (default: book.bin next to the game)")
+    build.add_argument("--plies", type=int, default=20, help="number of plies of every game to put in the book")
+    probe = subparsers.add_parser("probe", help="list the book moves of a position")
+    probe.add_argument("--book", default=BOOK_FILE, help="book file to read")
+    probe.add_argument("--fen", help="position to look up, default the initial position")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        startTime = time.perf_counter()
+        games, records = buildBook(args.pgn, args.output, args.plies)
+        print("%d games, %d records written to %s in %.1fs" % (games, records, args.output,
+                                                               time.perf_counter() - startTime))
+        return 0
+
+    startTime = time.perf_counter()
+    book = OpeningBook(args.book)
+    openTime = time.perf_counter() - startTime
+    gs = ChessEngine.GameState(args.fen)
+    validMoves = gs.getValidMoves()
+    startTime = time.perf_counter()
+    bookMoves = book.getMoves(gs, validMoves)
+    lookupTime = time.perf_counter() - startTime
+    for move, weight in sorted(bookMoves, key=lambda bookMove: -bookMove[1]):
+        print("%-7s %5d" % (Pgn.moveToSan(gs, move, validMoves), weight))
+    print("%d records, opened in %.1f us, looked up in %.1f us" % (book.entries, openTime * 1e6, lookupTime * 1e6))
+    book.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""
+Pawn structure evaluation. Three things about the pawns are scored, in tenths of a pawn with white positive:
+
+    doubled pawns    every pawn beyond the first on a file costs DOUBLED_PAWN_PENALTY
+    isolated pawns   a pawn with no pawn of its color on the files beside it costs ISOLATED_PAWN_PENALTY
+    passed pawns     a pawn with no enemy pawn in front of it on its own or the files beside it gets a bonus from
+                     passedPawnBonuses, the further advanced the more
+
+Finding these means walking the pawn files, too slow to do at every position the search scores. But the score only
+depends on where the pawns stand, and most moves don't move a pawn, so it is cached in a PawnHashTable under the
+game state's pawn key (the Zobrist key of the pawns alone, kept up to date by makeMove and undoMove). The files are
+only walked again when the pawns are in a layout the table hasn't seen.
+"""
+
+DOUBLED_PAWN_PENALTY = 2
+ISOLATED_PAWN_PENALTY = 2
+# bonus of a passed pawn by its rank counted from its own side, index 1 being the rank the pawns start on
+passedPawnBonuses = (0, 0, 1, 2, 4, 6, 10, 0)
+
+
+def evaluatePawns(board):
+    """
+    Score the pawn structure of a board from scratch, white minus black
+    """
+    whitePawns = []
+    blackPawns = []
+    whiteFiles = [0] * 10  # pawns on every file, with an empty file on either side so c - 1 and c + 1 always exist
+    blackFiles = [0] * 10
+    whiteRearmost = [-1] * 10  # row of the white pawn nearest the first rank on every file (highest row), -1 if none
+    blackRearmost = [8] * 10  # row of the black pawn nearest the eighth rank on every file (lowest row), 8 if none
+    for row in range(1, 7):  # pawns never stand on the first or last rank
+        for col, piece in enumerate(board[row]):
+            if piece == "wp":
+                whitePawns.append((row, col + 1))
+                whiteFiles[col + 1] += 1
+                whiteRearmost[col + 1] = max(whiteRearmost[col + 1], row)
+            elif piece == "bp":
+                blackPawns.append((row, col + 1))
+                blackFiles[col + 1] += 1
+                blackRearmost[col + 1] = min(blackRearmost[col + 1], row)
+
+    score = 0
+    for file in range(1, 9):
+        if whiteFiles[file] > 1:
+            score -= DOUBLED_PAWN_PENALTY * (whiteFiles[file] - 1)
+        if blackFiles[file] > 1:
+            score += DOUBLED_PAWN_PENALTY * (blackFiles[file] - 1)
+    for row, file in whitePawns:
+        if whiteFiles[file - 1] == 0 and whiteFiles[file + 1] == 0:
+            score -= ISOLATED_PAWN_PENALTY
+        # white moves towards row 0, a black pawn in front of it has a lower row; one on the same row stands beside it
+        if blackRearmost[file - 1] >= row and blackRearmost[file] >= row and blackRearmost[file + 1] >= row:
+            score += passedPawnBonuses[7 - row]
+    for row, file in blackPawns:
+        if blackFiles[file - 1] == 0 and blackFiles[file + 1] == 0:
+            score += ISOLATED_PAWN_PENALTY
+        if whiteRearmost[file - 1] <= row and whiteRearmost[file] <= row and whiteRearmost[file + 1] <= row:
+            score -= passedPawnBonuses[row]
+    return score
+
+
+class PawnHashTable:
+    """
+    Fixed-size cache of pawn structure scores, in parallel lists like the TranspositionTable. The slot of a pawn
+    layout is its pawn key masked with the size of the table, and a new layout simply replaces whatever is in its slot:
+    every entry is as cheap to recompute as any other.
+    """
+    def __init__(self, numberOfEntries=1 << 14):
+        self.size = 1 << (max(numberOfEntries, 1).bit_length() - 1)  # a power of two, so a mask finds the slot
+        self.mask = self.size - 1
+        self.keys = [None] * self.size
+        self.scores = [0] * self.size
+        self.resetCounters()
+
+    def resetCounters(self):
+        self.hits = 0  # lookups that found the layout
+        self.misses = 0  # lookups that had to score the pawns
+
+    def clear(self):
+        """
+        Remove every entry and reset the counters
+        """
+        for i in range(self.size):
+            self.keys[i] = None
+        self.resetCounters()
+
+    def getScore(self, gs):
+        """
+        Return the pawn structure score of the game state, from the table or scored and stored when it is not there
+        """
+        key = gs.pawnKey
+        index = key & self.mask
+        if self.keys[index] == key:
+            self.hits += 1
+            return self.scores[index]
+        self.misses += 1
+        score = evaluatePawns(gs.board)
+        self.keys[index] = key
+        self.scores[index] = score
+        return score
+
+    def getStats(self):
+        """
+        Return the counters as a dictionary, along with how full the table is
+        """
+        lookups = self.hits + self.misses
+        used = self.size - self.keys.count(None)
+        return {
+            "size": self.size,
+            "used": used,
+            "lookups": lookups,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,252 @@
+"""
+Perft (performance test) counts the leaf nodes of the tree of legal moves to a given depth. The counts of many positions
+are known exactly, so comparing against them checks the move generator, and timing the walk measures its speed.
+
+Usage:
+    python Perft.py                          run every reference position to depth 3, checking the counts
+    python Perft.py --depth 4                run every reference position to depth 4
+    python Perft.py --fen "<FEN>" --depth 3 --divide
+                                             count a position and show the count below every root move
+    python Perft.py --backend bitboard       use BitboardEngine.BitboardGameState instead of ChessEngine.GameState
+    python Perft.py --move-bench             measure the memory and construction time of one Move
+    python Perft.py --undo-bench             measure the memory allocated and the time taken by one make/undo pair
+    python Perft.py --check-scores           walk every reference position to depth 3 on both backends with
+                                             GameState.debugScores on, failing if a running score or the pawn key
+                                             drifts from its recomputed value
+
+Nothing here opens a window or imports pygame.
+"""
+import argparse
+import gc
+import sys
+import time
+import timeit
+import tracemalloc
+
+import ChessEngine
+import BitboardEngine
+
+backends = {"list": ChessEngine.GameState, "bitboard": BitboardEngine.BitboardGameState}
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# Reference positions with their known counts for depth 1, 2, 3, ... The engine always promotes to a queen, so only the
+# depths at which no pawn can promote yet are listed (the published counts include the under-promotions).
+referencePositions = [
+    ("start", START_FEN, [20, 400, 8902, 197281, 4865609]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", [48, 2039, 97862]),
+    ("position3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", [14, 191, 2812, 43238, 674624]),
+    ("position4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", [6]),
+    ("position6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10", [46, 2079, 89890]),
+]
+
+
+def perft(gs, depth):
+    """
+    Return the number of leaf nodes of the legal move tree of the given depth
+    """
+    moves = gs.getValidMoves()
+    if depth == 1:  # the leaves don't need to be made, counting them is enough
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        gs.makeMove(move)
+        nodes += perft(gs, depth - 1)
+        gs.undoMove()
+    return nodes
+
+
+def divide(gs, depth):
+    """
+    Return a list of (move, count) with the number of leaf nodes below every root move
+    """
+    counts = []
+    for move in gs.getValidMoves():
+        gs.makeMove(move)
+        counts.append((move, perft(gs, depth - 1) if depth > 1 else 1))
+        gs.undoMove()
+    return counts
+
+
+def countCollections():
+    """
+    Return how many times the garbage collector has run so far, over all generations
+    """
+    return sum(generation["collections"] for generation in gc.get_stats())
+
+
+def timePerft(gs, depth):
+    """
+    Run perft and return (nodes, seconds, collections), collections being the number of garbage collector runs during
+    the walk. Every object make/undo leaves behind counts towards the next run, so fewer runs means less garbage.
+    """
+    gc.collect()  # start every walk with the same, empty, generations
+    collections = countCollections()
+    startTime = time.perf_counter()
+    nodes = perft(gs, depth)
+    seconds = time.perf_counter() - startTime
+    return nodes, seconds, countCollections() - collections
+
+
+def formatSpeed(nodes, seconds):
+    return "%d nodes in %.3fs, %d nodes/s" % (nodes, seconds, nodes / seconds if seconds > 0 else 0)
+
+
+def benchmarkMoves(count=100000):
+    """
+    Measure the memory used by one Move object and the time it takes to construct one. Returns (bytes, seconds).
+    """
+    board = ChessEngine.GameState().board
+    gc.collect()
+    tracemalloc.start()
+    moves = [ChessEngine.Move((6, 4), (4, 4), board) for _ in range(count)]
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    bytesPerMove = (allocated - sys.getsizeof(moves)) / count  # leave out the list holding the moves
+    del moves
+    # the fastest of several runs is the least disturbed by the rest of the machine
+    seconds = min(timeit.repeat(lambda: ChessEngine.Move((6, 4), (4, 4), board), number=count, repeat=7)) / count
+    return bytesPerMove, seconds
+
+
+def benchmarkMakeUndo(backend, fen, count=20000):
+    """
+    Make and undo every legal move of a position over and over. Returns the bytes allocated at the peak of one make/undo
+    pair beyond what the position already holds, and the seconds one pair takes.
+    """
+    gs = backend(fen)
+    moves = gs.getValidMoves()
+
+    def makeUndoAll():
+        for move in moves:
+            gs.makeMove(move)
+            gs.undoMove()
+
+    makeUndoAll()  # let the logs grow to their working size first
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    peakBytes = 0
+    for move in moves:
+        tracemalloc.reset_peak()
+        gs.makeMove(move)
+        gs.undoMove()
+        peakBytes = max(peakBytes, tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+    repeats = max(1, count // len(moves))
+    seconds = min(timeit.repeat(makeUndoAll, number=repeats, repeat=5)) / (repeats * len(moves))
+    return peakBytes, seconds
+
+
+def runSuite(backend, maxDepth):
+    """
+    Run every reference position up to maxDepth and print the result of each depth. Returns True if all counts match.
+    """
+    allPassed = True
+    totalNodes = 0
+    totalTime = 0.0
+    totalCollections = 0
+    for name, fen, expectedCounts in referencePositions:
+        for depth, expected in enumerate(expectedCounts[:maxDepth], 1):
+            nodes, seconds, collections = timePerft(backend(fen), depth)
+            totalNodes += nodes
+            totalTime += seconds
+            totalCollections += collections
+            passed = nodes == expected
+            allPassed = allPassed and passed
+            print("%-10s depth %d: %s  %s" % (name, depth, "ok  " if passed else "FAIL (expected %d)" % expected,
+                                               formatSpeed(nodes, seconds)))
+    print("total: %s, %d garbage collections" % (formatSpeed(totalNodes, totalTime), totalCollections))
+    return allPassed
+
+
+def walk(gs, depth):
+    """
+    Like perft, but making and undoing the moves at the last ply too. Returns the number of moves made.
+    """
+    moves = gs.getValidMoves()
+    made = 0
+    for move in moves:
+        gs.makeMove(move)
+        made += 1 + (walk(gs, depth - 1) if depth > 1 else 0)
+        gs.undoMove()
+    return made
+
+
+def checkScores(maxDepth):
+    """
+    Walk the move tree of every reference position on every backend with debugScores on, so every makeMove and undoMove
+    compares the running material and piece-square scores and the pawn key with a full recompute. The positions
+    between them capture, promote, castle and capture en passant. Returns True if nothing drifted.
+    """
+    allPassed = True
+    ChessEngine.GameState.debugScores = True
+    try:
+        for backendName, backend in sorted(backends.items()):
+            for name, fen, expectedCounts in referencePositions:
+                gs = backend(fen)
+                try:
+                    nodes = walk(gs, maxDepth)
+                    passed = gs.zobristKey == gs.computeZobristKey()  # and everything is back where it started
+                    error = "" if passed else "Zobrist key not restored"
+                except AssertionError as exception:
+                    passed = False
+                    error = str(exception)
+                allPassed = allPassed and passed
+                print("%-8s %-10s depth %d: %s" % (backendName, name, maxDepth,
+                                                    "ok   %d moves made" % nodes if passed else "FAIL " + error))
+    finally:
+        ChessEngine.GameState.debugScores = False
+    return allPassed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Count and time the legal move tree of chess positions.")
+    parser.add_argument("--fen", help="position to count, instead of running the reference positions")
+    parser.add_argument("--depth", type=int, help="depth to count to (suite: deepest depth to run, default 3)")
+    parser.add_argument("--divide", action="store_true", help="show the count below every root move")
+    parser.add_argument("--backend", choices=sorted(backends), default="list", help="GameState implementation")
+    parser.add_argument("--move-bench", action="store_true", help="measure memory and construction time per Move")
+    parser.add_argument("--undo-bench", action="store_true",
+                        help="measure the memory allocated and the time taken by one make/undo pair")
+    parser.add_argument("--check-scores", action="store_true",
+                        help="check the running scores against a full recompute after every make and undo")
+    args = parser.parse_args(argv)
+    backend = backends[args.backend]
+
+    if args.move_bench:
+        bytesPerMove, seconds = benchmarkMoves()
+        print("Move: %.0f bytes per move, %.3f us per construction" % (bytesPerMove, seconds * 1e6))
+        return 0
+
+    if args.check_scores:
+        return 0 if checkScores(args.depth or 3) else 1
+
+    if args.undo_bench:
+        positions = [("position", args.fen)] if args.fen else [(name, fen) for name, fen, counts in referencePositions]
+        for name, fen in positions:
+            peakBytes, seconds = benchmarkMakeUndo(backend, fen)
+            print("%-10s make/undo: %4d bytes allocated at the peak, %.3f us per pair" % (name, peakBytes, seconds * 1e6))
+        return 0
+
+    if args.fen is None and not args.divide:
+        return 0 if runSuite(backend, args.depth or 3) else 1
+
+    gs = backend(args.fen or START_FEN)
+    depth = args.depth or 1
+    if args.divide:
+        startTime = time.perf_counter()
+        counts = divide(gs, depth)
+        seconds = time.perf_counter() - startTime
+        for move, nodes in sorted(counts, key=lambda count: count[0].getChessNotation()):
+            print("%s: %d" % (move.getChessNotation(), nodes))
+        print("moves: %d" % len(counts))
+        print(formatSpeed(sum(nodes for move, nodes in counts), seconds))
+        return 0
+    nodes, seconds, collections = timePerft(gs, depth)
+    print("depth %d: %s, %d garbage collections" % (depth, formatSpeed(nodes, seconds), collections))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+"""
+Reading and writing games in PGN (Portable Game Notation), the text format chess databases use. A game is a list of
+[Tag "value"] headers followed by the moves in SAN (Standard Algebraic Notation, e.g. "e4", "Nxf7+", "O-O", "e8=Q")
+and the result. Comments, variations and numeric annotations are skipped when reading.
+"""
+import re
+
+import ChessEngine
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+# the Seven Tag Roster: the headers every PGN game has, in the order they are written
+STANDARD_TAGS = ("Event", "Site", "Date", "Round", "White", "Black", "Result")
+LINE_LENGTH = 79  # move text lines are wrapped before this many characters
+
+headerPattern = re.compile(r'\[(\w+)\s+"(.*)"\]')
+# a comment in braces, a comment up to the end of the line, a numeric annotation, a move number ("12." or "12..."),
+# a result or a SAN move
+tokenPattern = re.compile(r"\{[^}]*\}|;[^\n]*|\$\d+|\d+\.(?:\.\.)?|1-0|0-1|1/2-1/2|\*|[()]|[^\s(){};]+")
+
+
+def readGames(lines):
+    """
+    Read the games from an iterable of lines, e.g. an open file, one at a time. Yields (headers, sanMoves, result) with
+    headers a dict of the tags and sanMoves the SAN moves of the main line.
+    """
+    headers = {}
+    moveText = []
+    for line in lines:
+        line = line.strip()
+        if line.startswith("[") and moveText:  # the headers of the next game begin
+            yield parseGame(headers, moveText)
+            headers = {}
+            moveText = []
+        match = headerPattern.match(line)
+        if match:
+            headers[match.group(1)] = match.group(2)
+        elif line and not line.startswith("%"):  # lines starting with % are escaped and ignored
+            moveText.append(line)
+    if headers or moveText:
+        yield parseGame(headers, moveText)
+
+
+def parseGame(headers, moveText):
+    """
+    Split the move text of one game into its SAN moves and result, leaving out comments and variations
+    """
+    sanMoves = []
+    result = headers.get("Result", "*")
+    variationDepth = 0  # moves inside parentheses belong to a variation, not to the game
+    for token in tokenPattern.findall("\n".join(moveText)):
+        if token == "(":
+            variationDepth += 1
+        elif token == ")":
+            variationDepth -= 1
+        elif variationDepth > 0 or token[0] in "{;$" or token[0].isdigit() and token.endswith("."):
+            continue
+        elif token in RESULTS:
+            result = token
+        else:
+            sanMoves.append(token)
+    return headers, sanMoves, result
+
+
+def sanToMove(san, validMoves):
+    """
+    Return the move of validMoves that the SAN string describes, or None if there is no such move or more than one.
+    The engine always promotes to a queen, so an under-promotion has no matching move.
+    """
+    san = san.rstrip("+#!?")
+    if san in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        endCol = 6 if len(san) == 3 else 2
+        for move in validMoves:
+            if move.castle and move.endCol == endCol:
+                return move
+        return None
+    promotion = None
+    if "=" in san:
+        san, promotion = san.split("=", 1)
+    elif len(san) > 2 and san[-1] in "QRBN" and san[-2].isdigit():  # promotion written without "=", e.g. "e8Q"
+        san, promotion = san[:-1], san[-1]
+    if promotion is not None and promotion != "Q":
+        return None
+    if not san:  # an empty token, e.g. "+" or "=Q" alone
+        return None
+    pieceType = san[0] if san[0] in "KQRBN" else "p"
+    squares = (san[1:] if pieceType != "p" else san).replace("x", "").replace("-", "")
+    if len(squares) < 2 or squares[-2] not in ChessEngine.Move.filesToCols or \
+            squares[-1] not in ChessEngine.Move.ranksToRows:
+        return None
+    endRow = ChessEngine.Move.ranksToRows[squares[-1]]
+    endCol = ChessEngine.Move.filesToCols[squares[-2]]
+    disambiguation = squares[:-2]  # the file and/or rank of the start square, when more than one piece could go there
+    candidates = []
+    for move in validMoves:
+        if move.pieceMoved[1] != pieceType or move.endRow != endRow or move.endCol != endCol or move.castle:
+            continue
+        if any((char in ChessEngine.Move.filesToCols and ChessEngine.Move.filesToCols[char] != move.startCol) or
+               (char in ChessEngine.Move.ranksToRows and ChessEngine.Move.ranksToRows[char] != move.startRow)
+               for char in disambiguation):
+            continue
+        candidates.append(move)
+    return candidates[0] if len(candidates) == 1 else None
+
+
+def moveToSan(gs, move, validMoves):
+    """
+    Return the SAN string of a move of validMoves, the valid moves of gs. The move is made and undone on gs to find
+    out whether it gives check or mate.
+    """
+    if move.castle:
+        san = "O-O" if move.endCol > move.startCol else "O-O-O"
+    else:
+        pieceType = move.pieceMoved[1]
+        endSquare = move.getRankFile(move.endRow, move.endCol)
+        if pieceType == "p":
+            san = (move.getRankFile(move.startRow, move.startCol)[0] + "x" if move.isCapture else "") + endSquare
+            if move.pawnPromotion:
+                san += "=Q"
+        else:
+            # other pieces of the same kind that could also go to the end square
+            rivals = [other for other in validMoves if other.pieceMoved == move.pieceMoved and
+                      other.endRow == move.endRow and other.endCol == move.endCol and
+                      (other.startRow, other.startCol) != (move.startRow, move.startCol)]
+            startSquare = move.getRankFile(move.startRow, move.startCol)
+            if not rivals:
+                disambiguation = ""
+            elif all(other.startCol != move.startCol for other in rivals):  # the file tells them apart
+                disambiguation = startSquare[0]
+            elif all(other.startRow != move.startRow for other in rivals):  # the rank does
+                disambiguation = startSquare[1]
+            else:
+                disambiguation = startSquare
+            san = pieceType + disambiguation + ("x" if move.isCapture else "") + endSquare
+    inCheck = gs.inCheck
+    gs.makeMove(move)
+    gs.getValidMoves()  # sets checkmate and inCheck for the position after the move
+    if gs.checkmate:
+        san += "#"
+    elif gs.inCheck:
+        san += "+"
+    gs.undoMove()
+    gs.inCheck = inCheck
+    return san
+
+
+def formatGame(headers, sanMoves, result):
+    """
+    Return the PGN text of a game: the headers, the standard ones first, a blank line, the numbered moves wrapped to
+    LINE_LENGTH and the result, ending with a blank line so games can be written one after the other
+    """
+    headers = dict(headers, Result=result)
+    lines = ['[%s "%s"]' % (tag, headers.get(tag, "?")) for tag in STANDARD_TAGS]
+    lines += ['[%s "%s"]' % (tag, value) for tag, value in headers.items() if tag not in STANDARD_TAGS]
+    lines.append("")
+    tokens = []
+    for ply, san in enumerate(sanMoves):
+        if ply % 2 == 0:
+            tokens.append("%d." % (ply // 2 + 1))
+        tokens.append(san)
+    tokens.append(result)
+    line = ""
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > LINE_LENGTH:
+            lines.append(line)
+            line = token
+        else:
+            line = line + " " + token if line else token
+    lines.append(line)
+    return "\n".join(lines) + "\n\n"
@@ -0,0 +1,213 @@
+"""
+Benchmarks of the AI search. Every run searches a few test positions and prints how long it took and what it found.
+
+Usage:
+    python SearchBenchmark.py --search                   search every position to depth 4 and print nodes, time and
+                                                         the hit rate of the pawn structure table
+    python SearchBenchmark.py --scaling                  time the root-parallel search with 1, 2, 4 and 8 workers,
+                                                         three runs each, failing if any run finds another move or
+                                                         score
+    python SearchBenchmark.py --scaling --workers 1 2 --depth 3
+                                                         choose the worker counts and the depth
+    python SearchBenchmark.py --search --report search.jsonl
+                                                         also write an Instrumentation report of every search and
+                                                         print where the time went
+    python SearchBenchmark.py --pruning                  search with no selective pruning, each technique alone and
+                                                         all of them, and print the effective branching factor and
+                                                         the depth reached in --time seconds
+
+Nothing here opens a window or imports pygame.
+"""
+import argparse
+import multiprocessing
+import random
+import sys
+import time
+
+import ChessEngine
+import Instrumentation
+import SmartMoveFinder
+import Perft
+
+benchmarkPositions = [
+    ("start", Perft.START_FEN),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"),
+    ("middlegame", "r1bq1rk1/pp2bppp/2n1pn2/3p4/2PP4/2N1PN2/PP1B1PPP/R2QKB1R w KQ - 0 8"),
+]
+
+PRUNING_SETTINGS = ("NULL_MOVE_PRUNING", "LATE_MOVE_REDUCTIONS", "FUTILITY_PRUNING")
+pruningConfigurations = [
+    ("none", ()),
+    ("null move", ("NULL_MOVE_PRUNING",)),
+    ("late move reductions", ("LATE_MOVE_REDUCTIONS",)),
+    ("futility", ("FUTILITY_PRUNING",)),
+    ("all", PRUNING_SETTINGS),
+]
+
+
+def runSearch(depth):
+    """
+    Search every benchmark position to the given depth and print the move found, the nodes visited and the time
+    """
+    totalNodes = 0
+    totalTime = 0.0
+    SmartMoveFinder.pawnTable.clear()
+    for name, fen in benchmarkPositions:
+        gs = ChessEngine.GameState(fen)
+        SmartMoveFinder.transpositionTable.clear()  # every position starts from an empty table
+        info = SmartMoveFinder.SearchInfo(depth)
+        startTime = time.perf_counter()
+        move, score, principalVariation = SmartMoveFinder.searchBestMove(gs, gs.getValidMoves(), depth, info=info)
+        seconds = time.perf_counter() - startTime
+        totalNodes += info.nodes
+        totalTime += seconds
+        print("%-10s depth %d: best %s (%d), %d nodes (%d quiescence), %.3fs, %d nodes/s, pv %s"
+              % (name, depth, move.getChessNotation(), score, info.nodes, info.quiescenceNodes, seconds,
+                 info.nodes / seconds, " ".join(pvMove.getChessNotation() for pvMove in principalVariation)))
+    print("total: %d nodes in %.3fs" % (totalNodes, totalTime))
+    pawnStats = SmartMoveFinder.pawnTable.getStats()
+    print("pawn table: %d lookups, %d pawn structures scored, hit rate %.1f%%"
+          % (pawnStats["lookups"], pawnStats["misses"], 100 * pawnStats["hitRate"]))
+
+
+def printCounters():
+    """
+    Print the calls and time of every function Instrumentation measured, the slowest first
+    """
+    for name, counter in sorted(Instrumentation.getCounters().items(), key=lambda item: -item[1]["seconds"]):
+        print("%-40s %9d calls %8.3fs %8.2f us/call" % (name, counter["calls"], counter["seconds"],
+                                                        counter["seconds"] / counter["calls"] * 1e6))
+
+
+def searchIterations(fen, depth, timeLimit=None):
+    """
+    Search a position from an empty table and return its SearchInfo, the best move and the nodes of every completed
+    iteration. The move ordering's random tie-break is seeded, so every configuration sees the same order.
+    """
+    gs = ChessEngine.GameState(fen)
+    SmartMoveFinder.transpositionTable.clear()
+    random.seed(0)
+    info = SmartMoveFinder.SearchInfo(depth, timeLimit)
+    iterationNodes = []
+    info.onIteration = lambda depth, score, principalVariation: iterationNodes.append(info.nodes - sum(iterationNodes))
+    move, score, principalVariation = SmartMoveFinder.searchBestMove(gs, gs.getValidMoves(), depth, timeLimit, info)
+    return info, move, iterationNodes
+
+
+def getBranchingFactor(iterationNodes):
+    """
+    Effective branching factor: how many times more nodes every iteration took than the one before, on average
+    """
+    if len(iterationNodes) < 2:
+        return 0.0
+    return (iterationNodes[-1] / iterationNodes[0]) ** (1 / (len(iterationNodes) - 1))
+
+
+def runPruning(depth, timeLimit):
+    """
+    Search every benchmark position with every pruning configuration: to the given depth, printing the nodes, the
+    effective branching factor and the moves found, then for timeLimit seconds, printing the depth reached and how
+    much deeper that is than without pruning
+    """
+    saved = {name: getattr(SmartMoveFinder, name) for name in PRUNING_SETTINGS}
+    baseDepth = None
+    try:
+        for name, enabled in pruningConfigurations:
+            for setting in PRUNING_SETTINGS:
+                setattr(SmartMoveFinder, setting, setting in enabled)
+            nodes = 0
+            branchingFactors = []
+            moves = []
+            for positionName, fen in benchmarkPositions:
+                info, move, iterationNodes = searchIterations(fen, depth)
+                nodes += info.nodes
+                branchingFactors.append(getBranchingFactor(iterationNodes))
+                moves.append(move.getChessNotation())
+            depths = [searchIterations(fen, SmartMoveFinder.MAX_PLY, timeLimit)[0].depthReached
+                      for positionName, fen in benchmarkPositions]
+            meanDepth = sum(depths) / len(depths)
+            if baseDepth is None:
+                baseDepth = meanDepth
+            print("%-20s depth %d: %7d nodes, branching factor %.2f, best %s; in %gs: depth %.2f (%+.2f)"
+                  % (name, depth, nodes, sum(branchingFactors) / len(branchingFactors), " ".join(moves), timeLimit,
+                     meanDepth, meanDepth - baseDepth))
+    finally:
+        for setting, value in saved.items():
+            setattr(SmartMoveFinder, setting, value)
+
+
+def runScaling(workerCounts, depth, repeats=3):
+    """
+    Search every benchmark position repeats times with each number of workers and print the fastest time, the speedup
+    over the first count, the nodes and the move found. Returns True if every run of every worker count found the same
+    move and score.
+    """
+    cores = multiprocessing.cpu_count()
+    print("%d CPU cores, depth %d, %d runs per worker count" % (cores, depth, repeats))
+    if cores < max(workerCounts):
+        print("warning: only %d cores for up to %d workers, the speedups with more workers than cores mean nothing"
+              % (cores, max(workerCounts)))
+    allSame = True
+    for name, fen in benchmarkPositions:
+        baseTime = None
+        baseResult = None
+        for workers in workerCounts:
+            SmartMoveFinder.startSearchPool(workers)  # starting the processes is not part of the search time
+            times = []
+            nodes = []
+            same = True
+            for run in range(repeats):  # the shared best score is read at moments that depend on timing
+                gs = ChessEngine.GameState(fen)
+                validMoves = gs.getValidMoves()
+                info = SmartMoveFinder.SearchInfo(depth)
+                startTime = time.perf_counter()
+                move, score = SmartMoveFinder.searchBestMoveParallel(gs, validMoves, depth, workers, info)
+                times.append(time.perf_counter() - startTime)
+                nodes.append(info.nodes)
+                if baseResult is None:
+                    baseResult = (move, score)
+                same = same and (move, score) == baseResult
+            seconds = min(times)
+            if baseTime is None:
+                baseTime = seconds
+            allSame = allSame and same
+            print("%-10s %d workers: %.3fs, speedup %.2fx, %d-%d nodes, best %s (%d)%s"
+                  % (name, workers, seconds, baseTime / seconds, min(nodes), max(nodes), move.getChessNotation(),
+                     score, "" if same else "  DIFFERENT RESULT"))
+    SmartMoveFinder.closeSearchPool()
+    return allSame
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the AI search.")
+    parser.add_argument("--search", action="store_true", help="search every position and print nodes and time")
+    parser.add_argument("--scaling", action="store_true", help="time the root-parallel search with several workers")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="worker counts to compare")
+    parser.add_argument("--depth", type=int, default=4, help="depth to search to")
+    parser.add_argument("--repeats", type=int, default=3, help="with --scaling, runs per worker count")
+    parser.add_argument("--report", help="with --search, measure the searches and write their reports to this file")
+    parser.add_argument("--pruning", action="store_true", help="compare the selective pruning techniques")
+    parser.add_argument("--time", type=float, default=5.0, help="with --pruning, seconds per timed search")
+    args = parser.parse_args(argv)
+
+    if args.search:
+        if args.report:
+            with open(args.report, "w") as reportFile:
+                Instrumentation.enable(reportFile)
+                runSearch(args.depth)
+                Instrumentation.disable()
+            printCounters()
+        else:
+            runSearch(args.depth)
+        return 0
+    if args.scaling:
+        return 0 if runScaling(args.workers, args.depth, args.repeats) else 1
+    if args.pruning:
+        runPruning(args.depth, args.time)
+        return 0
+    parser.print_help()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
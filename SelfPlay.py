@@ -0,0 +1,278 @@
+"""
+Headless engine-vs-engine matches. Two engine configurations play a number of games against each other across a pool
+of processes; every game starts with a few random moves so the games differ, and each random opening is played twice
+with the colors swapped so neither engine gets the better side of it. Finished games are appended to a PGN file as
+soon as they end, and the running score is printed with the Elo difference it implies.
+
+An engine configuration is a comma separated list of settings:
+
+    depth=N        plies to search (default SmartMoveFinder.DEPTH)
+    time=S         seconds per move, the search stops at the end of the iteration running out of time
+    NAME=VALUE     any numeric upper-case setting of SmartMoveFinder, e.g. DELTA_MARGIN=0, set only while this engine
+                   is thinking
+
+Usage:
+    python SelfPlay.py --games 100 --engine1 depth=3 --engine2 depth=2
+    python SelfPlay.py --games 20 --engine1 depth=3,DELTA_MARGIN=0 --engine2 depth=3 --workers 4 --pgn match.pgn
+
+Nothing here opens a window or imports pygame.
+"""
+import argparse
+import collections
+import datetime
+import math
+import multiprocessing
+import random
+import sys
+import time
+
+import ChessEngine
+import Pgn
+import SmartMoveFinder
+import TranspositionTable
+
+RANDOM_PLIES = 4  # random moves played at the start of every game
+MAX_PLIES = 300  # games still going after this many plies are adjudicated a draw
+FIFTY_MOVES = 100  # plies without a capture or a pawn move that make the game a draw
+TABLE_ENTRIES = 1 << 16  # transposition table size of each engine in each worker
+
+
+def parseEngine(text):
+    """
+    Turn an engine configuration string into (depth, timeLimit, settings), settings being a dict of SmartMoveFinder
+    names to the values they take while the engine thinks
+    """
+    depth = None
+    timeLimit = None
+    settings = {}
+    for item in filter(None, text.split(",")):
+        name, separator, value = item.partition("=")
+        name = name.strip()
+        if not separator:
+            raise ValueError("expected NAME=VALUE, got %r" % item)
+        if name == "depth":
+            depth = int(value)
+        elif name == "time":
+            timeLimit = float(value)
+        elif name.isupper() and isinstance(getattr(SmartMoveFinder, name, None), bool):  # switches: 1/0, true/false
+            settings[name] = value.strip().lower() in ("1", "true", "yes", "on")
+        elif name.isupper() and isinstance(getattr(SmartMoveFinder, name, None), (int, float)):
+            settings[name] = type(getattr(SmartMoveFinder, name))(value)
+        else:
+            raise ValueError("unknown engine setting %r" % name)
+    if depth is None:  # with a time limit and no depth only the clock stops the search
+        depth = SmartMoveFinder.DEPTH if timeLimit is None else SmartMoveFinder.MAX_PLY
+    return depth, timeLimit, settings
+
+
+class Engine:
+    """
+    One side of a match inside a worker: its search settings and its own transposition table, so the two engines
+    never read each other's results
+    """
+    def __init__(self, name, text):
+        self.name = "%s (%s)" % (name, text)
+        self.depth, self.timeLimit, self.settings = parseEngine(text)
+        self.transpositionTable = TranspositionTable.TranspositionTable(TABLE_ENTRIES)
+
+    def findMove(self, gs, validMoves):
+        savedSettings = {name: getattr(SmartMoveFinder, name) for name in self.settings}
+        savedTable = SmartMoveFinder.transpositionTable
+        for name, value in self.settings.items():
+            setattr(SmartMoveFinder, name, value)
+        SmartMoveFinder.transpositionTable = self.transpositionTable
+        try:
+            move, score, principalVariation = SmartMoveFinder.searchBestMove(gs, validMoves, self.depth,
+                                                                             self.timeLimit)
+        finally:
+            for name, value in savedSettings.items():
+                setattr(SmartMoveFinder, name, value)
+            SmartMoveFinder.transpositionTable = savedTable
+        return move
+
+
+def playOpening(gs, randomPlies, seed):
+    """
+    Play randomPlies random moves on gs, chosen with the given seed, and return them in SAN. Openings that end the
+    game are drawn again.
+    """
+    generator = random.Random(seed)
+    while True:
+        sanMoves = []
+        for ply in range(randomPlies):
+            validMoves = gs.getValidMoves()
+            move = generator.choice(validMoves)
+            sanMoves.append(Pgn.moveToSan(gs, move, validMoves))
+            gs.makeMove(move)
+        if gs.getValidMoves():
+            return sanMoves
+        while gs.moveLog:
+            gs.undoMove()
+
+
+def isInsufficientMaterial(gs):
+    """
+    True when neither side has the pieces to mate: bare kings, or a lone bishop or knight against a king
+    """
+    if gs.pieceCount > 3:
+        return False
+    pieces = [square[1] for row in gs.board for square in row if square != "--" and square[1] != "K"]
+    return len(pieces) == 0 or pieces[0] in ("B", "N")
+
+
+def playGame(task):
+    """
+    Play one game of the match in a worker. Returns (gameNumber, headers, sanMoves, result) with the result from
+    white's side as in PGN.
+    """
+    gameNumber, engineTexts, randomPlies, seed, maxPlies = task
+    engines = [Engine("engine%d" % (number + 1), text) for number, text in enumerate(engineTexts)]
+    if gameNumber % 2 == 1:  # the second game of every pair swaps the colors on the same opening
+        engines.reverse()
+    white, black = engines
+    gs = ChessEngine.GameState()
+    sanMoves = playOpening(gs, randomPlies, seed + gameNumber // 2)
+
+    repetitions = collections.Counter([gs.zobristKey])
+    quietPlies = 0  # plies since the last capture or pawn move
+    startTime = time.perf_counter()
+    while True:
+        validMoves = gs.getValidMoves()
+        if gs.checkmate:
+            result, termination = ("0-1" if gs.whiteToMove else "1-0"), "checkmate"
+            break
+        if gs.stalemate:
+            result, termination = "1/2-1/2", "stalemate"
+            break
+        if repetitions[gs.zobristKey] >= 3:
+            result, termination = "1/2-1/2", "threefold repetition"
+            break
+        if quietPlies >= FIFTY_MOVES:
+            result, termination = "1/2-1/2", "fifty-move rule"
+            break
+        if isInsufficientMaterial(gs):
+            result, termination = "1/2-1/2", "insufficient material"
+            break
+        if len(gs.moveLog) >= maxPlies:
+            result, termination = "1/2-1/2", "adjudicated after %d plies" % maxPlies
+            break
+        engine = white if gs.whiteToMove else black
+        move = engine.findMove(gs, validMoves)
+        sanMoves.append(Pgn.moveToSan(gs, move, validMoves))
+        quietPlies = 0 if move.isCapture or move.pieceMoved[1] == "p" else quietPlies + 1
+        gs.makeMove(move)
+        repetitions[gs.zobristKey] += 1
+    headers = {
+        "Event": "SelfPlay match",
+        "Site": "?",
+        "Date": datetime.date.today().strftime("%Y.%m.%d"),
+        "Round": str(gameNumber + 1),
+        "White": white.name,
+        "Black": black.name,
+        "Termination": termination,
+        "PlyCount": str(len(sanMoves)),
+        "TimeSeconds": "%.1f" % (time.perf_counter() - startTime),
+    }
+    return gameNumber, headers, sanMoves, result
+
+
+def getElo(score):
+    """
+    Elo difference that makes a player expected to score this fraction of the points
+    """
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return -400 * math.log10(1 / score - 1)
+
+
+def getEloWithError(wins, draws, losses):
+    """
+    Return the Elo difference the score implies and the half width of its 95% confidence interval, from the
+    standard error of the per-game scores
+    """
+    games = wins + draws + losses
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    margin = 1.96 * math.sqrt(variance / games)
+    elo = getElo(score)
+    error = (getElo(min(score + margin, 1)) - getElo(max(score - margin, 0))) / 2
+    return elo, error
+
+
+def formatElo(wins, draws, losses):
+    elo, error = getEloWithError(wins, draws, losses)
+    if math.isinf(elo):
+        return "Elo %sinf" % ("+" if elo > 0 else "-")
+    if math.isinf(error):
+        return "Elo %+.0f +/- inf" % elo
+    return "Elo %+.0f +/- %.0f" % (elo, error)
+
+
+def runMatch(engineTexts, games, workers, pgnPath, randomPlies=RANDOM_PLIES, seed=0, maxPlies=MAX_PLIES):
+    """
+    Play the match and return (wins, draws, losses) of the first engine. Every game is written to pgnPath as it ends.
+    """
+    tasks = [(gameNumber, engineTexts, randomPlies, seed, maxPlies) for gameNumber in range(games)]
+    wins = draws = losses = 0
+    pool = multiprocessing.Pool(workers) if workers > 1 else None
+    startTime = time.perf_counter()
+    try:
+        results = pool.imap_unordered(playGame, tasks) if pool else map(playGame, tasks)
+        with open(pgnPath, "w", encoding="utf-8") as pgnFile:
+            for finished, (gameNumber, headers, sanMoves, result) in enumerate(results, 1):
+                pgnFile.write(Pgn.formatGame(headers, sanMoves, result))
+                pgnFile.flush()  # the file holds every finished game even if the match is interrupted
+                if result == "1/2-1/2":
+                    draws += 1
+                elif (result == "1-0") == (gameNumber % 2 == 0):  # engine1 has white in the even games
+                    wins += 1
+                else:
+                    losses += 1
+                seconds = time.perf_counter() - startTime
+                print("game %d/%d (round %s) %s in %s plies, %s | +%d =%d -%d, %s, %.2f games/s"
+                      % (finished, games, headers["Round"], result, headers["PlyCount"], headers["Termination"],
+                         wins, draws, losses, formatElo(wins, draws, losses), finished / seconds))
+    finally:
+        if pool:
+            pool.terminate()
+            pool.join()
+    return wins, draws, losses
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play a headless match between two engine configurations.")
+    parser.add_argument("--engine1", default="depth=%d" % SmartMoveFinder.DEPTH, help="first engine configuration")
+    parser.add_argument("--engine2", default="depth=%d" % (SmartMoveFinder.DEPTH - 1),
+                        help="second engine configuration")
+    parser.add_argument("--games", type=int, default=20, help="number of games, best even so every opening is "
+                                                              "played with both colors")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(), help="processes to play on")
+    parser.add_argument("--pgn", default="selfplay.pgn", help="file the games are written to")
+    parser.add_argument("--random-plies", type=int, default=RANDOM_PLIES, help="random moves opening every game")
+    parser.add_argument("--max-plies", type=int, default=MAX_PLIES, help="plies after which a game is a draw")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random openings")
+    args = parser.parse_args(argv)
+
+    engineTexts = (args.engine1, args.engine2)
+    for text in engineTexts:
+        try:
+            parseEngine(text)
+        except ValueError as error:
+            parser.error("engine %r: %s" % (text, error))
+    print("%s vs %s, %d games on %d workers, games written to %s"
+          % (engineTexts[0], engineTexts[1], args.games, args.workers, args.pgn))
+    startTime = time.perf_counter()
+    wins, draws, losses = runMatch(engineTexts, args.games, args.workers, args.pgn, args.random_plies, args.seed,
+                                   args.max_plies)
+    seconds = time.perf_counter() - startTime
+    games = wins + draws + losses
+    print("%s vs %s: +%d =%d -%d, score %.1f/%d, %s, %d games in %.1fs, %.2f games/s"
+          % (engineTexts[0], engineTexts[1], wins, draws, losses, wins + draws / 2, games,
+             formatElo(wins, draws, losses), games, seconds, games / seconds))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
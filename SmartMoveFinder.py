@@ -0,0 +1,513 @@
+import multiprocessing
+import random
+import time
+import ChessEngine
+import TranspositionTable
+import MoveOrdering
+import Bitbases
+import PawnStructure
+
+ScoreOfPiece = ChessEngine.ScoreOfPiece #maps the value of each chess piece to a point system
+CHECKMATE = 10000 #used for minmax algorithm to represent very high score
+STALEMATE = 0 #used for minmax algorithm to represent very low score
+DEPTH = 3 #default number of plies searched by findBestMove
+MAX_PLY = 64 #no line is searched deeper than this, so scores closer to CHECKMATE than this are mate scores
+transpositionTable = TranspositionTable.TranspositionTable() #scores of positions already searched, keyed by their Zobrist key
+pawnTable = PawnStructure.PawnHashTable() #pawn structure scores, keyed by the pawn key of the game state
+KNOWN_WIN = 5000 #score of a position the endgame bitbases say is won, plus how far the win has come
+DELTA_MARGIN = 20 #the quiescence search skips captures that leave the score this far below alpha even with the captured piece won
+DELTA_PRUNING = True #skip those captures; turned off, the quiescence search tries every capture
+WORKERS = 1 #number of processes findBestMove searches with, more than 1 splits the root moves across a process pool
+NULL_MOVE_PRUNING = True #try passing the turn first, a position still good enough after that is cut off without searching its moves
+NULL_MOVE_REDUCTION = 2 #plies the search after a null move is shallower than the one after a real move
+LATE_MOVE_REDUCTIONS = True #search the quiet moves late in the order one ply shallower, again at full depth if they turn out good
+LATE_MOVE_MIN_DEPTH = 3 #only reduce at this depth or more
+LATE_MOVE_MIN_NUMBER = 3 #only reduce from the move at this place in the order on
+FUTILITY_PRUNING = True #skip the quiet moves of the last plies when the static score is too far below alpha to catch up
+FUTILITY_MARGINS = (0, 20, 50) #by the depth left: how far below alpha a quiet move can't bring the score back
+PAWN_STRUCTURE = True #add the doubled, isolated and passed pawn terms of PawnStructure to the evaluation
+
+"""
+Select random valid move from the list of valid moves
+"""
+def findRandomMove(validMoves):
+    return validMoves[random.randint(0, len(validMoves)-1)]
+
+"""
+Select best move from the list of valid moves using piece value system
+"""
+def findBestMove(gs, validMoves): #inputs: current game state, list of valid moves
+    if WORKERS > 1:
+        bestMove, score = searchBestMoveParallel(gs, validMoves, DEPTH, WORKERS)
+        return bestMove
+    bestMove, score, principalVariation = searchBestMove(gs, validMoves, DEPTH)
+    return bestMove
+
+
+class SearchInfo:
+    """
+    Bookkeeping of one search: its limits, whether it had to stop, how many positions it visited and how well the
+    moves were ordered
+    """
+    def __init__(self, maxDepth, timeLimit=None):
+        self.maxDepth = maxDepth #deepest iteration to search
+        self.timeLimit = timeLimit #seconds the search may take, or None to always finish maxDepth
+        self.startTime = time.perf_counter()
+        self.stopped = False #set when the time ran out or stop was called, the iteration that was running is then thrown away
+        self.nodes = 0 #number of positions visited
+        self.quiescenceNodes = 0 #how many of them were visited by the quiescence search
+        self.currentDepth = 0 #depth of the iteration that is running
+        self.depthReached = 0 #deepest iteration that was completed
+        self.cutoffs = 0 #number of positions where a move failed high
+        self.firstMoveCutoffs = 0 #number of those where it was the first move tried
+        self.moveOrderer = MoveOrdering.MoveOrderer(ScoreOfPiece, MAX_PLY) #killer and history tables of this search
+        self.onIteration = None #when set, called with the depth, score and principal variation of every completed iteration
+        self.nullMoveCutoffs = 0 #number of positions cut off by a null move
+        self.reductions = 0 #number of moves searched with a late move reduction
+        self.reSearches = 0 #how many of them had to be searched again at full depth
+        self.futilityPrunes = 0 #number of quiet moves skipped by futility pruning
+
+    def stop(self):
+        """
+        Make the search return as soon as possible. Safe to call from another thread while the search is running.
+        """
+        self.stopped = True
+
+    def getNodesPerSecond(self):
+        seconds = time.perf_counter() - self.startTime
+        return self.nodes / seconds if seconds > 0 else 0.0
+
+    def checkTime(self):
+        if self.timeLimit is not None and time.perf_counter() - self.startTime >= self.timeLimit:
+            self.stopped = True
+
+    def recordCutoff(self, moveNumber):
+        self.cutoffs += 1
+        if moveNumber == 0:
+            self.firstMoveCutoffs += 1
+
+    def getCutoffRate(self):
+        """
+        Fraction of the beta cutoffs that happened on the first move tried, close to 1 when the ordering is good
+        """
+        return self.firstMoveCutoffs / self.cutoffs if self.cutoffs else 0.0
+
+
+"""
+Find the best move with iterative deepening: search 1 ply deep, then 2 plies and so on up to maxDepth, each iteration
+trying first the best move of the previous one. Stops early when the time limit runs out, keeping the result of the
+last completed iteration. Returns the best move, its score from the point of view of the player to move, and the
+principal variation (the line of best play the search expects). Pass a SearchInfo to read its counters afterwards.
+"""
+def searchBestMove(gs, validMoves, maxDepth=DEPTH, timeLimit=None, info=None):
+    if info is None:
+        info = SearchInfo(maxDepth, timeLimit)
+    transpositionTable.newSearch()
+    rootMoves = getBitbaseMoves(gs, list(validMoves))
+    if len(rootMoves) == 0: #checkmate or stalemate, there is nothing to search
+        return None, 0, []
+    bestMove = rootMoves[0]
+    bestScore = 0
+    principalVariation = []
+    for depth in range(1, maxDepth + 1):
+        info.currentDepth = depth
+        #the best move of the previous iteration first, it is the most likely to be best again
+        rootMoves = info.moveOrderer.orderMoves(rootMoves, 0, principalVariation[0] if principalVariation else None)
+        pv = []
+        score = searchRoot(gs, info, rootMoves, depth, pv)
+        if info.stopped: #the unfinished iteration can't be trusted
+            break
+        bestMove, bestScore, principalVariation = pv[0], score, pv
+        info.depthReached = depth
+        if info.onIteration is not None:
+            info.onIteration(depth, score, principalVariation)
+        if abs(score) >= CHECKMATE - MAX_PLY: #a forced mate was found, searching deeper won't change the move
+            break
+        if timeLimit is not None and time.perf_counter() - info.startTime >= timeLimit / 2:
+            break #the next iteration would most likely not finish in the remaining time
+    return bestMove, bestScore, principalVariation
+
+
+"""
+Search every root move to the given depth with alpha-beta negamax and fill pv with the principal variation
+"""
+def searchRoot(gs, info, rootMoves, depth, pv):
+    alpha = -CHECKMATE - 1
+    beta = CHECKMATE + 1
+    for move in rootMoves:
+        childPv = []
+        gs.makeMove(move)
+        score = -findMoveNegaMaxAlphaBeta(gs, info, depth - 1, -beta, -alpha, 1, childPv)
+        gs.undoMove()
+        if info.stopped:
+            return 0
+        if score > alpha: #new best move
+            alpha = score
+            pv[:] = [move] + childPv
+    return alpha
+
+
+"""
+Negamax with alpha-beta pruning. Scores are always seen from the player to move, so the opponent's best score is the
+negation of ours and one function serves both sides. Once a move scores at least beta the opponent would never allow
+this position, so the remaining moves are skipped. Positions are stored in the transposition table with whether their
+score is exact or only a bound.
+
+On top of that the search is selective, each technique switched on and off by its setting:
+- null move pruning: if the player to move could pass and a search NULL_MOVE_REDUCTION plies shallower still scores at
+  least beta, a real move would too, so the position is cut off. Not done in check (passing would be illegal), for a
+  player with only pawns left (where zugzwang, having to move being a disadvantage, is common), twice in a row, or
+  when beta is a mate score.
+- late move reductions: quiet moves from LATE_MOVE_MIN_NUMBER on in the order are rarely best, so they are searched
+  one ply shallower with a null window; only the ones that beat alpha get the full search.
+- futility pruning: one or two plies from the leaves, when the static score plus the margin of FUTILITY_MARGINS is
+  still at most alpha, the quiet moves can't catch up and are skipped, except the first one.
+Captures, promotions and moves that give check are never reduced or pruned, and neither is anything while in check.
+"""
+def findMoveNegaMaxAlphaBeta(gs, info, depth, alpha, beta, ply, pv, allowNullMove=True):
+    if depth == 0: #play out the captures before scoring, so a piece left hanging is not counted as ours
+        return quiescence(gs, info, alpha, beta, ply)
+    info.nodes += 1
+    if info.nodes & 1023 == 0: #looking at the clock is slow, so only do it every 1024 positions
+        info.checkTime()
+    if info.stopped:
+        return 0
+    if gs.pieceCount <= 3 and Bitbases.probe(gs) == Bitbases.DRAW: #a known draw needs no search
+        return STALEMATE
+
+    alphaOriginal = alpha
+    key = gs.zobristKey
+    entry = transpositionTable.probe(key)
+    ttMove = None
+    if entry is not None:
+        entryDepth, entryScore, entryFlag, ttMove = entry
+        if entryDepth >= depth:
+            entryScore = scoreFromTable(entryScore, ply)
+            if entryFlag == TranspositionTable.EXACT:
+                return entryScore
+            elif entryFlag == TranspositionTable.LOWERBOUND:
+                alpha = max(alpha, entryScore)
+            else:
+                beta = min(beta, entryScore)
+            if alpha >= beta:
+                return entryScore
+
+    moves = gs.getValidMoves() #also finds out whether we are in check
+    if gs.checkmate: #the player to move is mated, the sooner the worse
+        return -CHECKMATE + ply
+    if gs.stalemate or len(moves) == 0:
+        return STALEMATE
+    inCheck = gs.inCheck
+    staticScore = (1 if gs.whiteToMove else -1) * scoreBoard(gs) if not inCheck else 0
+
+    if (NULL_MOVE_PRUNING and allowNullMove and not inCheck and depth > NULL_MOVE_REDUCTION and
+            staticScore >= beta and abs(beta) < CHECKMATE - MAX_PLY and hasPieces(gs)):
+        gs.makeNullMove()
+        score = -findMoveNegaMaxAlphaBeta(gs, info, depth - 1 - NULL_MOVE_REDUCTION, -beta, -beta + 1, ply + 1, [],
+                                          False)
+        gs.undoNullMove()
+        if info.stopped:
+            return 0
+        if score >= beta: #passing is already good enough, a real move would be too
+            info.nullMoveCutoffs += 1
+            return beta
+
+    futile = (FUTILITY_PRUNING and not inCheck and depth < len(FUTILITY_MARGINS) and
+              abs(alpha) < CHECKMATE - MAX_PLY and staticScore + FUTILITY_MARGINS[depth] <= alpha)
+    moves = info.moveOrderer.orderMoves(moves, ply, ttMove) #the moves most likely to cause a cutoff first
+
+    maxScore = -CHECKMATE - 1
+    bestMove = None
+    for moveNumber, move in enumerate(moves):
+        childPv = []
+        gs.makeMove(move)
+        quiet = not (move.isCapture or move.pawnPromotion)
+        reduce = (LATE_MOVE_REDUCTIONS and not inCheck and quiet and depth >= LATE_MOVE_MIN_DEPTH and
+                  moveNumber >= LATE_MOVE_MIN_NUMBER)
+        if ((futile and quiet and moveNumber > 0) or reduce) and givesCheck(gs):
+            reduce = False
+        elif futile and quiet and moveNumber > 0: #can't bring the score back up to alpha
+            gs.undoMove()
+            info.futilityPrunes += 1
+            maxScore = max(maxScore, staticScore + FUTILITY_MARGINS[depth])
+            continue
+        if reduce:
+            info.reductions += 1
+            score = -findMoveNegaMaxAlphaBeta(gs, info, depth - 2, -alpha - 1, -alpha, ply + 1, childPv)
+            if score > alpha and not info.stopped: #better than expected, search it properly
+                info.reSearches += 1
+                childPv = []
+                score = -findMoveNegaMaxAlphaBeta(gs, info, depth - 1, -beta, -alpha, ply + 1, childPv)
+        else:
+            score = -findMoveNegaMaxAlphaBeta(gs, info, depth - 1, -beta, -alpha, ply + 1, childPv)
+        gs.undoMove()
+        if info.stopped:
+            return 0
+        if score > maxScore:
+            maxScore = score
+            bestMove = move
+            if score > alpha:
+                alpha = score
+                pv[:] = [move] + childPv
+                if alpha >= beta: #the opponent won't allow this position, no need to look at other moves
+                    info.recordCutoff(moveNumber)
+                    info.moveOrderer.recordCutoff(move, ply, depth)
+                    break
+
+    if maxScore <= alphaOriginal:
+        flag = TranspositionTable.UPPERBOUND
+    elif maxScore >= beta:
+        flag = TranspositionTable.LOWERBOUND
+    else:
+        flag = TranspositionTable.EXACT
+    transpositionTable.store(key, depth, scoreToTable(maxScore, ply), flag, bestMove)
+    return maxScore
+
+
+"""
+Whether the player to move has anything besides pawns and the king. Without, zugzwang is common and passing the turn
+says nothing about the position.
+"""
+def hasPieces(gs):
+    return gs.nonPawnCounts[not gs.whiteToMove] > 0
+
+
+"""
+Whether the move just made gives check: the king of the player now to move is attacked
+"""
+def givesCheck(gs):
+    row, col = gs.whiteKingPosition if gs.whiteToMove else gs.blackKingLocation
+    return gs.squareUnderAttack(row, col)
+
+
+"""
+Quiescence search: at the leaves of the main search, keep searching captures and promotions until the position is
+quiet, so the score doesn't depend on whose piece happened to be hanging when the depth ran out. The player to move
+may also decline every capture (stand pat) and take the static score, which is what keeps this search small. A
+capture is skipped when even winning the captured piece plus DELTA_MARGIN would not raise the score to alpha (delta
+pruning). In check there is no standing pat, every move that gets out of check is searched.
+"""
+def quiescence(gs, info, alpha, beta, ply):
+    info.nodes += 1
+    info.quiescenceNodes += 1
+    if info.nodes & 1023 == 0:
+        info.checkTime()
+    if info.stopped:
+        return 0
+    if gs.pieceCount <= 3: #an ending the bitbases know is scored by them, there is nothing to capture anyway
+        result = Bitbases.probe(gs)
+        if result is not None:
+            return scoreKnownEnding(gs, result, ply)
+    turnMultiplier = 1 if gs.whiteToMove else -1
+    standPat = turnMultiplier * scoreBoard(gs)
+    if ply >= MAX_PLY:
+        return standPat
+    moves = gs.getCaptureMoves() #also finds out whether we are in check
+    inCheck = gs.inCheck
+    if inCheck:
+        moves = gs.getValidMoves()
+        if gs.checkmate:
+            return -CHECKMATE + ply
+        maxScore = -CHECKMATE - 1
+    else:
+        if standPat >= beta: #already good enough without capturing anything
+            return standPat
+        if standPat > alpha:
+            alpha = standPat
+        maxScore = standPat
+    for move in info.moveOrderer.orderMoves(moves, ply):
+        if DELTA_PRUNING and not inCheck:
+            gain = 0 #the most this capture can win
+            if move.isCapture:
+                gain += ScoreOfPiece[move.pieceCaptured[1]] * ChessEngine.MATERIAL_SCALE
+            if move.pawnPromotion:
+                gain += (ScoreOfPiece["Q"] - ScoreOfPiece["p"]) * ChessEngine.MATERIAL_SCALE
+            if standPat + gain + DELTA_MARGIN <= alpha: #hopeless, even winning it won't reach alpha
+                continue
+        gs.makeMove(move)
+        score = -quiescence(gs, info, -beta, -alpha, ply + 1)
+        gs.undoMove()
+        if info.stopped:
+            return 0
+        if score > maxScore:
+            maxScore = score
+            if score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    break
+    return maxScore
+
+
+"""
+Score a position of an ending the bitbases know, for the player to move: won positions get KNOWN_WIN plus how far
+the win has come, so the search heads for the mate instead of shuffling between won positions
+"""
+def scoreKnownEnding(gs, result, ply):
+    if result == Bitbases.DRAW:
+        return STALEMATE
+    if result == Bitbases.LOSS and len(gs.getValidMoves()) == 0: #the loss has already happened
+        return -CHECKMATE + ply
+    return result * (KNOWN_WIN + Bitbases.getProgress(gs))
+
+
+"""
+In an ending the bitbases know, keep only the root moves that keep the best result: the moves that keep a win when
+the position is won, or that don't lose a drawn one. The search then only chooses among them. The bitbases don't
+say how far the mate is, so when winning, moves back into a position the game has already been in are left out too,
+otherwise the winning side can go round in circles.
+"""
+def getBitbaseMoves(gs, rootMoves):
+    if gs.pieceCount > 3 or len(rootMoves) == 0 or Bitbases.probe(gs) is None:
+        return rootMoves
+    results = []
+    for move in rootMoves:
+        gs.makeMove(move)
+        result = Bitbases.probe(gs) #for the opponent
+        gs.undoMove()
+        if result is None: #the ending after the move has no bitbase file
+            return rootMoves
+        results.append(-result)
+    bestResult = max(results)
+    bestMoves = [move for move, result in zip(rootMoves, results) if result == bestResult]
+    if bestResult == Bitbases.WIN:
+        seenKeys = set(gs.undoStack[0:2 * len(gs.moveLog):2]) #keys of the positions before every move of the game
+        newMoves = []
+        for move in bestMoves:
+            gs.makeMove(move)
+            if gs.zobristKey not in seenKeys:
+                newMoves.append(move)
+            gs.undoMove()
+        if newMoves:
+            bestMoves = newMoves
+    return bestMoves
+
+
+"""
+Root-parallel search. The root moves are put in a fixed order and handed one by one to a pool of worker processes,
+each searching its own copy of the game state. The best score found so far is kept in a shared integer that every
+worker reads before it starts on a move, so later moves are searched with a narrower window and prune more.
+
+Results don't depend on how many workers there are or which one finishes first: every move is searched with a fresh
+transposition table and the random generator seeded by the move's place in the order, and the window starts one
+below the shared best score, so a move that ties the best gets its exact score and not just a bound. Among the moves
+with the highest score the one earliest in the order wins. The workers search without null move pruning, late move
+reductions, futility pruning and delta pruning: those make the score of a move depend on the window it was searched
+with, and the window depends on when the shared best score was read. The number of nodes still varies from run to run.
+"""
+searchPool = None #the pool of worker processes, started by the first parallel search
+searchPoolWorkers = 0 #number of processes in searchPool
+sharedAlpha = None #best score any worker has found for the current search
+
+
+def startSearchPool(workers):
+    """
+    Start the pool of worker processes, or keep the running one if it has the same number of workers
+    """
+    global searchPool, searchPoolWorkers, sharedAlpha
+    if searchPool is not None and searchPoolWorkers == workers:
+        return
+    closeSearchPool()
+    sharedAlpha = multiprocessing.Value("i", -CHECKMATE - 1)
+    searchPool = multiprocessing.Pool(workers, initializer=initSearchWorker, initargs=(sharedAlpha,))
+    searchPoolWorkers = workers
+
+
+def closeSearchPool():
+    """
+    Stop the worker processes, e.g. before the program exits
+    """
+    global searchPool, searchPoolWorkers
+    if searchPool is not None:
+        searchPool.terminate()
+        searchPool.join()
+        searchPool = None
+        searchPoolWorkers = 0
+
+
+def initSearchWorker(alpha):
+    """
+    Runs once in every worker process: remember the shared best score and use a smaller transposition table, it is
+    cleared for every move anyway
+    """
+    global sharedAlpha, transpositionTable
+    sharedAlpha = alpha
+    transpositionTable = TranspositionTable.TranspositionTable(1 << 16)
+
+
+def searchRootMove(task):
+    """
+    Search one root move in a worker process. Returns (root index, score, nodes).
+    """
+    global NULL_MOVE_PRUNING, LATE_MOVE_REDUCTIONS, FUTILITY_PRUNING, DELTA_PRUNING
+    rootIndex, gs, move, depth = task
+    #their scores depend on the window, see above
+    NULL_MOVE_PRUNING = LATE_MOVE_REDUCTIONS = FUTILITY_PRUNING = DELTA_PRUNING = False
+    transpositionTable.clear()
+    random.seed(rootIndex)
+    info = SearchInfo(depth)
+    alpha = sharedAlpha.value - 1 #one below the best so far, so a move as good as it still gets an exact score
+    gs.makeMove(move)
+    score = -findMoveNegaMaxAlphaBeta(gs, info, depth - 1, -(CHECKMATE + 1), -alpha, 1, [])
+    gs.undoMove()
+    with sharedAlpha.get_lock():
+        if score > sharedAlpha.value:
+            sharedAlpha.value = score
+    return rootIndex, score, info.nodes
+
+
+"""
+Search the valid moves to the given depth across a pool of worker processes. Returns the best move and its score
+from the point of view of the player to move; pass a SearchInfo to read the number of positions visited.
+"""
+def searchBestMoveParallel(gs, validMoves, depth=DEPTH, workers=WORKERS, info=None):
+    if len(validMoves) == 0:
+        return None, 0
+    startSearchPool(workers)
+    sharedAlpha.value = -CHECKMATE - 1
+    #captures and promotions first, by MVV-LVA, the rest in the order they were generated; unlike orderMoves there is
+    #no random tie-break, so the order is the same every time
+    orderer = MoveOrdering.MoveOrderer(ScoreOfPiece, MAX_PLY)
+    rootMoves = sorted(validMoves, key=lambda move: orderer.scoreMove(move, 0, None), reverse=True)
+    tasks = [(rootIndex, gs, move, depth) for rootIndex, move in enumerate(rootMoves)]
+    bestIndex = None
+    bestScore = -CHECKMATE - 1
+    for rootIndex, score, nodes in searchPool.imap_unordered(searchRootMove, tasks):
+        if info is not None:
+            info.nodes += nodes
+        if score > bestScore or (score == bestScore and rootIndex < bestIndex):
+            bestIndex, bestScore = rootIndex, score
+    if info is not None:
+        info.depthReached = depth
+        if info.onIteration is not None:
+            info.onIteration(depth, bestScore, [rootMoves[bestIndex]])
+    return rootMoves[bestIndex], bestScore
+
+
+"""
+Mate scores count the plies from the root, but a position can be reached at any ply. They are stored in the table
+counting from the position itself and converted back when they are read.
+"""
+def scoreToTable(score, ply):
+    if score >= CHECKMATE - MAX_PLY:
+        return score + ply
+    if score <= -CHECKMATE + MAX_PLY:
+        return score - ply
+    return score
+
+
+def scoreFromTable(score, ply):
+    if score >= CHECKMATE - MAX_PLY:
+        return score - ply
+    if score <= -CHECKMATE + MAX_PLY:
+        return score + ply
+    return score
+
+
+#Score the position based on material, where the pieces stand and the pawn structure, in tenths of a pawn with white
+#positive. The game state keeps the first two up to date move by move and the pawn structure score comes from the pawn
+#table, so this only looks at the board when the pawns are in a layout the table doesn't hold.
+def scoreBoard(gs):
+    score = gs.materialScore * ChessEngine.MATERIAL_SCALE + gs.positionScore
+    if PAWN_STRUCTURE:
+        score += pawnTable.getScore(gs)
+    return score
@@ -0,0 +1,81 @@
+"""
+Measures how long the game takes to start, headless and with the window. Every measurement runs in a fresh Python
+process, so nothing is already imported:
+
+    headless   import ChessEngine and SmartMoveFinder, what tools, pool workers and the UCI front end pay; pygame
+               must not be imported
+    gui        import Main (pygame included) and create Main(), which opens the window and loads the sprite atlas
+
+Usage:
+    python StartupBenchmark.py                  run each measurement 5 times and print the fastest
+    python StartupBenchmark.py --runs 10
+
+Without a display the window is opened with SDL's dummy video driver.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+HEADLESS_CODE = """
+import sys, time
+start = time.perf_counter()
+import ChessEngine, SmartMoveFinder
+print(time.perf_counter() - start, 0.0, "pygame" in sys.modules)
+"""
+
+GUI_CODE = """
+import sys, time
+start = time.perf_counter()
+import Main
+imported = time.perf_counter()
+Main.Main()
+print(imported - start, time.perf_counter() - imported, "pygame" in sys.modules)
+"""
+
+
+def measure(code, environment):
+    """
+    Run code in a new interpreter in the game's folder. Returns (process seconds, import seconds, setup seconds,
+    whether pygame was imported), or raises RuntimeError with the error output when the code fails.
+    """
+    startTime = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code], cwd=FOLDER, env=environment, capture_output=True, text=True)
+    seconds = time.perf_counter() - startTime
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed")
+    importSeconds, setupSeconds, pygameImported = result.stdout.split()[-3:]
+    return seconds, float(importSeconds), float(setupSeconds), pygameImported == "True"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the start-up time of the game.")
+    parser.add_argument("--runs", type=int, default=5, help="times to run each measurement, the fastest is kept")
+    args = parser.parse_args(argv)
+
+    environment = dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT="1")
+    if not environment.get("DISPLAY") and not environment.get("WAYLAND_DISPLAY") and sys.platform.startswith("linux"):
+        environment.setdefault("SDL_VIDEODRIVER", "dummy")
+    status = 0
+    for name, code in (("headless", HEADLESS_CODE), ("gui", GUI_CODE)):
+        try:
+            runs = [measure(code, environment) for run in range(args.runs)]
+        except RuntimeError as error:
+            print("%-8s failed: %s" % (name, error))
+            status = 1
+            continue
+        seconds, importSeconds, setupSeconds, pygameImported = min(runs)
+        setup = ", window and sprites %.3fs" % setupSeconds if name == "gui" else ""
+        print("%-8s process %.3fs, imports %.3fs%s, pygame %s"
+              % (name, seconds, importSeconds, setup, "imported" if pygameImported else "not imported"))
+        if name == "headless" and pygameImported:
+            print("headless imports must not pull in pygame")
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+This file contains a fixed-size transposition table for the AI. The search stores what it learned about a position
+(how deep it was searched, its score, whether that score is exact or only a bound, and the best move) under the
+position's Zobrist key, so a position reached again through a different move order doesn't have to be searched again.
+"""
+
+# kinds of score that can be stored in the table
+EXACT = 0  # the score is the exact value of the position
+LOWERBOUND = 1  # the search failed high: the position is worth at least the score
+UPPERBOUND = 2  # the search failed low: the position is worth at most the score
+
+
+class TranspositionTable:
+    """
+    The table is a fixed number of slots (a power of two) kept in parallel lists, so its memory use never grows while
+    searching. The slot of a position is its key masked with the size of the table. When two positions want the same
+    slot, the replacement policy keeps the entry that was searched deeper, unless it is left over from an older search.
+    """
+    # approximate memory used by one slot: the five list references plus the key, score and move objects they hold
+    bytesPerEntry = 120
+
+    def __init__(self, numberOfEntries=1 << 18):
+        # round the size down to a power of two so the slot can be found with a mask instead of a modulo
+        self.size = 1 << (max(numberOfEntries, 1).bit_length() - 1)
+        self.mask = self.size - 1
+        self.keys = [None] * self.size
+        self.depths = [0] * self.size
+        self.scores = [0] * self.size
+        self.flags = [EXACT] * self.size
+        self.bestMoves = [None] * self.size
+        self.generations = [0] * self.size
+        self.generation = 0  # number of the current search, used to recognise stale entries
+        self.resetCounters()
+
+    @classmethod
+    def fromMegabytes(cls, megabytes):
+        """
+        Create the largest table that fits in the given memory budget
+        """
+        return cls(megabytes * 1024 * 1024 // cls.bytesPerEntry)
+
+    def resetCounters(self):
+        self.hits = 0  # probes that found the position
+        self.misses = 0  # probes that found an empty slot
+        self.collisions = 0  # probes that found a different position in the slot
+        self.stores = 0  # entries written
+        self.overwrites = 0  # entries written over a different position
+
+    def clear(self):
+        """
+        Remove every entry and reset the counters
+        """
+        for i in range(self.size):
+            self.keys[i] = None
+            self.bestMoves[i] = None
+        self.generation = 0
+        self.resetCounters()
+
+    def newSearch(self):
+        """
+        Called at the start of every search so entries of older searches can be replaced first
+        """
+        self.generation += 1
+
+    def probe(self, key):
+        """
+        Return (depth, score, flag, bestMove) stored for the position, or None if it is not in the table
+        """
+        index = key & self.mask
+        storedKey = self.keys[index]
+        if storedKey == key:
+            self.hits += 1
+            return self.depths[index], self.scores[index], self.flags[index], self.bestMoves[index]
+        if storedKey is None:
+            self.misses += 1
+        else:
+            self.collisions += 1
+        return None
+
+    def store(self, key, depth, score, flag, bestMove):
+        """
+        Store the result of searching the position, if the replacement policy allows it
+        """
+        index = key & self.mask
+        storedKey = self.keys[index]
+        if storedKey is not None and storedKey != key:
+            # a different position is in the slot: only replace it if it is from an older search or not deeper
+            if self.generations[index] == self.generation and self.depths[index] > depth:
+                return
+            self.overwrites += 1
+        elif storedKey == key and bestMove is None:
+            bestMove = self.bestMoves[index]  # keep the best move we already knew about the position
+        self.keys[index] = key
+        self.depths[index] = depth
+        self.scores[index] = score
+        self.flags[index] = flag
+        self.bestMoves[index] = bestMove
+        self.generations[index] = self.generation
+        self.stores += 1
+
+    def getStats(self):
+        """
+        Return the counters as a dictionary, along with how full the table is and its estimated memory use
+        """
+        probes = self.hits + self.misses + self.collisions
+        used = self.size - self.keys.count(None)
+        return {
+            "size": self.size,
+            "used": used,
+            "fill": used / self.size,
+            "memoryBytes": self.size * self.bytesPerEntry,
+            "probes": probes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "collisions": self.collisions,
+            "hitRate": self.hits / probes if probes else 0.0,
+            "stores": self.stores,
+            "overwrites": self.overwrites,
+        }
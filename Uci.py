@@ -0,0 +1,204 @@
+"""
+UCI (Universal Chess Interface) front end, so the engine can be loaded into chess GUIs and tournament managers. The
+GUI talks to it over standard input and output:
+
+    uci                                     identify the engine, answered with uciok
+    isready                                 answered with readyok, also while searching
+    ucinewgame                              forget what was learned in the previous game
+    setoption name Hash value <MB>          size of the transposition table
+    position startpos [moves e2e4 ...]      set up the position to search
+    position fen <FEN> [moves ...]
+    go [depth N] [movetime MS] [wtime MS btime MS winc MS binc MS movestogo N] [infinite]
+    stop                                    end the search, the best move so far is sent as bestmove
+    quit
+
+The search runs on its own thread while this one keeps reading commands, so stop and isready are answered straight
+away. Every completed iteration is reported with an info line. The engine always promotes to a queen, so a move list
+with an under-promotion like e7e8n is only followed up to that move, which is reported as illegal.
+
+Run it with `python Uci.py`, or point the GUI at that command. Nothing here opens a window or imports pygame.
+"""
+import sys
+import threading
+import time
+
+import ChessEngine
+import SmartMoveFinder
+import TranspositionTable
+
+ENGINE_NAME = "CSAI 350 chess engine"
+ENGINE_AUTHOR = "CSAI 350 project"
+DEFAULT_HASH_MB = 32
+MOVE_OVERHEAD = 0.05  # seconds kept back from every time limit for reading the command and printing the move
+MOVES_TO_GO = 30  # moves the remaining clock time is shared among when the GUI doesn't say
+
+
+def moveToUci(move):
+    """
+    Return a move in UCI notation: start and end square, plus the promotion piece, e.g. "e2e4", "e1g1", "e7e8q"
+    """
+    return move.getChessNotation() + ("q" if move.pawnPromotion else "")
+
+
+def findUciMove(gs, text):
+    """
+    Return the valid move of gs written as text in UCI notation, or None if there is no such move. The engine always
+    promotes to a queen, so an under-promotion like e7e8n has no matching move.
+    """
+    if len(text) not in (4, 5) or (len(text) == 5 and text[4] != "q"):
+        return None
+    for move in gs.getValidMoves():
+        if move.getChessNotation() == text[:4] and move.pawnPromotion == (len(text) == 5):
+            return move
+    return None
+
+
+def getTimeLimit(gs, options):
+    """
+    Seconds to search for the limits of a go command, None for no time limit
+    """
+    if "movetime" in options:
+        return max(options["movetime"] / 1000 - MOVE_OVERHEAD, 0.01)
+    remaining = options.get("wtime" if gs.whiteToMove else "btime")
+    if remaining is None:
+        return None
+    increment = options.get("winc" if gs.whiteToMove else "binc", 0)
+    share = (remaining / options.get("movestogo", MOVES_TO_GO) + increment * 3 / 4) / 1000
+    return max(min(share, remaining / 1000 / 2) - MOVE_OVERHEAD, 0.01)  # never more than half the clock
+
+
+class UciEngine:
+    """
+    The state of one UCI session: the position set by the GUI and the search running on it, if any
+    """
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.outputLock = threading.Lock()  # info lines come from the search thread, the rest from the reader
+        self.gs = ChessEngine.GameState()
+        self.searchThread = None
+        self.info = None  # SearchInfo of the running search
+
+    def send(self, line):
+        with self.outputLock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def handle(self, line):
+        """
+        Carry out one command line. Returns False when the session should end.
+        """
+        words = line.split()
+        if not words:
+            return True
+        command = words[0]
+        if command == "uci":
+            self.send("id name " + ENGINE_NAME)
+            self.send("id author " + ENGINE_AUTHOR)
+            self.send("option name Hash type spin default %d min 1 max 1024" % DEFAULT_HASH_MB)
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "stop":
+            self.stopSearch()
+        elif command == "quit":
+            self.stopSearch()
+            return False
+        elif command == "ucinewgame":
+            self.stopSearch()
+            SmartMoveFinder.transpositionTable.clear()
+        elif command == "setoption":
+            self.stopSearch()
+            self.setOption(words[1:])
+        elif command == "position":
+            self.stopSearch()
+            self.setPosition(words[1:])
+        elif command == "go":
+            self.stopSearch()
+            self.go(words[1:])
+        return True  # unknown commands are ignored, as the protocol asks
+
+    def setOption(self, words):
+        if "name" not in words or "value" not in words:
+            return
+        name = " ".join(words[words.index("name") + 1:words.index("value")])
+        value = " ".join(words[words.index("value") + 1:])
+        if name.lower() == "hash" and value.isdigit():
+            SmartMoveFinder.transpositionTable = TranspositionTable.TranspositionTable.fromMegabytes(int(value))
+
+    def setPosition(self, words):
+        movesAt = words.index("moves") if "moves" in words else len(words)
+        if words and words[0] == "fen":
+            self.gs = ChessEngine.GameState(" ".join(words[1:movesAt]))
+        else:
+            self.gs = ChessEngine.GameState()
+        for text in words[movesAt + 1:]:
+            move = findUciMove(self.gs, text)
+            if move is None:
+                self.send("info string illegal move " + text)
+                break
+            self.gs.makeMove(move)
+
+    def go(self, words):
+        options = {}
+        for name, value in zip(words, words[1:]):
+            if name in ("depth", "movetime", "wtime", "btime", "winc", "binc", "movestogo") and \
+                    value.lstrip("-").isdigit():
+                options[name] = int(value)
+        timeLimit = getTimeLimit(self.gs, options)
+        if "depth" in options:
+            maxDepth = max(1, min(options["depth"], SmartMoveFinder.MAX_PLY))
+        elif "infinite" in words or timeLimit is not None:
+            maxDepth = SmartMoveFinder.MAX_PLY  # searched until stop or the time limit
+        else:
+            maxDepth = SmartMoveFinder.DEPTH
+        self.info = SmartMoveFinder.SearchInfo(maxDepth, timeLimit)
+        self.info.onIteration = self.sendIteration
+        infinite = "infinite" in words
+        self.searchThread = threading.Thread(target=self.search, args=(self.gs, self.info, infinite))
+        self.searchThread.daemon = True
+        self.searchThread.start()
+
+    def search(self, gs, info, infinite):
+        # runs on the search thread
+        validMoves = gs.getValidMoves()
+        move, score, principalVariation = SmartMoveFinder.searchBestMove(gs, validMoves, info.maxDepth,
+                                                                         info.timeLimit, info)
+        while infinite and not info.stopped:  # in infinite mode the move is only sent after stop, even if found earlier
+            time.sleep(0.01)
+        self.send("bestmove " + (moveToUci(move) if move is not None else "0000"))
+
+    def sendIteration(self, depth, score, principalVariation):
+        # called by the search thread after every completed iteration
+        milliseconds = int((time.perf_counter() - self.info.startTime) * 1000)
+        if abs(score) >= SmartMoveFinder.CHECKMATE - SmartMoveFinder.MAX_PLY:
+            plies = SmartMoveFinder.CHECKMATE - abs(score)
+            scoreText = "mate %d" % ((plies + 1) // 2 if score > 0 else -(plies // 2))
+        else:
+            scoreText = "cp %d" % (score * 10)  # the engine scores in tenths of a pawn
+        self.send("info depth %d score %s nodes %d nps %d time %d pv %s"
+                  % (depth, scoreText, self.info.nodes, self.info.getNodesPerSecond(), milliseconds,
+                     " ".join(moveToUci(move) for move in principalVariation)))
+
+    def stopSearch(self):
+        """
+        Stop the running search, if any, and wait until it has sent its bestmove
+        """
+        if self.searchThread is not None:
+            self.info.stop()
+            self.searchThread.join()
+            self.searchThread = None
+
+
+def main():
+    SmartMoveFinder.transpositionTable = TranspositionTable.TranspositionTable.fromMegabytes(DEFAULT_HASH_MB)
+    engine = UciEngine()
+    for line in sys.stdin:
+        if not engine.handle(line):
+            break
+    else:  # the GUI closed the input
+        engine.stopSearch()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())